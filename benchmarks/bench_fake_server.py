@@ -0,0 +1,38 @@
+"""Benchmark ApiAsync throughput against the local fake api.
+
+Run with: python benchmarks/bench_fake_server.py [latency] [concurrency]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from yalexs.api_async import async_create_api_async
+from yalexs.fake_server import FakeAugustServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+ACCESS_TOKEN = "token"
+
+
+async def main(latency=0.05, concurrency=50, number=1000):
+    async with FakeAugustServer(FIXTURES_DIR, latency=latency) as server:
+        async with async_create_api_async(base_url=server.base_url) as api:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def _get_detail(index):
+                async with semaphore:
+                    await api.async_get_lock_detail(ACCESS_TOKEN, f"lock{index}")
+
+            start = time.perf_counter()
+            await asyncio.gather(*(_get_detail(index) for index in range(number)))
+            elapsed = time.perf_counter() - start
+
+    print(
+        f"{number} lock details, latency {latency * 1000:.0f}ms, "
+        f"concurrency {concurrency}: {elapsed:.2f}s ({number / elapsed:.0f}/s)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(float(arg) for arg in sys.argv[1:2]), *map(int, sys.argv[2:3])))
@@ -0,0 +1,56 @@
+"""Benchmark a pooled session against a new connection per request.
+
+Starts a local keep-alive http server as a stand-in for the api.
+
+Run with: python benchmarks/bench_http_session.py
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import requests
+
+from yalexs.api import create_http_session
+
+BODY = b'{"UserID": "abc"}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # noqa: N802
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def _time_requests(get, url, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        get(url, timeout=10).content
+    return time.perf_counter() - start
+
+
+def main(number=500):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/users/me"
+    try:
+        unpooled = _time_requests(requests.get, url, number)
+        with create_http_session() as http_session:
+            pooled = _time_requests(http_session.get, url, number)
+    finally:
+        server.shutdown()
+    print(f"new connection per request: {number / unpooled:8,.0f} requests/s")
+    print(f"pooled session:             {number / pooled:8,.0f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
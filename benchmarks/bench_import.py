@@ -0,0 +1,42 @@
+"""Benchmark how long it takes to import the main yalexs modules.
+
+Run with: python benchmarks/bench_import.py
+"""
+
+import statistics
+import subprocess
+import sys
+
+MODULES = (
+    "yalexs.api",
+    "yalexs.api_async",
+    "yalexs.authenticator",
+    "yalexs.authenticator_async",
+    "yalexs.pubnub_activity",
+    "yalexs.pubnub_async",
+)
+
+
+def import_time(module):
+    """Return the cumulative import time of a module in microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    for line in result.stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative)
+    raise ValueError(f"{module} was not imported")
+
+
+def main(repeat=5):
+    for module in MODULES:
+        times = [import_time(module) for _ in range(repeat)]
+        print(f"{module:30} {statistics.median(times) / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
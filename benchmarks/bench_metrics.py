@@ -0,0 +1,69 @@
+"""Benchmark the overhead of middleware and the metrics registry.
+
+Requests are answered by an in-memory transport so only the cost
+inside ApiAsync is measured.
+
+Run with: python benchmarks/bench_metrics.py
+"""
+
+import asyncio
+import time
+
+from yalexs.api_async import ApiAsync
+from yalexs.metrics import MetricsRegistry
+from yalexs.middleware import ApiMiddleware
+from yalexs.transport import AsyncTransport
+
+
+class _Response:
+    status = 200
+    headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        return {"UserID": "abc"}
+
+
+class _MemoryTransport(AsyncTransport):
+    async def async_request(self, method, url, **kwargs):
+        return _Response()
+
+
+async def _time_calls(api, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        await api.async_get_user("token")
+    return time.perf_counter() - start
+
+
+async def main(number=20000, rounds=15):
+    transport = _MemoryTransport()
+    apis = {
+        "no middleware": ApiAsync(None, transport=transport),
+        "noop middleware": ApiAsync(
+            None, transport=transport, middlewares=[ApiMiddleware()]
+        ),
+        "metrics registry": ApiAsync(
+            None, transport=transport, middlewares=[MetricsRegistry()]
+        ),
+        "metrics registry, threadsafe=False": ApiAsync(
+            None, transport=transport, middlewares=[MetricsRegistry(threadsafe=False)]
+        ),
+    }
+    # Interleave the rounds and keep the fastest so noise affects all alike
+    results = dict.fromkeys(apis, float("inf"))
+    for _ in range(rounds):
+        for name, api in apis.items():
+            results[name] = min(results[name], await _time_calls(api, number))
+    baseline = results["no middleware"]
+    for name, elapsed in results.items():
+        print(
+            f"{name}: {elapsed / number * 1e6:.2f}us per call "
+            f"(+{(elapsed - baseline) / number * 1e6:.2f}us)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""Benchmark activities_from_pubnub_message throughput.
+
+Run with: python benchmarks/bench_pubnub_activity.py
+"""
+
+import json
+import os
+import timeit
+
+import dateutil.parser
+
+from yalexs.doorbell import DoorbellDetail
+from yalexs.lock import LockDetail
+from yalexs.pubnub_activity import activities_from_pubnub_message
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    with open(os.path.join(FIXTURES, filename)) as fptr:
+        return json.load(fptr)
+
+
+def main(number=20000, repeat=5):
+    lock = LockDetail(load_fixture("get_lock.doorsense_init.json"))
+    doorbell = DoorbellDetail(load_fixture("get_doorbell.json"))
+    date_time = dateutil.parser.parse("2017-12-10T05:48:30.272Z")
+    messages = [
+        (lock, {"status": "locked", "callingUserID": "abc", "doorState": "closed"}),
+        (lock, {"remoteEvent": 1, "status": "kAugLockState_Unlocking", "info": {}}),
+        (lock, {"status": "associated_bridge_online"}),
+        (doorbell, {"status": "buttonpush", "data": {"event": "buttonpush"}}),
+    ]
+
+    def run():
+        for device, message in messages:
+            activities_from_pubnub_message(device, date_time, message)
+
+    best = min(timeit.repeat(run, number=number, repeat=repeat))
+    print(f"{number * len(messages) / best:,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
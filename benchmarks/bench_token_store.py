@@ -0,0 +1,83 @@
+"""Benchmark setting up many accounts from a cache file each or a token store.
+
+Run with: python benchmarks/bench_token_store.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import os
+import tempfile
+import time
+
+from yalexs.authenticator_async import AuthenticatorAsync
+from yalexs.authenticator_common import (
+    Authentication,
+    AuthenticationState,
+    to_authentication_json,
+)
+from yalexs.token_store import (
+    FileTokenStore,
+    SQLiteTokenStore,
+    async_setup_authentications,
+)
+
+ACCOUNTS = 5000
+
+
+def _make_authentication(index):
+    expires = datetime.now(timezone.utc) + timedelta(days=30)
+    return Authentication(
+        AuthenticationState.AUTHENTICATED,
+        install_id=str(index),
+        access_token=f"token{index}",
+        access_token_expires=expires.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    )
+
+
+async def _time_cache_files(directory):
+    authenticators = []
+    for index in range(ACCOUNTS):
+        path = os.path.join(directory, f"{index}.json")
+        with open(path, "w") as file:
+            file.write(to_authentication_json(_make_authentication(index)))
+        authenticators.append(
+            AuthenticatorAsync(
+                None, "email", str(index), "pass", access_token_cache_file=path
+            )
+        )
+    start = time.perf_counter()
+    for authenticator in authenticators:
+        await authenticator.async_setup_authentication()
+    return time.perf_counter() - start
+
+
+async def _time_store(store):
+    store.save_many(
+        {f"email:{index}": _make_authentication(index) for index in range(ACCOUNTS)}
+    )
+    authenticators = [
+        AuthenticatorAsync(None, "email", str(index), "pass", token_store=store)
+        for index in range(ACCOUNTS)
+    ]
+    start = time.perf_counter()
+    await async_setup_authentications(store, authenticators)
+    return time.perf_counter() - start
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        results = {
+            "cache file per account": await _time_cache_files(directory),
+            "file token store": await _time_store(
+                FileTokenStore(os.path.join(directory, "tokens.json"))
+            ),
+            "sqlite token store": await _time_store(
+                SQLiteTokenStore(os.path.join(directory, "tokens.db"))
+            ),
+        }
+    for name, elapsed in results.items():
+        print(f"{name}: {elapsed * 1000:.1f}ms for {ACCOUNTS} accounts")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
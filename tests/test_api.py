@@ -1,16 +1,23 @@
 from datetime import datetime
 import os
 import unittest
+from unittest.mock import patch
 
 import dateutil.parser
 from dateutil.tz import tzlocal, tzutc
+from requests import Session
 from requests.exceptions import HTTPError
 from requests.models import Response
 from requests.structures import CaseInsensitiveDict
 import requests_mock
 
 import yalexs.activity
-from yalexs.api import Api, _raise_response_exceptions
+from yalexs.api import (
+    API_CONNECT_RETRIES,
+    API_POOL_MAXSIZE,
+    Api,
+    _raise_response_exceptions,
+)
 from yalexs.api_common import (
     API_GET_DOORBELL_URL,
     API_GET_DOORBELLS_URL,
@@ -22,10 +29,12 @@ from yalexs.api_common import (
     API_GET_USER_URL,
     API_LOCK_URL,
     API_UNLOCK_URL,
+    HEADER_AUGUST_ACCESS_TOKEN,
 )
 from yalexs.bridge import BridgeDetail, BridgeStatus, BridgeStatusDetail
 from yalexs.exceptions import AugustApiHTTPError
 from yalexs.lock import LockDoorStatus, LockStatus
+from yalexs.middleware import ApiMiddleware
 
 ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
 
@@ -106,6 +115,10 @@ class TestApi(unittest.TestCase):
         self.assertEqual(
             doorbell.get_doorbell_image(timeout=50), b"doorbell_image_mocked"
         )
+        self.assertEqual(
+            doorbell.get_doorbell_image(http_session=api.http_session),
+            b"doorbell_image_mocked",
+        )
 
     @requests_mock.Mocker()
     def test_get_doorbell_detail_missing_image(self, mock):
@@ -796,6 +809,103 @@ class TestApi(unittest.TestCase):
 
         self.assertEqual(user_details, {"UserID": "abc"})
 
+    def test_owned_http_session(self):
+        api = Api()
+        http_session = api.http_session
+        self.assertIsInstance(http_session, Session)
+        adapter = http_session.get_adapter(API_GET_USER_URL)
+        self.assertEqual(API_POOL_MAXSIZE, adapter._pool_maxsize)
+        self.assertEqual(API_CONNECT_RETRIES, adapter.max_retries.connect)
+        self.assertEqual(0, adapter.max_retries.read)
+        with patch.object(http_session, "close") as mock_close:
+            with api:
+                pass
+        mock_close.assert_called_once()
+
+    def test_borrowed_http_session(self):
+        http_session = Session()
+        with patch.object(http_session, "close") as mock_close:
+            with Api(http_session=http_session) as api:
+                self.assertIs(http_session, api.http_session)
+        mock_close.assert_not_called()
+
+    @requests_mock.Mocker()
+    def test_http_session_reused(self, mock):
+        mock.register_uri("get", API_GET_USER_URL, text='{"UserID": "abc"}')
+        api = Api()
+        with patch.object(
+            api.http_session, "request", wraps=api.http_session.request
+        ) as mock_request:
+            api.get_user(ACCESS_TOKEN)
+            api.get_user(ACCESS_TOKEN)
+        self.assertEqual(2, mock_request.call_count)
+
+    @requests_mock.Mocker()
+    def test_prepared_request_is_reusable(self, mock):
+        url = API_GET_LOCK_STATUS_URL.format(lock_id="ABC")
+        mock.register_uri("get", url, text='{"status": "kAugLockState_Locked"}')
+        api = Api()
+        request = api._build_get_lock_status_request(ACCESS_TOKEN, "ABC")
+        self.assertEqual(url, request.url)
+        self.assertIs(
+            request.headers,
+            api._build_get_lock_detail_request(ACCESS_TOKEN, "DEF").headers,
+        )
+        with self.assertRaises(TypeError):
+            request.headers["x-test"] = "1"
+        # Headers are not shared between instances
+        self.assertIsNot(
+            request.headers,
+            Api()._build_get_lock_status_request(ACCESS_TOKEN, "ABC").headers,
+        )
+        # Switching between tokens keeps the headers of each
+        self.assertEqual(
+            "new",
+            api._build_get_locks_request("new").headers[HEADER_AUGUST_ACCESS_TOKEN],
+        )
+        self.assertIs(
+            request.headers,
+            api._build_get_lock_status_request(ACCESS_TOKEN, "ABC").headers,
+        )
+        # Until more tokens than the cache holds have been used since
+        with patch("yalexs.api_common.HEADERS_CACHE_SIZE", 2):
+            api._build_get_locks_request("other")
+            api._build_get_locks_request("new")
+        self.assertIsNot(
+            request.headers,
+            api._build_get_lock_status_request(ACCESS_TOKEN, "ABC").headers,
+        )
+
+        api._request_to_api(request)
+        api._request_to_api(request)
+        self.assertEqual(
+            request, api._build_get_lock_status_request(ACCESS_TOKEN, "ABC")
+        )
+        self.assertEqual(2, mock.call_count)
+        self.assertEqual(
+            ACCESS_TOKEN, mock.last_request.headers[HEADER_AUGUST_ACCESS_TOKEN]
+        )
+
+    @requests_mock.Mocker()
+    def test_middleware_gets_own_headers(self, mock):
+        mock.register_uri("get", API_GET_USER_URL, text='{"UserID": "abc"}')
+        mock.register_uri(
+            "get", API_GET_HOUSE_ACTIVITIES_URL.format(house_id="123"), text="[]"
+        )
+
+        class _AddHeader(ApiMiddleware):
+            def before_request(self, context):
+                context.kwargs["headers"]["x-test"] = "1"
+
+        api = Api(middlewares=[_AddHeader()])
+        api.get_house_activities(ACCESS_TOKEN, "123")
+        self.assertEqual("4.0.0", mock.last_request.headers["Accept-Version"])
+        self.assertEqual("1", mock.last_request.headers["x-test"])
+
+        api.get_user(ACCESS_TOKEN)
+        self.assertEqual("0.0.1", mock.last_request.headers["Accept-Version"])
+        self.assertNotIn("x-test", api._build_get_user_request(ACCESS_TOKEN).headers)
+
 
 class MockedResponse(Response):
     def __init__(self, *args, **kwargs):
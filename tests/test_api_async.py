@@ -1,8 +1,10 @@
+import asyncio
 from datetime import datetime
+import json
 import os
 from unittest import mock
 
-from aiohttp import ClientResponse, ClientSession
+from aiohttp import ClientResponse, ClientSession, ClientTimeout
 from aiohttp.helpers import TimerNoop
 from aioresponses import CallbackResult, aioresponses
 import aiounittest
@@ -11,7 +13,12 @@ from dateutil.tz import tzlocal, tzutc
 from yarl import URL
 
 import yalexs.activity
-from yalexs.api_async import ApiAsync, _raise_response_exceptions
+from yalexs.api_async import (
+    ApiAsync,
+    ConnectionPoolStats,
+    _raise_response_exceptions,
+    async_create_api_async,
+)
 from yalexs.api_common import (
     API_GET_DOORBELL_URL,
     API_GET_DOORBELLS_URL,
@@ -32,7 +39,7 @@ from yalexs.api_common import (
 )
 from yalexs.bridge import BridgeDetail, BridgeStatus, BridgeStatusDetail
 from yalexs.exceptions import AugustApiAIOHTTPError
-from yalexs.lock import LockDoorStatus, LockStatus
+from yalexs.lock import LockDetail, LockDoorStatus, LockStatus
 
 ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
 
@@ -883,6 +890,98 @@ class TestApiAsync(aiounittest.AsyncTestCase):
         )
         assert last_args["json"] == {"code": "123456", "email": "emailaddress"}
 
+    @aioresponses()
+    async def test_async_create_api_async(self, mock):
+        timeouts = []
+
+        def user_callback(url, **kwargs):
+            timeouts.append(kwargs["timeout"])
+            return CallbackResult(status=200, body='{"UserID": "abc"}')
+
+        def lock_callback(url, **kwargs):
+            timeouts.append(kwargs["timeout"])
+            return CallbackResult(status=200, body=load_fixture("lock.json"))
+
+        mock.get(API_GET_USER_URL, callback=user_callback)
+        mock.put(API_LOCK_URL.format(lock_id="ABC"), callback=lock_callback)
+
+        async with async_create_api_async(
+            timeout=10, command_timeout=60, connect_timeout=3, limit_per_host=5
+        ) as api:
+            aiohttp_session = api._aiohttp_session
+            connector = aiohttp_session.connector
+            self.assertEqual(5, connector.limit_per_host)
+            self.assertEqual(
+                ConnectionPoolStats(100, 5, 0, 0), api.connection_pool_stats()
+            )
+
+            await api.async_get_user(ACCESS_TOKEN)
+            await api.async_lock(ACCESS_TOKEN, "ABC")
+
+        assert aiohttp_session.closed
+        assert timeouts == [
+            ClientTimeout(total=13, connect=3, sock_read=10),
+            ClientTimeout(total=63, connect=3, sock_read=60),
+        ]
+
+    @aioresponses()
+    async def test_async_bulk_lock(self, mock):
+        def _lock_detail(lock_id, bridge_id):
+            data = json.loads(load_fixture("get_lock.online.json"))
+            data["LockID"] = lock_id
+            data["Bridge"]["_id"] = bridge_id
+            return LockDetail(data)
+
+        in_flight = {}
+        max_in_flight = {}
+        bridges = {"A1": "bridge1", "A2": "bridge1", "B1": "bridge2", "C1": None}
+
+        def _callback(lock_id):
+            async def _lock_callback(url, **kwargs):
+                bridge = bridges[lock_id] or lock_id
+                in_flight[bridge] = in_flight.get(bridge, 0) + 1
+                max_in_flight[bridge] = max(
+                    in_flight[bridge], max_in_flight.get(bridge, 0)
+                )
+                await asyncio.sleep(0.01)
+                in_flight[bridge] -= 1
+                if lock_id == "B1":
+                    return CallbackResult(status=422, reason="Bridge offline")
+                return CallbackResult(status=200, body=load_fixture("lock.json"))
+
+            return _lock_callback
+
+        for lock_id in bridges:
+            mock.put(API_LOCK_URL.format(lock_id=lock_id), callback=_callback(lock_id))
+
+        api = ApiAsync(ClientSession())
+        results = [
+            result
+            async for result in api.async_bulk_lock(
+                ACCESS_TOKEN,
+                [
+                    _lock_detail("A1", "bridge1"),
+                    _lock_detail("A2", "bridge1"),
+                    _lock_detail("B1", "bridge2"),
+                    "C1",
+                    "C1",
+                ],
+            )
+        ]
+
+        assert sorted(result.lock_id for result in results) == ["A1", "A2", "B1", "C1"]
+        # The second lock on bridge1 waits for the first
+        assert results[-1].lock_id == "A2"
+        assert max_in_flight == {"bridge1": 1, "bridge2": 1, "C1": 1}
+        failed = next(result for result in results if result.lock_id == "B1")
+        assert failed.lock_status is None
+        assert failed.error.status == 422
+        assert all(
+            result.lock_status == LockStatus.LOCKED
+            for result in results
+            if result.lock_id != "B1"
+        )
+
     def test__raise_response_exceptions(self):
         loop = mock.Mock()
         request_info = mock.Mock()
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+import aiounittest
+import jwt
+
+from yalexs.authenticator import Authenticator
+from yalexs.authenticator_async import AuthenticatorAsync
+from yalexs.authenticator_common import (
+    Authentication,
+    AuthenticationState,
+    to_authentication_json,
+)
+from yalexs.cache_file import (
+    async_cache_file_lock,
+    atomic_write,
+    cache_file_lock,
+    read_cache_file,
+)
+
+
+def _make_token():
+    return jwt.encode(
+        {"exp": int(time.time() + timedelta(days=30).total_seconds())},
+        "test-secret-key-that-is-long-enough",
+    )
+
+
+def _write_cache_file(path):
+    expires = datetime.now(timezone.utc) + timedelta(days=1)
+    atomic_write(
+        path,
+        to_authentication_json(
+            Authentication(
+                AuthenticationState.AUTHENTICATED,
+                install_id="install_id",
+                access_token="old_token",
+                access_token_expires=expires.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            )
+        ),
+    )
+
+
+class TestCacheFile(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self._directory = tempdir.name
+        self._path = os.path.join(tempdir.name, "token.json")
+        _write_cache_file(self._path)
+
+    def test_refresh_is_picked_up_from_cache_file(self):
+        api = MagicMock()
+        api.refresh_access_token.return_value = _make_token()
+        first = Authenticator(api, "email", "user", "pass", None, self._path)
+        second = Authenticator(api, "email", "user", "pass", None, self._path)
+        assert first.should_refresh() and second.should_refresh()
+
+        refreshed = first.refresh_access_token()
+        assert second.refresh_access_token().access_token == refreshed.access_token
+        api.refresh_access_token.assert_called_once_with("old_token")
+        assert (
+            read_cache_file(self._path).access_token
+            == second.authentication.access_token
+        )
+        assert sorted(os.listdir(self._directory)) == ["token.json", "token.json.lock"]
+
+    def test_unreadable_cache_file(self):
+        with open(self._path, "w") as file:
+            file.write("{")
+        assert read_cache_file(self._path) is None
+        assert read_cache_file(os.path.join(self._directory, "missing")) is None
+        assert read_cache_file(None) is None
+
+
+class TestCacheFileAsync(aiounittest.AsyncTestCase):
+    async def test_lock_is_exclusive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "token.json")
+            acquired = asyncio.Event()
+
+            async def _async_lock():
+                async with async_cache_file_lock(path):
+                    acquired.set()
+
+            with cache_file_lock(path):
+                task = asyncio.ensure_future(_async_lock())
+                await asyncio.sleep(0.1)
+                assert not acquired.is_set()
+            await task
+            assert acquired.is_set()
+
+    async def test_concurrent_refresh_calls_api_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "token.json")
+            _write_cache_file(path)
+
+            async def _async_refresh_access_token(access_token):
+                await asyncio.sleep(0.1)
+                return _make_token()
+
+            api = MagicMock()
+            api.async_refresh_access_token = AsyncMock(
+                side_effect=_async_refresh_access_token
+            )
+            authenticators = []
+            for _ in range(3):
+                authenticator = AuthenticatorAsync(
+                    api, "email", "user", "pass", None, path
+                )
+                await authenticator.async_setup_authentication()
+                authenticators.append(authenticator)
+
+            results = await asyncio.gather(
+                *(
+                    authenticator.async_refresh_access_token()
+                    for authenticator in authenticators
+                )
+            )
+            api.async_refresh_access_token.assert_called_once_with("old_token")
+            assert len({result.access_token for result in results}) == 1
+            assert results[0].access_token != "old_token"
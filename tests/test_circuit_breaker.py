@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+from aiohttp import ClientResponseError, ClientSession
+from aioresponses import aioresponses
+import aiounittest
+
+from yalexs.activity import SOURCE_PUBNUB, BridgeOperationActivity
+from yalexs.api_async import ApiAsync
+from yalexs.api_common import API_GET_LOCK_URL, API_LOCK_URL, API_UNLOCK_URL
+from yalexs.circuit_breaker import BridgeCircuitBreaker, CircuitState
+from yalexs.exceptions import AugustApiAIOHTTPError, AugustApiCircuitOpenError
+from yalexs.lock import LockStatus
+from yalexs.middleware import RequestContext
+from yalexs.transport import AsyncTransport
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+class TestBridgeCircuitBreaker(aiounittest.AsyncTestCase):
+    @aioresponses()
+    async def test_opens_probes_and_closes(self, mock):
+        lock_url = API_LOCK_URL.format(lock_id="ABC")
+        breaker = BridgeCircuitBreaker(failure_threshold=2, reset_timeout=30)
+        api = ApiAsync(ClientSession(), middlewares=[breaker])
+        mock.put(lock_url, status=422)
+        mock.put(lock_url, status=408)
+
+        for _ in range(2):
+            with self.assertRaises(AugustApiAIOHTTPError) as err:
+                await api.async_lock(ACCESS_TOKEN, "ABC")
+            assert err.exception.status in (422, 408)
+        assert breaker.state("ABC") == CircuitState.OPEN
+
+        # Fails fast without a request while open
+        with self.assertRaises(AugustApiCircuitOpenError):
+            await api.async_lock(ACCESS_TOKEN, "ABC")
+        # Other locks and endpoints are not affected
+        mock.get(
+            API_GET_LOCK_URL.format(lock_id="ABC"),
+            body=load_fixture("get_lock.online.json"),
+        )
+        await api.async_get_lock_detail(ACCESS_TOKEN, "ABC")
+        assert breaker.state("OTHER") == CircuitState.CLOSED
+
+        now = time.monotonic()
+        with patch("yalexs.circuit_breaker.time.monotonic", return_value=now + 100):
+            assert breaker.state("ABC") == CircuitState.HALF_OPEN
+            # The probe fails and the circuit opens again
+            mock.put(lock_url, status=423)
+            with self.assertRaises(AugustApiAIOHTTPError):
+                await api.async_lock(ACCESS_TOKEN, "ABC")
+            assert breaker.state("ABC") == CircuitState.OPEN
+            with self.assertRaises(AugustApiCircuitOpenError):
+                await api.async_lock(ACCESS_TOKEN, "ABC")
+
+        with patch("yalexs.circuit_breaker.time.monotonic", return_value=now + 200):
+            # The probe succeeds and the circuit closes
+            mock.put(lock_url, body=load_fixture("lock.json"))
+            assert await api.async_lock(ACCESS_TOKEN, "ABC") == LockStatus.LOCKED
+        assert breaker.state("ABC") == CircuitState.CLOSED
+
+    @aioresponses()
+    async def test_bridge_online_closes(self, mock):
+        unlock_url = API_UNLOCK_URL.format(lock_id="ABC")
+        breaker = BridgeCircuitBreaker(failure_threshold=1)
+        api = ApiAsync(ClientSession(), middlewares=[breaker])
+        mock.put(unlock_url, status=500)
+        with self.assertRaises(AugustApiAIOHTTPError):
+            await api.async_unlock(ACCESS_TOKEN, "ABC")
+        # Errors that are not from the bridge do not count
+        assert breaker.state("ABC") == CircuitState.CLOSED
+
+        mock.put(unlock_url, status=422)
+        with self.assertRaises(AugustApiAIOHTTPError):
+            await api.async_unlock(ACCESS_TOKEN, "ABC")
+        assert breaker.state("ABC") == CircuitState.OPEN
+
+        breaker.process_activities(
+            [
+                BridgeOperationActivity(
+                    SOURCE_PUBNUB,
+                    {
+                        "action": "associated_bridge_online",
+                        "dateTime": 1,
+                        "deviceID": "ABC",
+                    },
+                )
+            ]
+        )
+        assert breaker.state("ABC") == CircuitState.CLOSED
+        mock.put(unlock_url, body=load_fixture("unlock.json"))
+        assert await api.async_unlock(ACCESS_TOKEN, "ABC") == LockStatus.UNLOCKED
+
+    async def test_cancelled_probe_releases_circuit(self):
+        started = asyncio.Event()
+
+        class BridgeOfflineTransport(AsyncTransport):
+            hang = False
+
+            async def async_request(self, method, url, **kwargs):
+                if self.hang:
+                    started.set()
+                    await asyncio.Event().wait()
+                return MagicMock(
+                    status=422,
+                    raise_for_status=MagicMock(
+                        side_effect=ClientResponseError(MagicMock(), (), status=422)
+                    ),
+                )
+
+        transport = BridgeOfflineTransport()
+        breaker = BridgeCircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        api = ApiAsync(None, transport=transport, middlewares=[breaker])
+        with self.assertRaises(AugustApiAIOHTTPError):
+            await api.async_lock(ACCESS_TOKEN, "ABC")
+        assert breaker.state("ABC") == CircuitState.OPEN
+        await asyncio.sleep(0.02)
+
+        transport.hang = True
+        probe = asyncio.ensure_future(api.async_lock(ACCESS_TOKEN, "ABC"))
+        await started.wait()
+        assert breaker.state("ABC") == CircuitState.HALF_OPEN
+        probe.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await probe
+
+        # The next operation is sent as a new probe
+        transport.hang = False
+        with self.assertRaises(AugustApiAIOHTTPError) as err:
+            await api.async_lock(ACCESS_TOKEN, "ABC")
+        assert err.exception.status == 422
+        assert breaker.state("ABC") == CircuitState.OPEN
+
+    def test_stuck_probe_expires(self):
+        breaker = BridgeCircuitBreaker(failure_threshold=1, reset_timeout=30)
+        url = API_LOCK_URL.format(lock_id="ABC")
+        failed = RequestContext("remoteoperate_lock", "put", url, {})
+        failed.status = 422
+        failed.error = AugustApiAIOHTTPError("offline", status=422)
+        breaker.on_error(failed)
+
+        now = time.monotonic()
+        with patch("yalexs.circuit_breaker.time.monotonic", return_value=now + 40):
+            breaker.before_request(RequestContext("remoteoperate_lock", "put", url, {}))
+            with self.assertRaises(AugustApiCircuitOpenError):
+                breaker.before_request(
+                    RequestContext("remoteoperate_lock", "put", url, {})
+                )
+        with patch("yalexs.circuit_breaker.time.monotonic", return_value=now + 80):
+            breaker.before_request(RequestContext("remoteoperate_lock", "put", url, {}))
@@ -0,0 +1,116 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import aiounittest
+
+from yalexs.command_queue import LockCommandQueue
+from yalexs.exceptions import AugustApiAIOHTTPError
+from yalexs.lock import LockStatus
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+
+
+async def _settle():
+    """Let queued tasks start running."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class FakeApi:
+    """Record operations and hold each one until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.release = asyncio.Event()
+
+    async def _async_operate(self, operation, lock_id, status):
+        self.calls.append((operation, lock_id))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await self.release.wait()
+        self.in_flight -= 1
+        if lock_id == "BAD":
+            raise AugustApiAIOHTTPError("bridge in use", status=423)
+        return status
+
+    async def async_lock(self, access_token, lock_id):
+        return await self._async_operate("lock", lock_id, LockStatus.LOCKED)
+
+    async def async_unlock(self, access_token, lock_id):
+        return await self._async_operate("unlock", lock_id, LockStatus.UNLOCKED)
+
+
+class TestLockCommandQueue(aiounittest.AsyncTestCase):
+    async def test_serialize_and_coalesce(self):
+        api = FakeApi()
+        queue = LockCommandQueue(api)
+
+        first = asyncio.ensure_future(queue.async_unlock(ACCESS_TOKEN, "ABC"))
+        await _settle()
+        assert api.calls == [("unlock", "ABC")]
+        waiting = [
+            asyncio.ensure_future(queue.async_lock(ACCESS_TOKEN, "ABC")),
+            asyncio.ensure_future(queue.async_unlock(ACCESS_TOKEN, "ABC")),
+            asyncio.ensure_future(queue.async_lock(ACCESS_TOKEN, "ABC")),
+        ]
+        other = asyncio.ensure_future(queue.async_unlock(ACCESS_TOKEN, "OTHER"))
+        await _settle()
+        assert queue.queue_depth("ABC") == 2
+        assert queue.queue_depth("OTHER") == 1
+
+        api.release.set()
+        assert await first == LockStatus.UNLOCKED
+        assert await asyncio.gather(*waiting) == [LockStatus.LOCKED] * 3
+        assert await other == LockStatus.UNLOCKED
+
+        assert api.calls == [
+            ("unlock", "ABC"),
+            ("unlock", "OTHER"),
+            ("lock", "ABC"),
+        ]
+        assert api.max_in_flight == 2
+        assert queue.queue_depth("ABC") == 0
+
+    async def test_errors_and_cancelled_callers(self):
+        api = FakeApi()
+        queue = LockCommandQueue(api)
+
+        first = asyncio.ensure_future(queue.async_lock(ACCESS_TOKEN, "BAD"))
+        await _settle()
+        second = asyncio.ensure_future(queue.async_unlock(ACCESS_TOKEN, "BAD"))
+        third = asyncio.ensure_future(queue.async_unlock(ACCESS_TOKEN, "BAD"))
+        await _settle()
+        # One caller giving up does not cancel the shared operation
+        second.cancel()
+        api.release.set()
+
+        with self.assertRaises(AugustApiAIOHTTPError):
+            await first
+        with self.assertRaises(AugustApiAIOHTTPError):
+            await third
+        assert second.cancelled()
+        assert api.calls == [("lock", "BAD"), ("unlock", "BAD")]
+
+    async def test_uses_latest_access_token(self):
+        api = MagicMock()
+        release = asyncio.Event()
+
+        async def _async_lock(access_token, lock_id):
+            await release.wait()
+            return LockStatus.LOCKED
+
+        api.async_lock.side_effect = _async_lock
+        queue = LockCommandQueue(api)
+        first = asyncio.ensure_future(queue.async_lock("old", "ABC"))
+        await _settle()
+        second = asyncio.ensure_future(queue.async_lock("old", "ABC"))
+        third = asyncio.ensure_future(queue.async_lock("new", "ABC"))
+        await _settle()
+        release.set()
+        await asyncio.gather(first, second, third)
+        assert [call.args for call in api.async_lock.call_args_list] == [
+            ("old", "ABC"),
+            ("new", "ABC"),
+        ]
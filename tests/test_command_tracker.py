@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+import aiounittest
+
+from yalexs.command_tracker import CommandTracker
+from yalexs.exceptions import AugustApiAIOHTTPError
+from yalexs.lock import LockDetail, LockStatus
+from yalexs.pubnub_async import AugustPubNub
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+def _make_pubnub():
+    lock = LockDetail(json.loads(load_fixture("get_lock.doorsense_init.json")))
+    lock._pubsub_channel = "channel"
+    august_pubnub = AugustPubNub()
+    august_pubnub.register_device(lock)
+    return lock, august_pubnub
+
+
+def _send_message(august_pubnub, message):
+    august_pubnub.message(
+        None,
+        MagicMock(channel="channel", timetoken="16159387543830000", message=message),
+    )
+
+
+class TestCommandTracker(aiounittest.AsyncTestCase):
+    async def test_confirmed_by_pubnub(self):
+        lock, august_pubnub = _make_pubnub()
+        api = MagicMock()
+
+        async def _async_unlock_async(access_token, lock_id, hyper_bridge):
+            # pubnub can deliver the result before the api responds
+            _send_message(august_pubnub, {"status": "kAugLockState_Unlocking"})
+            _send_message(august_pubnub, {"status": "kAugLockState_Unlocked"})
+            return ""
+
+        api.async_unlock_async.side_effect = _async_unlock_async
+        tracker = CommandTracker(api, august_pubnub)
+
+        result = await tracker.async_unlock(ACCESS_TOKEN, lock.device_id)
+        assert result.lock_id == lock.device_id
+        assert result.lock_status == LockStatus.UNLOCKED
+        assert result.confirmed is True
+        assert result.elapsed >= 0
+        api.async_unlock_async.assert_called_once_with(
+            ACCESS_TOKEN, lock.device_id, True
+        )
+
+        api.async_lock_async = AsyncMock(return_value="")
+        lock_task = asyncio.ensure_future(
+            tracker.async_lock(ACCESS_TOKEN, lock.device_id)
+        )
+        await asyncio.sleep(0)
+        _send_message(august_pubnub, {"status": "unlocked"})
+        _send_message(august_pubnub, {"status": "locked"})
+        assert (await lock_task).lock_status == LockStatus.LOCKED
+        assert tracker._waiters == {}
+
+        tracker.close()
+        assert august_pubnub._event_subscriptions == []
+
+    async def test_timeout_falls_back_to_status(self):
+        lock, august_pubnub = _make_pubnub()
+        api = MagicMock()
+        api.async_status_async = AsyncMock(return_value="")
+        api.async_get_lock_status = AsyncMock(return_value=LockStatus.LOCKED)
+        tracker = CommandTracker(api, august_pubnub, timeout=0.01)
+
+        result = await tracker.async_status(ACCESS_TOKEN, lock.device_id, False)
+        assert result.lock_status == LockStatus.LOCKED
+        assert result.confirmed is False
+        api.async_get_lock_status.assert_called_once_with(ACCESS_TOKEN, lock.device_id)
+
+    async def test_api_error_is_raised(self):
+        lock, august_pubnub = _make_pubnub()
+        api = MagicMock()
+        api.async_lock_async = AsyncMock(
+            side_effect=AugustApiAIOHTTPError("bridge offline", status=422)
+        )
+        tracker = CommandTracker(api, august_pubnub)
+
+        with self.assertRaises(AugustApiAIOHTTPError):
+            await tracker.async_lock(ACCESS_TOKEN, lock.device_id)
+        assert tracker._waiters == {}
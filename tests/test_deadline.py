@@ -0,0 +1,88 @@
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from aiohttp import ClientSession, ClientTimeout
+import aiounittest
+import requests_mock
+
+from yalexs.api import Api
+from yalexs.api_async import ApiAsync
+from yalexs.api_common import API_GET_LOCK_URL, API_GET_USER_URL
+from yalexs.deadline import deadline, deadline_remaining
+from yalexs.exceptions import AugustApiDeadlineExceededError
+from yalexs.fake_server import FakeAugustServer
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class TestDeadline(unittest.TestCase):
+    def test_nested_deadline(self):
+        assert deadline_remaining() is None
+        with deadline(1):
+            with deadline(100):
+                assert deadline_remaining() <= 1
+            with deadline(0.5):
+                assert deadline_remaining() <= 0.5
+            assert 0.5 < deadline_remaining() <= 1
+        assert deadline_remaining() is None
+
+    @requests_mock.Mocker()
+    def test_timeout_is_clamped(self, mock):
+        mock.register_uri("get", API_GET_USER_URL, text='{"UserID": "abc"}')
+        api = Api(timeout=10)
+        with deadline(2):
+            api.get_user(ACCESS_TOKEN)
+        assert 0 < mock.last_request.timeout <= 2
+
+        api.get_user(ACCESS_TOKEN)
+        assert mock.last_request.timeout == 10
+
+    @requests_mock.Mocker()
+    def test_retry_does_not_outlive_deadline(self, mock):
+        mock.register_uri(
+            "get", API_GET_LOCK_URL.format(lock_id="ABC"), status_code=429
+        )
+        api = Api()
+        start = time.monotonic()
+        with patch("yalexs.api.API_RETRY_TIME", 2.5), deadline(1):
+            with self.assertRaises(AugustApiDeadlineExceededError):
+                api.get_lock_detail(ACCESS_TOKEN, "ABC")
+        assert time.monotonic() - start < 1
+        assert mock.call_count == 1
+
+    @requests_mock.Mocker()
+    def test_expired_deadline_fails_fast(self, mock):
+        api = Api()
+        with deadline(0):
+            with self.assertRaises(TimeoutError):
+                api.get_user(ACCESS_TOKEN)
+        assert mock.call_count == 0
+
+
+class TestDeadlineAsync(aiounittest.AsyncTestCase):
+    async def test_slow_response(self):
+        async with FakeAugustServer(
+            FIXTURES_DIR, latency=0.3
+        ) as server, ClientSession() as session:
+            api = ApiAsync(
+                session,
+                timeout=ClientTimeout(total=10, connect=5),
+                base_url=server.base_url,
+            )
+            start = time.monotonic()
+            with deadline(0.1):
+                with self.assertRaises(AugustApiDeadlineExceededError):
+                    await api.async_get_locks(ACCESS_TOKEN)
+            assert time.monotonic() - start < 0.3
+
+    async def test_retry_does_not_outlive_deadline(self):
+        async with FakeAugustServer(FIXTURES_DIR) as server, ClientSession() as session:
+            api = ApiAsync(session, base_url=server.base_url)
+            server.inject_status(429, count=5)
+            with deadline(1):
+                with self.assertRaises(AugustApiDeadlineExceededError):
+                    await api.async_get_locks(ACCESS_TOKEN)
+            assert server.request_counts["/users/locks/mine"] == 1
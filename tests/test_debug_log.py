@@ -0,0 +1,101 @@
+import logging
+import unittest
+from unittest.mock import patch
+
+from aiohttp import ClientSession
+from aioresponses import aioresponses
+import aiounittest
+import requests_mock
+
+from yalexs.api import Api
+from yalexs.api_async import ApiAsync
+from yalexs.api_common import API_GET_SESSION_URL, API_GET_USER_URL
+from yalexs.debug_log import REDACTED, DebugLogPolicy
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9.eyJleHAiOjF9.c2ln"
+
+
+class TestDebugLogPolicy(unittest.TestCase):
+    def test_format(self):
+        policy = DebugLogPolicy()
+        assert ACCESS_TOKEN not in policy.format(
+            {"x-august-access-token": ACCESS_TOKEN, "Accept-Version": "0.0.1"}
+        )
+        assert policy.format({"identifier": "email:me", "password": "secret"}) == (
+            f"{{'identifier': 'email:me', 'password': '{REDACTED}'}}"
+        )
+        assert policy.format(f'{{"token": "{ACCESS_TOKEN}"}}'.encode()) == (
+            f'{{"token": "{REDACTED}"}}'
+        )
+        assert (
+            DebugLogPolicy(max_body_size=40).format("x" * 50)
+            == "x" * 40 + "... (50 characters)"
+        )
+        assert DebugLogPolicy(redact=False).format({"password": "secret"}) == (
+            "{'password': 'secret'}"
+        )
+
+    def test_should_log(self):
+        assert DebugLogPolicy().should_log("get_user")
+        policy = DebugLogPolicy(endpoints=["get_lock_status"], sample_rate=0.5)
+        assert not policy.should_log("get_user")
+        with patch("yalexs.debug_log.random.random", return_value=0.4):
+            assert policy.should_log("get_lock_status")
+        with patch("yalexs.debug_log.random.random", return_value=0.6):
+            assert not policy.should_log("get_lock_status")
+
+    def test_lazy_formatting(self):
+        policy = DebugLogPolicy()
+        with patch.object(policy, "format", return_value="formatted") as mock_format:
+            lazy = policy.lazy({"a": 1})
+            mock_format.assert_not_called()
+            assert str(lazy) == "formatted"
+
+
+class TestApiDebugLog(unittest.TestCase):
+    @requests_mock.Mocker()
+    def test_filtered_and_redacted(self, mock):
+        mock.register_uri("get", API_GET_USER_URL, text='{"UserID": "abc"}')
+        mock.register_uri(
+            "post",
+            API_GET_SESSION_URL,
+            text="{}",
+            headers={"x-august-access-token": ACCESS_TOKEN},
+        )
+        api = Api(debug_log_policy=DebugLogPolicy(endpoints=["get_session"]))
+
+        with self.assertLogs("yalexs.api", logging.DEBUG) as logs:
+            api.get_user(ACCESS_TOKEN)
+            api.get_session("install", "email:me", "secret")
+
+        output = "\n".join(logs.output)
+        assert API_GET_USER_URL not in output
+        assert API_GET_SESSION_URL in output
+        assert "secret" not in output
+        assert ACCESS_TOKEN not in output
+
+        api.debug_log_policy = DebugLogPolicy(endpoints=[])
+        with self.assertNoLogs("yalexs.api", logging.DEBUG):
+            api.get_session("install", "email:me", "secret")
+
+
+class TestApiAsyncDebugLog(aiounittest.AsyncTestCase):
+    @aioresponses()
+    async def test_body_not_read_when_not_logged(self, mock):
+        mock.get(API_GET_USER_URL, body='{"UserID": "abc"}')
+        mock.get(API_GET_USER_URL, body='{"UserID": "abc"}')
+        api = ApiAsync(
+            ClientSession(), debug_log_policy=DebugLogPolicy(endpoints=["get_locks"])
+        )
+
+        logger = logging.getLogger("yalexs.api_async")
+        with patch.object(logger, "isEnabledFor", return_value=True), patch(
+            "aiohttp.ClientResponse.read", autospec=True
+        ) as mock_read:
+            mock_read.side_effect = ValueError("body was read")
+            with self.assertRaises(ValueError):
+                await ApiAsync(ClientSession()).async_get_user(ACCESS_TOKEN)
+            mock_read.reset_mock()
+            mock_read.side_effect = None
+            await api._async_request_to_api(api._build_get_user_request(ACCESS_TOKEN))
+            mock_read.assert_not_called()
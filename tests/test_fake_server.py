@@ -0,0 +1,87 @@
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from aiohttp import ClientSession
+import aiounittest
+
+from yalexs.api_async import ApiAsync
+from yalexs.api_common import API_GET_LOCK_URL
+from yalexs.exceptions import AugustApiAIOHTTPError
+from yalexs.fake_server import FakeAugustServer
+from yalexs.lock import LockStatus
+from yalexs.transport import RequestsTransport, rewrite_url
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class TestTransport(unittest.TestCase):
+    def test_rewrite_url(self):
+        url = API_GET_LOCK_URL.format(lock_id="ABC")
+        assert rewrite_url(url, None) == url
+        assert rewrite_url(url, "http://127.0.0.1:8080/") == (
+            "http://127.0.0.1:8080/locks/ABC"
+        )
+        assert rewrite_url("https://other/x", "http://a") == "https://other/x"
+
+    def test_requests_transport(self):
+        http_session = MagicMock()
+        transport = RequestsTransport(http_session, "http://127.0.0.1:8080")
+        transport.request("get", API_GET_LOCK_URL.format(lock_id="ABC"), timeout=1)
+        http_session.request.assert_called_once_with(
+            "get", "http://127.0.0.1:8080/locks/ABC", timeout=1
+        )
+
+
+class TestFakeAugustServer(aiounittest.AsyncTestCase):
+    async def test_locks_and_operations(self):
+        async with FakeAugustServer(FIXTURES_DIR) as server, ClientSession() as session:
+            api = ApiAsync(session, base_url=server.base_url)
+
+            locks = await api.async_get_locks(ACCESS_TOKEN)
+            assert len(locks) == 2
+            lock_id = locks[0].device_id
+
+            detail = await api.async_get_lock_detail(ACCESS_TOKEN, lock_id)
+            assert detail.device_id == lock_id
+            assert detail.lock_status == LockStatus.LOCKED
+
+            assert await api.async_unlock(ACCESS_TOKEN, lock_id) == LockStatus.UNLOCKED
+            assert (
+                await api.async_get_lock_status(ACCESS_TOKEN, lock_id)
+                == LockStatus.UNLOCKED
+            )
+            assert await api.async_lock_async(ACCESS_TOKEN, lock_id) == ""
+            assert (
+                await api.async_get_lock_detail(ACCESS_TOKEN, lock_id)
+            ).lock_status == LockStatus.LOCKED
+
+            activities = await api.async_get_house_activities(ACCESS_TOKEN, "house")
+            assert len(activities) == 10
+            assert server.request_counts["/locks/{lock_id}"] == 2
+
+    async def test_injected_failures(self):
+        async with FakeAugustServer(FIXTURES_DIR) as server, ClientSession() as session:
+            api = ApiAsync(session, base_url=server.base_url)
+
+            server.inject_status(429, count=2)
+            with patch("yalexs.api_async.API_RETRY_TIME", 0):
+                assert len(await api.async_get_locks(ACCESS_TOKEN)) == 2
+            assert server.request_counts["/users/locks/mine"] == 3
+
+            server.inject_status(423, path="/remoteoperate/ABC/lock")
+            assert len(await api.async_get_locks(ACCESS_TOKEN)) == 2
+            with self.assertRaises(AugustApiAIOHTTPError):
+                await api.async_lock(ACCESS_TOKEN, "ABC")
+
+            server.error_rate = 1
+            with self.assertRaises(AugustApiAIOHTTPError):
+                await api.async_get_locks(ACCESS_TOKEN)
+
+    async def test_session_token(self):
+        async with FakeAugustServer(FIXTURES_DIR) as server, ClientSession() as session:
+            api = ApiAsync(session, base_url=server.base_url)
+            response = await api.async_get_session("install", "phone:+1", "pw")
+            assert (await response.json())["vPassword"] is True
+            assert await api.async_refresh_access_token(ACCESS_TOKEN)
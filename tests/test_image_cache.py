@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+from unittest.mock import MagicMock
+
+from aiohttp import ClientResponseError, ClientSession
+from aioresponses import aioresponses
+import aiounittest
+
+from yalexs.doorbell import DoorbellDetail
+from yalexs.image_cache import DoorbellImageCache, image_cache_key
+
+IMAGE_URL = "https://image.com/{}.jpg"
+CREATED_AT = datetime.datetime(2021, 3, 16, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+class TestDoorbellImageCache(aiounittest.AsyncTestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self._directory = tempdir.name
+
+    @aioresponses()
+    async def test_single_download(self, mock):
+        url = IMAGE_URL.format("one")
+        mock.get(url, body=b"image one", repeat=True)
+        cache = DoorbellImageCache(self._directory)
+        async with ClientSession() as session:
+            images = await asyncio.gather(
+                *(cache.async_get_image(session, url, CREATED_AT) for _ in range(5))
+            )
+            assert images == [b"image one"] * 5
+            assert await cache.async_get_image(session, url, CREATED_AT) == (
+                b"image one"
+            )
+            assert _request_count(mock) == 1
+            assert image_cache_key(url, CREATED_AT) in cache
+            assert cache.memory_bytes == cache.disk_bytes == len(b"image one")
+
+            # A new cache over the same directory reads from disk
+            restarted = DoorbellImageCache(self._directory)
+            assert await restarted.async_get_image(session, url, CREATED_AT) == (
+                b"image one"
+            )
+            assert _request_count(mock) == 1
+
+            # A new image at the same url is downloaded again
+            await cache.async_get_image(
+                session, url, CREATED_AT + datetime.timedelta(minutes=1)
+            )
+            assert _request_count(mock) == 2
+
+    @aioresponses()
+    async def test_lru_eviction(self, mock):
+        for name in ("one", "two", "three"):
+            mock.get(IMAGE_URL.format(name), body=b"0123456789", repeat=True)
+        cache = DoorbellImageCache(
+            self._directory, max_disk_bytes=25, max_memory_bytes=15
+        )
+        async with ClientSession() as session:
+            await cache.async_get_image(session, IMAGE_URL.format("one"))
+            await cache.async_get_image(session, IMAGE_URL.format("two"))
+            await cache.async_get_image(session, IMAGE_URL.format("one"))
+            await cache.async_get_image(session, IMAGE_URL.format("three"))
+
+        assert cache.memory_bytes == 10
+        assert cache.disk_bytes == 20
+        assert image_cache_key(IMAGE_URL.format("one")) in cache
+        assert image_cache_key(IMAGE_URL.format("two")) not in cache
+        assert image_cache_key(IMAGE_URL.format("three")) in cache
+        assert len(os.listdir(self._directory)) == 2
+
+    @aioresponses()
+    async def test_errors_are_not_cached(self, mock):
+        url = IMAGE_URL.format("missing")
+        mock.get(url, status=404)
+        mock.get(url, body=b"found")
+        cache = DoorbellImageCache(self._directory)
+        async with ClientSession() as session:
+            with self.assertRaises(ClientResponseError):
+                await cache.async_get_image(session, url)
+            assert await cache.async_get_image(session, url) == b"found"
+
+    @aioresponses()
+    async def test_doorbell_detail(self, mock):
+        doorbell = DoorbellDetail(json.loads(load_fixture("get_doorbell.json")))
+        mock.get(doorbell.image_url, body=b"doorbell image")
+        cache = DoorbellImageCache(self._directory)
+        async with ClientSession() as session:
+            for _ in range(2):
+                assert (
+                    await doorbell.async_get_doorbell_image(session, image_cache=cache)
+                    == b"doorbell image"
+                )
+        assert (
+            image_cache_key(doorbell.image_url, doorbell.image_created_at_datetime)
+            in cache
+        )
+
+    async def test_unfinished_writes_are_removed(self):
+        with open(os.path.join(self._directory, ".yalexs-abc.tmp"), "wb") as file:
+            file.write(b"partial image")
+        with open(os.path.join(self._directory, "abc.jpg"), "wb") as file:
+            file.write(b"image")
+        cache = DoorbellImageCache(self._directory)
+        assert os.listdir(self._directory) == ["abc.jpg"]
+        assert cache.disk_bytes == len(b"image")
+
+    async def test_stop_cancels_downloads(self):
+        started = asyncio.Event()
+
+        async def _request(method, url, timeout):
+            started.set()
+            await asyncio.Event().wait()
+
+        session = MagicMock(request=_request)
+        cache = DoorbellImageCache(self._directory)
+        waiter = asyncio.ensure_future(
+            cache.async_get_image(session, IMAGE_URL.format("slow"))
+        )
+        await started.wait()
+        assert len(cache._downloads) == 1
+
+        await cache.async_stop()
+        assert cache._downloads == {}
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+
+
+def _request_count(mock):
+    return sum(len(calls) for calls in mock.requests.values())
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from aiohttp import ClientSession
+from aioresponses import aioresponses
+import aiounittest
+import dateutil.parser
+
+from yalexs.doorbell import DoorbellDetail
+from yalexs.image_cache import DoorbellImageCache, image_cache_key
+from yalexs.image_prefetcher import DoorbellImagePrefetcher
+from yalexs.pubnub_activity import activities_from_pubnub_message
+from yalexs.pubnub_async import AugustPubNub
+from yalexs.util import update_doorbell_image_from_activity
+
+IMAGE_URL = "https://dyu7azbnaoi74.cloudfront.net/zip/images/zip.jpeg"
+CREATED_AT = "2030-03-16T01:07:08.817Z"
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+def _image_capture_message(image_url=IMAGE_URL, created_at=CREATED_AT):
+    return {
+        "status": "imagecapture",
+        "data": {
+            "event": "imagecapture",
+            "result": {"created_at": created_at, "secure_url": image_url},
+        },
+    }
+
+
+class TestDoorbellImagePrefetcher(aiounittest.AsyncTestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self._directory = tempdir.name
+
+    @aioresponses()
+    async def test_prefetch_from_pubnub(self, mock):
+        mock.get(IMAGE_URL, body=b"new image")
+        doorbell = DoorbellDetail(json.loads(load_fixture("get_doorbell.json")))
+        doorbell._pubsub_channel = "channel"
+        august_pubnub = AugustPubNub()
+        august_pubnub.register_device(doorbell)
+        cache = DoorbellImageCache(self._directory)
+
+        async with ClientSession() as session:
+            prefetcher = DoorbellImagePrefetcher(cache, session)
+            prefetcher.add_doorbell_detail(doorbell)
+            unsubscribe = prefetcher.subscribe_pubnub(august_pubnub)
+
+            for _ in range(2):
+                august_pubnub.message(
+                    None,
+                    MagicMock(
+                        channel="channel",
+                        timetoken="16159387543830000",
+                        message=_image_capture_message(),
+                    ),
+                )
+            created_at = dateutil.parser.parse(CREATED_AT)
+            assert prefetcher.pending == {image_cache_key(IMAGE_URL, created_at)}
+            # Asking again hands back the download in progress
+            await prefetcher.prefetch(IMAGE_URL, created_at)
+
+            # The doorbell is left for the integration to update
+            assert doorbell.image_url != IMAGE_URL
+            assert image_cache_key(IMAGE_URL, created_at) in cache
+            assert prefetcher.pending == set()
+            (activity,) = activities_from_pubnub_message(
+                doorbell, created_at, _image_capture_message()
+            )
+            assert update_doorbell_image_from_activity(doorbell, activity)
+            assert doorbell.image_created_at_datetime == created_at
+            assert (
+                await doorbell.async_get_doorbell_image(session, image_cache=cache)
+                == b"new image"
+            )
+            unsubscribe()
+            assert august_pubnub._event_subscriptions == []
+
+    async def test_bounded_concurrency(self):
+        running = 0
+        max_running = 0
+
+        async def _async_get_image(session, image_url, image_created_at, timeout):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if image_url.endswith("3"):
+                raise ValueError("download failed")
+
+        cache = MagicMock()
+        cache.__contains__.return_value = False
+        cache.async_get_image = _async_get_image
+        prefetcher = DoorbellImagePrefetcher(cache, None, max_concurrent=2)
+        tasks = [
+            prefetcher.prefetch(f"https://image.com/{index}") for index in range(6)
+        ]
+        await asyncio.gather(*tasks)
+        assert max_running == 2
+        assert prefetcher.pending == set()
+
+        cache.__contains__.return_value = True
+        assert prefetcher.prefetch("https://image.com/0") is None
+
+    async def test_old_images_are_ignored(self):
+        doorbell = DoorbellDetail(json.loads(load_fixture("get_doorbell.json")))
+        august_pubnub = AugustPubNub()
+        doorbell._pubsub_channel = "channel"
+        august_pubnub.register_device(doorbell)
+        prefetcher = DoorbellImagePrefetcher(MagicMock(), None)
+        prefetcher.add_doorbell_detail(doorbell)
+        prefetcher.subscribe_pubnub(august_pubnub)
+
+        august_pubnub.message(
+            None,
+            MagicMock(
+                channel="channel",
+                timetoken="16159387543830000",
+                message=_image_capture_message(created_at="2000-01-01T00:00:00.000Z"),
+            ),
+        )
+        assert prefetcher.pending == set()
+
+
+class TestDoorbellImagePrefetcherLoops(unittest.TestCase):
+    def test_created_outside_of_the_event_loop(self):
+        async def _async_get_image(session, image_url, image_created_at, timeout):
+            await asyncio.sleep(0.01)
+
+        cache = MagicMock()
+        cache.__contains__.return_value = False
+        cache.async_get_image = _async_get_image
+        cache.async_stop = AsyncMock()
+        prefetcher = DoorbellImagePrefetcher(cache, None, max_concurrent=1)
+
+        async def _async_prefetch():
+            await asyncio.gather(
+                *(
+                    prefetcher.prefetch(f"https://image.com/{index}")
+                    for index in range(3)
+                )
+            )
+            await prefetcher.async_stop()
+
+        for _ in range(2):
+            asyncio.run(_async_prefetch())
+        assert prefetcher.pending == set()
+        assert cache.async_stop.await_count == 2
@@ -0,0 +1,67 @@
+import subprocess
+import sys
+import unittest
+
+from requests.exceptions import HTTPError
+
+import yalexs.exceptions
+from yalexs.exceptions import AugustApiHTTPError
+
+HEAVY_MODULES = {"requests", "jwt", "dateutil", "pubnub.pubnub_asyncio", "aiofiles"}
+
+
+def _imported_modules(module):
+    """Import a module in a fresh interpreter and return what was imported.
+
+    Uses python -X importtime which reports the cumulative import
+    time in microseconds of every module that gets loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            imported[name.strip()] = int(cumulative)
+    return imported
+
+
+class TestImports(unittest.TestCase):
+    def _assert_not_imported(self, module, not_imported):
+        imported = _imported_modules(module)
+        self.assertIn(module, imported)
+        self.assertEqual(
+            set(),
+            not_imported & set(imported),
+            f"{module} took {imported[module]}us to import",
+        )
+
+    def test_api_async_import(self):
+        self._assert_not_imported("yalexs.api_async", HEAVY_MODULES)
+
+    def test_authenticator_async_import(self):
+        self._assert_not_imported("yalexs.authenticator_async", HEAVY_MODULES)
+
+    def test_pubnub_async_import(self):
+        self._assert_not_imported(
+            "yalexs.pubnub_async", HEAVY_MODULES | {"yalexs.api_common"}
+        )
+
+    def test_pubnub_activity_import(self):
+        self._assert_not_imported(
+            "yalexs.pubnub_activity", HEAVY_MODULES | {"aiohttp", "pubnub"}
+        )
+
+    def test_exceptions_import(self):
+        self._assert_not_imported("yalexs.exceptions", HEAVY_MODULES)
+        assert issubclass(AugustApiHTTPError, HTTPError)
+        assert AugustApiHTTPError.__qualname__ == "AugustApiHTTPError"
+        assert yalexs.exceptions.AugustApiHTTPError is AugustApiHTTPError
+        with self.assertRaises(AttributeError):
+            yalexs.exceptions.DoesNotExist
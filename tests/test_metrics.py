@@ -0,0 +1,88 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from requests.exceptions import HTTPError
+import requests_mock
+
+from yalexs.api import Api
+from yalexs.api_common import API_GET_LOCK_URL, API_UNLOCK_URL
+from yalexs.exceptions import AugustApiHTTPError
+from yalexs.metrics import MetricsRegistry, prometheus_text
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    @requests_mock.Mocker()
+    def test_metrics(self, mock):
+        mock.register_uri(
+            "get",
+            API_GET_LOCK_URL.format(lock_id="ABC"),
+            [
+                {"status_code": 429},
+                {"text": load_fixture("get_lock.online.json")},
+                {"text": load_fixture("get_lock.online.json")},
+            ],
+        )
+        mock.register_uri("put", API_UNLOCK_URL.format(lock_id="ABC"), status_code=423)
+        registry = MetricsRegistry(buckets=(1, 0.5))
+        api = Api()
+        api.add_middleware(registry)
+
+        with patch("yalexs.api.API_RETRY_TIME", 0):
+            api.get_lock_detail(ACCESS_TOKEN, "ABC")
+            api.get_lock_detail(ACCESS_TOKEN, "ABC")
+        with self.assertRaises(AugustApiHTTPError):
+            api.unlock(ACCESS_TOKEN, "ABC")
+
+        snapshot = registry.snapshot()
+        lock_detail = snapshot["get_lock_detail"]
+        assert lock_detail["requests"] == 2
+        assert lock_detail["retries"] == 1
+        assert lock_detail["rate_limited"] == 1
+        assert lock_detail["errors"] == {}
+        assert list(lock_detail["latency"]["buckets"]) == [0.5, 1, float("inf")]
+        assert lock_detail["latency"]["count"] == 2
+        assert snapshot["remoteoperate_unlock"]["errors"] == {"AugustApiHTTPError": 1}
+
+        text = prometheus_text(registry)
+        assert 'yalexs_api_requests_total{endpoint="get_lock_detail"} 2' in text
+        assert (
+            'yalexs_api_errors_total{endpoint="remoteoperate_unlock",'
+            'error="AugustApiHTTPError"} 1'
+        ) in text
+        assert (
+            'yalexs_api_request_duration_seconds_bucket{endpoint="get_lock_detail",'
+            'le="+Inf"} 2'
+        ) in text
+        assert "# TYPE yalexs_api_request_duration_seconds histogram" in text
+
+        registry.reset()
+        assert registry.snapshot() == {}
+
+    @requests_mock.Mocker()
+    def test_final_rate_limit_is_not_a_retry(self, mock):
+        mock.register_uri(
+            "get", API_GET_LOCK_URL.format(lock_id="ABC"), status_code=429
+        )
+        registry = MetricsRegistry(threadsafe=False)
+        api = Api(middlewares=[registry])
+
+        with patch("yalexs.api.API_RETRY_TIME", 0), patch(
+            "yalexs.api.API_RETRY_ATTEMPTS", 3
+        ), self.assertRaises(HTTPError):
+            api.get_lock_detail(ACCESS_TOKEN, "ABC")
+
+        lock_detail = registry.snapshot()["get_lock_detail"]
+        assert mock.call_count == 3
+        assert lock_detail["retries"] == 2
+        assert lock_detail["rate_limited"] == 2
+        assert lock_detail["errors"] == {"HTTPError": 1}
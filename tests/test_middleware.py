@@ -0,0 +1,164 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+from aiohttp import ClientSession
+from aioresponses import aioresponses
+import aiounittest
+import requests_mock
+
+from yalexs.api import Api
+from yalexs.api_async import ApiAsync
+from yalexs.api_common import (
+    API_GET_LOCK_URL,
+    API_GET_LOCKS_URL,
+    API_LOCK_ASYNC_URL,
+    API_UNLOCK_URL,
+    HYPER_BRIDGE_PARAM,
+)
+from yalexs.exceptions import AugustApiAIOHTTPError, AugustApiHTTPError
+from yalexs.middleware import ApiMiddleware, _MiddlewareChain
+from yalexs.transport import AsyncTransport
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+class RecordingMiddleware(ApiMiddleware):
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def before_request(self, context):
+        context.kwargs["headers"][f"x-{self.name}"] = str(context.attempt)
+        self.calls.append((self.name, "before_request", context.attempt))
+
+    def after_response(self, context):
+        assert context.elapsed >= context.attempt_elapsed >= 0
+        self.calls.append((self.name, "after_response", context.status))
+
+    def on_retry(self, context):
+        self.calls.append((self.name, "on_retry", context.status))
+
+    def on_error(self, context):
+        self.calls.append((self.name, "on_error", type(context.error)))
+
+
+class TestApiMiddleware(unittest.TestCase):
+    @requests_mock.Mocker()
+    def test_middleware_order_and_retry(self, mock):
+        mock.register_uri(
+            "get",
+            API_GET_LOCK_URL.format(lock_id="ABC"),
+            [
+                {"status_code": 429},
+                {"text": load_fixture("get_lock.online.json")},
+            ],
+        )
+        calls = []
+        endpoints = []
+        api = Api(middlewares=[RecordingMiddleware("outer", calls)])
+        api.add_middleware(RecordingMiddleware("inner", calls))
+        remove = api.add_middleware(ApiMiddleware())
+        remove()
+
+        class EndpointMiddleware(ApiMiddleware):
+            def before_request(self, context):
+                endpoints.append(context.endpoint)
+
+        api.add_middleware(EndpointMiddleware())
+
+        with patch("yalexs.api.API_RETRY_TIME", 0):
+            api.get_lock_detail(ACCESS_TOKEN, "ABC")
+
+        assert calls == [
+            ("outer", "before_request", 1),
+            ("inner", "before_request", 1),
+            ("inner", "on_retry", 429),
+            ("outer", "on_retry", 429),
+            ("outer", "before_request", 2),
+            ("inner", "before_request", 2),
+            ("inner", "after_response", 200),
+            ("outer", "after_response", 200),
+        ]
+        assert endpoints == ["get_lock_detail", "get_lock_detail"]
+        assert mock.last_request.headers["x-outer"] == "2"
+
+    @requests_mock.Mocker()
+    def test_middleware_on_error(self, mock):
+        mock.register_uri("put", API_UNLOCK_URL.format(lock_id="ABC"), status_code=423)
+        calls = []
+        api = Api(middlewares=[RecordingMiddleware("outer", calls)])
+
+        with self.assertRaises(AugustApiHTTPError):
+            api.unlock(ACCESS_TOKEN, "ABC")
+
+        assert calls[-1] == ("outer", "on_error", AugustApiHTTPError)
+
+    def test_chain_skips_hooks_that_are_not_overridden(self):
+        calls = []
+        recording = RecordingMiddleware("recording", calls)
+        assert not _MiddlewareChain([ApiMiddleware()])
+        chain = _MiddlewareChain([ApiMiddleware(), recording])
+        assert chain
+        assert chain.before_request == (recording.before_request,)
+        assert chain.on_error == (recording.on_error,)
+
+
+class TestApiAsyncMiddleware(aiounittest.AsyncTestCase):
+    @aioresponses()
+    async def test_middleware_endpoint_and_error(self, mock):
+        mock.get(API_GET_LOCKS_URL, body=load_fixture("get_locks.json"))
+        mock.put(
+            (API_LOCK_ASYNC_URL + HYPER_BRIDGE_PARAM).format(lock_id="ABC"),
+            status=422,
+        )
+        contexts = []
+
+        class ContextMiddleware(ApiMiddleware):
+            def after_response(self, context):
+                contexts.append((context.endpoint, context.status))
+
+            def on_error(self, context):
+                contexts.append((context.endpoint, context.error))
+
+        api = ApiAsync(ClientSession(), middlewares=[ContextMiddleware()])
+        await api.async_get_locks(ACCESS_TOKEN)
+        with self.assertRaises(AugustApiAIOHTTPError):
+            await api.async_lock_async(ACCESS_TOKEN, "ABC")
+
+        assert contexts[0] == ("get_locks", 200)
+        assert contexts[1][0] == "remoteoperate_lock_async"
+        assert isinstance(contexts[1][1], AugustApiAIOHTTPError)
+
+    async def test_middleware_on_cancel(self):
+        started = asyncio.Event()
+
+        class HangingTransport(AsyncTransport):
+            async def async_request(self, method, url, **kwargs):
+                started.set()
+                await asyncio.Event().wait()
+
+        calls = []
+        api = ApiAsync(
+            None,
+            transport=HangingTransport(),
+            middlewares=[RecordingMiddleware("outer", calls)],
+        )
+        task = asyncio.ensure_future(api.async_get_locks(ACCESS_TOKEN))
+        await started.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        assert calls == [
+            ("outer", "before_request", 1),
+            ("outer", "on_error", asyncio.CancelledError),
+        ]
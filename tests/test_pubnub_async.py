@@ -0,0 +1,125 @@
+import datetime
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pubnub.enums import PNStatusCategory
+
+from yalexs.activity import LockOperationActivity
+from yalexs.lock import LockDetail
+from yalexs.pubnub_activity import activities_from_pubnub_message
+from yalexs.pubnub_async import AugustPubNub, PubNubEvent
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+def _make_pubnub():
+    lock = LockDetail(json.loads(load_fixture("get_lock.doorsense_init.json")))
+    lock._pubsub_channel = "channel"
+    august_pubnub = AugustPubNub()
+    august_pubnub.register_device(lock)
+    return lock, august_pubnub
+
+
+def _make_message(message):
+    return MagicMock(channel="channel", timetoken="16159387543830000", message=message)
+
+
+class TestAugustPubNub(unittest.TestCase):
+    def test_message_shared_event(self):
+        lock, august_pubnub = _make_pubnub()
+        events = []
+        calls = []
+        august_pubnub.subscribe_events(events.append)
+        august_pubnub.subscribe(lambda *args: calls.append(args))
+        august_pubnub.subscribe(lambda *args: calls.append(args))
+
+        august_pubnub.message(
+            None,
+            _make_message(
+                {"remoteEvent": 1, "status": "locked", "info": {"action": "lock"}}
+            ),
+        )
+
+        assert len(events) == 1
+        event = events[0]
+        assert isinstance(event, PubNubEvent)
+        assert event.device_id == lock.device_id
+        assert event.channel == "channel"
+        assert event.timetoken == 16159387543830000
+        assert event.date_time == datetime.datetime(
+            2021, 3, 16, 23, 52, 34, 383000, tzinfo=datetime.timezone.utc
+        )
+        assert calls[0] == (lock.device_id, event.date_time, event.message)
+        # Legacy subscribers keep getting the pubnub dict
+        assert isinstance(calls[0][2], dict)
+        assert json.loads(json.dumps(calls[0][2])) == calls[0][2]
+
+        with self.assertRaises(TypeError):
+            event.message["status"] = "unlocked"
+        with self.assertRaises(TypeError):
+            event.message["info"]["remote"] = True
+        with self.assertRaises(AttributeError):
+            event.date_time = None
+
+        activities = activities_from_pubnub_message(
+            lock, event.date_time, event.message
+        )
+        assert isinstance(activities[0], LockOperationActivity)
+        assert activities[0].operated_remote is True
+        assert "remote" not in event.message["info"]
+
+    def test_unsubscribe_events(self):
+        _, august_pubnub = _make_pubnub()
+        events = []
+        unsub = august_pubnub.subscribe_events(events.append)
+        unsub()
+        august_pubnub.message(None, _make_message({"status": "locked"}))
+        assert events == []
+
+    def test_reconnect_forces_refresh(self):
+        lock, august_pubnub = _make_pubnub()
+        events = []
+        calls = []
+        august_pubnub.subscribe_events(events.append)
+        august_pubnub.subscribe(lambda *args: calls.append(args))
+
+        august_pubnub.status(
+            MagicMock(), MagicMock(category=PNStatusCategory.PNReconnectedCategory)
+        )
+
+        assert august_pubnub.connected is True
+        assert len(events) == 1
+        assert events[0].device_id == lock.device_id
+        assert events[0].timetoken is None
+        assert dict(events[0].message) == {}
+        assert calls[0][0] == lock.device_id
+
+    def test_reconnect_messages_are_not_shared(self):
+        _, august_pubnub = _make_pubnub()
+        calls = []
+        august_pubnub.subscribe(lambda *args: args[2].setdefault("seen", True))
+        august_pubnub.subscribe(lambda *args: calls.append(args))
+
+        august_pubnub.status(
+            MagicMock(), MagicMock(category=PNStatusCategory.PNReconnectedCategory)
+        )
+
+        assert calls[0][2] == {}
+
+    def test_no_event_without_event_subscribers(self):
+        _, august_pubnub = _make_pubnub()
+        calls = []
+        august_pubnub.subscribe(lambda *args: calls.append(args))
+
+        with patch("yalexs.pubnub_async.freeze_message") as freeze:
+            august_pubnub.message(None, _make_message({"status": "locked"}))
+
+        freeze.assert_not_called()
+        assert calls[0][2] == {"status": "locked"}
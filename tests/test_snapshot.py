@@ -0,0 +1,160 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+from aiohttp import ClientSession
+from aioresponses import aioresponses
+import aiounittest
+import dateutil.parser
+
+from yalexs.api_async import ApiAsync
+from yalexs.api_common import API_GET_DOORBELL_URL, API_GET_LOCK_URL
+from yalexs.doorbell import DoorbellDetail
+from yalexs.lock import LockDetail, LockDoorStatus, LockStatus
+from yalexs.snapshot import (
+    async_load_snapshot,
+    async_save_snapshot,
+    async_warm_start,
+    from_snapshot,
+    load_snapshot,
+    save_snapshot,
+    to_snapshot,
+)
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+def _updated_lock():
+    lock = LockDetail(json.loads(load_fixture("get_lock.online_with_doorsense.json")))
+    lock.lock_status = LockStatus.UNLOCKED
+    lock.lock_status_datetime = datetime.datetime(
+        2021, 1, 1, 1, 1, 1, tzinfo=datetime.timezone.utc
+    )
+    lock.door_state = LockDoorStatus.CLOSED
+    lock.door_state_datetime = datetime.datetime(
+        2021, 1, 1, 2, 2, 2, tzinfo=datetime.timezone.utc
+    )
+    lock.set_online(False)
+    return lock
+
+
+def _updated_doorbell():
+    doorbell = DoorbellDetail(json.loads(load_fixture("get_doorbell.json")))
+    doorbell.image_url = "https://my.updated.image/image.jpg"
+    doorbell.image_created_at_datetime = dateutil.parser.parse("2020-02-20T17:44:45Z")
+    return doorbell
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_round_trip(self):
+        snapshot = json.loads(
+            json.dumps(to_snapshot([_updated_lock(), _updated_doorbell()]))
+        )
+        lock, doorbell = from_snapshot(snapshot)
+
+        assert isinstance(lock, LockDetail)
+        assert lock.device_id == "ABC"
+        assert lock.lock_status == LockStatus.UNLOCKED
+        assert lock.lock_status_datetime == datetime.datetime(
+            2021, 1, 1, 1, 1, 1, tzinfo=datetime.timezone.utc
+        )
+        assert lock.door_state == LockDoorStatus.CLOSED
+        assert lock.door_state_datetime == datetime.datetime(
+            2021, 1, 1, 2, 2, 2, tzinfo=datetime.timezone.utc
+        )
+        assert lock.doorsense is True
+        assert lock.bridge_is_online is False
+
+        assert isinstance(doorbell, DoorbellDetail)
+        assert doorbell.device_id == "K98GiDT45GUL"
+        assert doorbell.image_url == "https://my.updated.image/image.jpg"
+        assert doorbell.image_created_at_datetime == dateutil.parser.parse(
+            "2020-02-20T17:44:45Z"
+        )
+
+    def test_round_trip_without_status(self):
+        lock = LockDetail(
+            json.loads(load_fixture("get_lock.online_with_doorsense_disabled.json"))
+        )
+        restored = from_snapshot(to_snapshot([lock]))[0]
+        assert restored.door_state == lock.door_state
+        assert restored.doorsense is lock.doorsense
+
+    def test_unsupported_version(self):
+        assert from_snapshot({"version": 0, "devices": [{}]}) == []
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "snapshot.json")
+            assert load_snapshot(path) == []
+            save_snapshot(path, [_updated_lock()])
+            assert [lock.lock_status for lock in load_snapshot(path)] == [
+                LockStatus.UNLOCKED
+            ]
+            assert os.listdir(tmpdir) == ["snapshot.json"]
+
+            for contents in ("not json", "[]", '{"version": 1, "devices": 1}'):
+                with open(path, "w") as file:
+                    file.write(contents)
+                assert load_snapshot(path) == []
+
+            # A directory exists but cannot be opened as a file
+            assert load_snapshot(tmpdir) == []
+
+
+class TestSnapshotAsync(aiounittest.AsyncTestCase):
+    async def test_async_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "snapshot.json")
+            assert await async_load_snapshot(path) == []
+            await async_save_snapshot(path, [_updated_doorbell()])
+            doorbells = await async_load_snapshot(path)
+            assert doorbells[0].image_url == "https://my.updated.image/image.jpg"
+            assert await async_load_snapshot(tmpdir) == []
+
+    @aioresponses()
+    async def test_async_warm_start(self, mock):
+        mock.get(
+            API_GET_LOCK_URL.format(lock_id="ABC"),
+            body=load_fixture("get_lock.online_with_doorsense.json"),
+        )
+        mock.get(API_GET_DOORBELL_URL.format(doorbell_id="K98GiDT45GUL"), status=500)
+        api = ApiAsync(ClientSession())
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "snapshot.json")
+            save_snapshot(path, [_updated_lock(), _updated_doorbell()])
+
+            device_details, refresh_task = await async_warm_start(
+                api, ACCESS_TOKEN, path
+            )
+            assert device_details["ABC"].lock_status == LockStatus.UNLOCKED
+            assert (
+                device_details["K98GiDT45GUL"].image_url
+                == "https://my.updated.image/image.jpg"
+            )
+
+            fresh_details = await refresh_task
+            assert fresh_details["ABC"] is not device_details["ABC"]
+            assert fresh_details["ABC"].lock_status == LockStatus.LOCKED
+            # The doorbell failed to refresh so the snapshot is kept
+            assert fresh_details["K98GiDT45GUL"] is device_details["K98GiDT45GUL"]
+
+            restored = {
+                device_detail.device_id: device_detail
+                for device_detail in load_snapshot(path)
+            }
+            assert restored["ABC"].lock_status == LockStatus.LOCKED
+            assert (
+                restored["K98GiDT45GUL"].image_url
+                == "https://my.updated.image/image.jpg"
+            )
@@ -0,0 +1,134 @@
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+from yalexs.activity import (
+    SOURCE_LOG,
+    SOURCE_PUBNUB,
+    BridgeOperationActivity,
+    DoorbellMotionActivity,
+    DoorOperationActivity,
+    LockOperationActivity,
+)
+from yalexs.lock import LockDetail, LockDoorStatus, LockStatus
+from yalexs.state_store import LockStateStore
+import yalexs.util
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+def _bridge_activity(device_id, action, date_time):
+    return BridgeOperationActivity(
+        SOURCE_PUBNUB,
+        {"action": action, "dateTime": date_time, "deviceID": device_id},
+    )
+
+
+class TestLockStateStore(unittest.TestCase):
+    def test_apply_activities_uses_latest_per_lock(self):
+        lock = LockDetail(
+            json.loads(load_fixture("get_lock.online_with_doorsense.json"))
+        )
+        other_lock = LockDetail(json.loads(load_fixture("get_lock.online.json")))
+        store = LockStateStore([lock, other_lock])
+        assert store.get_lock_detail(lock.device_id) is lock
+        self.assertEqual(LockStatus.LOCKED, lock.lock_status)
+        self.assertEqual(LockDoorStatus.OPEN, lock.door_state)
+        other_lock_status = other_lock.lock_status
+
+        activities = [
+            DoorOperationActivity(
+                SOURCE_LOG, json.loads(load_fixture("door_closed_activity.json"))
+            ),
+            LockOperationActivity(
+                SOURCE_LOG, json.loads(load_fixture("lock_activity.json"))
+            ),
+            DoorOperationActivity(
+                SOURCE_LOG, json.loads(load_fixture("door_open_activity.json"))
+            ),
+            LockOperationActivity(
+                SOURCE_LOG, json.loads(load_fixture("unlock_activity.json"))
+            ),
+            _bridge_activity(lock.device_id, "associated_bridge_online", 1000),
+            _bridge_activity(lock.device_id, "associated_bridge_offline", 2000),
+            _bridge_activity(lock.device_id, "associated_bridge_online", 1500),
+            _bridge_activity("unknown", "associated_bridge_offline", 3000),
+            DoorbellMotionActivity(
+                SOURCE_LOG, json.loads(load_fixture("doorbell_motion_activity.json"))
+            ),
+        ]
+
+        with patch(
+            "yalexs.state_store.update_lock_detail_from_activity",
+            wraps=yalexs.util.update_lock_detail_from_activity,
+        ) as mock_update:
+            updated = store.apply_activities(activities)
+
+        assert updated == {lock.device_id}
+        assert mock_update.call_count == 3
+        self.assertEqual(LockStatus.LOCKED, lock.lock_status)
+        self.assertEqual(LockDoorStatus.OPEN, lock.door_state)
+        assert lock.bridge_is_online is False
+        assert other_lock.lock_status == other_lock_status
+
+        # Applying the same batch again is a noop for lock and door
+        assert store.apply_activities(activities[:4]) == set()
+
+    def test_remove_lock_detail(self):
+        lock = LockDetail(
+            json.loads(load_fixture("get_lock.online_with_doorsense.json"))
+        )
+        store = LockStateStore()
+        store.add_lock_detail(lock)
+        assert list(store.lock_details) == [lock]
+        store.remove_lock_detail(lock.device_id)
+        assert store.get_lock_detail(lock.device_id) is None
+        assert (
+            store.apply_activities(
+                [
+                    LockOperationActivity(
+                        SOURCE_LOG, json.loads(load_fixture("unlock_activity.json"))
+                    )
+                ]
+            )
+            == set()
+        )
+
+    def test_subscribe_to_changes(self):
+        lock = LockDetail(
+            json.loads(load_fixture("get_lock.online_with_doorsense.json"))
+        )
+        store = LockStateStore([lock])
+        published = []
+        unsub = store.subscribe(published.append)
+        unlock_operation_activity = LockOperationActivity(
+            SOURCE_LOG, json.loads(load_fixture("unlock_activity.json"))
+        )
+
+        store.apply_activities([unlock_operation_activity])
+        assert len(published) == 1
+        assert [(change.field, change.new_value) for change in published[0]] == [
+            ("lock_status", LockStatus.UNLOCKED),
+            ("lock_status_datetime", lock.lock_status_datetime),
+        ]
+        assert published[0][0].activity is unlock_operation_activity
+
+        # Nothing changed so nothing is published
+        store.apply_activities([unlock_operation_activity])
+        assert len(published) == 1
+
+        unsub()
+        store.apply_activities(
+            [
+                LockOperationActivity(
+                    SOURCE_LOG, json.loads(load_fixture("lock_activity.json"))
+                )
+            ]
+        )
+        assert len(published) == 1
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from aiohttp import ClientResponseError, ClientSession
+from aioresponses import aioresponses
+import aiounittest
+import requests
+import requests_mock
+
+from yalexs.doorbell import DoorbellDetail
+
+IMAGE = bytes(range(256)) * 1000
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+def _make_doorbell():
+    return DoorbellDetail(json.loads(load_fixture("get_doorbell.json")))
+
+
+class _AsyncSink:
+    def __init__(self):
+        self.chunks = []
+
+    async def write(self, chunk):
+        self.chunks.append(chunk)
+
+
+class TestStreamingAsync(aiounittest.AsyncTestCase):
+    @aioresponses()
+    async def test_stream_to_destinations(self, mock):
+        doorbell = _make_doorbell()
+        mock.get(doorbell.image_url, body=IMAGE, repeat=True)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "image.jpg")
+            async with ClientSession() as session:
+                size = await doorbell.async_stream_doorbell_image(session, path)
+                assert size == len(IMAGE)
+                with open(path, "rb") as file:
+                    assert file.read() == IMAGE
+
+                file_object = io.BytesIO()
+                await doorbell.async_stream_doorbell_image(session, file_object)
+                assert file_object.getvalue() == IMAGE
+
+                sink = _AsyncSink()
+                await doorbell.async_stream_doorbell_image(
+                    session, sink, chunk_size=1024
+                )
+                assert b"".join(sink.chunks) == IMAGE
+                assert max(len(chunk) for chunk in sink.chunks) <= 1024
+
+    @aioresponses()
+    async def test_read_into_reused_buffer(self, mock):
+        doorbell = _make_doorbell()
+        mock.get(doorbell.image_url, body=IMAGE)
+        mock.get(doorbell.image_url, body=b"small")
+        buffer = bytearray(1024)
+        async with ClientSession() as session:
+            with await doorbell.async_get_doorbell_image_into(session, buffer) as image:
+                assert image == IMAGE
+            assert len(buffer) == len(IMAGE)
+
+            with await doorbell.async_get_doorbell_image_into(session, buffer) as image:
+                assert image == b"small"
+            assert len(buffer) == len(IMAGE)
+
+    @aioresponses()
+    async def test_error_is_raised(self, mock):
+        doorbell = _make_doorbell()
+        mock.get(doorbell.image_url, status=404)
+        file_object = io.BytesIO()
+        async with ClientSession() as session:
+            with self.assertRaises(ClientResponseError):
+                await doorbell.async_stream_doorbell_image(session, file_object)
+        assert file_object.getvalue() == b""
+
+
+class TestStreaming(unittest.TestCase):
+    @requests_mock.Mocker()
+    def test_stream_to_destinations(self, mock):
+        doorbell = _make_doorbell()
+        mock.register_uri("get", doorbell.image_url, content=IMAGE)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "image.jpg")
+            assert doorbell.stream_doorbell_image(path) == len(IMAGE)
+            with open(path, "rb") as file:
+                assert file.read() == IMAGE
+
+        file_object = io.BytesIO()
+        doorbell.stream_doorbell_image(file_object, http_session=requests.Session())
+        assert file_object.getvalue() == IMAGE
+        assert mock.last_request.stream is True
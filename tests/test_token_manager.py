@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+import aiounittest
+import jwt
+
+from yalexs.authenticator_async import AuthenticatorAsync
+from yalexs.authenticator_common import Authentication, AuthenticationState
+from yalexs.token_manager import TokenRefreshManager
+
+RENEWAL_THRESHOLD = timedelta(days=7)
+
+
+def _make_token(expires_in):
+    return jwt.encode(
+        {"exp": int(time.time() + expires_in)}, "test-secret-key-that-is-long-enough"
+    )
+
+
+def _make_authenticator(api, expires_in):
+    authenticator = AuthenticatorAsync(
+        api,
+        "email",
+        "user",
+        "pass",
+        access_token_renewal_threshold=RENEWAL_THRESHOLD,
+    )
+    expires = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+    authenticator._authentication = Authentication(
+        AuthenticationState.AUTHENTICATED,
+        access_token="old_token",
+        access_token_expires=expires.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    )
+    return authenticator
+
+
+class TestTokenRefreshManager(aiounittest.AsyncTestCase):
+    async def test_refresh_is_coalesced(self):
+        release = asyncio.Event()
+
+        async def _async_refresh_access_token(access_token):
+            await release.wait()
+            return _make_token(timedelta(days=30).total_seconds())
+
+        api = MagicMock()
+        api.async_refresh_access_token = AsyncMock(
+            side_effect=_async_refresh_access_token
+        )
+        authenticator = _make_authenticator(api, 3600)
+        manager = TokenRefreshManager()
+
+        refreshes = [
+            asyncio.ensure_future(manager.async_refresh(authenticator))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        assert authenticator.authentication.access_token == "old_token"
+        release.set()
+        results = await asyncio.gather(*refreshes)
+
+        api.async_refresh_access_token.assert_called_once_with("old_token")
+        assert results[0] is results[1] is results[2]
+        assert results[0] is authenticator.authentication
+        assert authenticator.authentication.access_token != "old_token"
+
+    async def test_background_refresh(self):
+        running = 0
+        max_running = 0
+
+        async def _async_refresh_access_token(access_token):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return _make_token(timedelta(days=30).total_seconds())
+
+        api = MagicMock()
+        api.async_refresh_access_token = AsyncMock(
+            side_effect=_async_refresh_access_token
+        )
+        manager = TokenRefreshManager(max_concurrent=2, jitter=timedelta(0))
+        due = [_make_authenticator(api, 3600) for _ in range(4)]
+        later = _make_authenticator(api, timedelta(days=20).total_seconds())
+        for authenticator in (*due, later):
+            manager.add(authenticator)
+        remove = manager.add(_make_authenticator(api, 3600))
+        remove()
+
+        manager.start()
+        for _ in range(100):
+            if api.async_refresh_access_token.call_count == 4:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.02)
+        await manager.async_stop()
+
+        assert api.async_refresh_access_token.call_count == 4
+        assert max_running == 2
+        for authenticator in due:
+            assert authenticator.authentication.access_token != "old_token"
+            assert manager.next_refresh(authenticator) > time.time() + 3600
+        assert later.authentication.access_token == "old_token"
+
+    async def test_failed_refresh_is_retried(self):
+        api = MagicMock()
+        api.async_refresh_access_token = AsyncMock(side_effect=TimeoutError)
+        manager = TokenRefreshManager(retry_interval=timedelta(minutes=1))
+        authenticator = _make_authenticator(api, 3600)
+        manager.add(authenticator)
+
+        with self.assertRaises(TimeoutError):
+            await manager.async_refresh(authenticator, force=True)
+        assert 50 < manager.next_refresh(authenticator) - time.time() <= 60
+
+
+class TestTokenRefreshManagerLoops(unittest.TestCase):
+    def test_created_outside_of_the_event_loop(self):
+        async def _async_refresh_access_token(access_token):
+            await asyncio.sleep(0.01)
+            return _make_token(timedelta(days=30).total_seconds())
+
+        api = MagicMock()
+        api.async_refresh_access_token = AsyncMock(
+            side_effect=_async_refresh_access_token
+        )
+        manager = TokenRefreshManager(max_concurrent=1)
+
+        async def _async_refresh_all():
+            manager.start()
+            await asyncio.gather(
+                *(
+                    manager.async_refresh(_make_authenticator(api, 3600))
+                    for _ in range(2)
+                )
+            )
+            await manager.async_stop()
+
+        for _ in range(2):
+            asyncio.run(_async_refresh_all())
+        assert api.async_refresh_access_token.call_count == 4
@@ -0,0 +1,270 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiounittest
+import jwt
+
+from yalexs.authenticator import Authenticator
+from yalexs.authenticator_async import AuthenticatorAsync
+from yalexs.authenticator_common import Authentication, AuthenticationState
+from yalexs.cache_file import cache_file_lock
+from yalexs.token_store import (
+    FileTokenStore,
+    MemoryTokenStore,
+    SQLiteTokenStore,
+    async_setup_authentications,
+)
+
+
+def _make_authentication(token, expires_in=timedelta(days=30)):
+    expires = datetime.now(timezone.utc) + expires_in
+    return Authentication(
+        AuthenticationState.AUTHENTICATED,
+        install_id="install_id",
+        access_token=token,
+        access_token_expires=expires.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    )
+
+
+def _make_token():
+    return jwt.encode(
+        {"exp": int(time.time() + timedelta(days=30).total_seconds())},
+        "test-secret-key-that-is-long-enough",
+    )
+
+
+class TestTokenStores(unittest.TestCase):
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tempdir.cleanup)
+
+    def _assert_round_trip(self, store):
+        assert store.load_many(["a", "b"]) == {}
+        store.save_many(
+            {"a": _make_authentication("token_a"), "b": _make_authentication("token_b")}
+        )
+        store.save("c", _make_authentication("token_c"))
+        store.save("a", _make_authentication("token_a2"))
+
+        loaded = store.load_many(["a", "b", "missing"])
+        assert set(loaded) == {"a", "b"}
+        assert loaded["a"].access_token == "token_a2"
+        assert loaded["b"].state == AuthenticationState.AUTHENTICATED
+        assert loaded["b"].install_id == "install_id"
+        assert store.load("c").access_token == "token_c"
+        assert store.load("missing") is None
+
+    def test_memory_store(self):
+        self._assert_round_trip(MemoryTokenStore())
+
+    def test_file_store(self):
+        path = os.path.join(self._tempdir.name, "tokens.json")
+        self._assert_round_trip(FileTokenStore(path))
+        assert sorted(os.listdir(self._tempdir.name)) == [
+            "tokens.json",
+            "tokens.json.lock",
+        ]
+        assert FileTokenStore(path).load("a").access_token == "token_a2"
+
+    def test_file_store_write_is_atomic(self):
+        path = os.path.join(self._tempdir.name, "tokens.json")
+        store = FileTokenStore(path)
+        store.save("a", _make_authentication("token_a"))
+        with patch("yalexs.token_store.os.replace", side_effect=OSError):
+            with self.assertRaises(OSError):
+                store.save("a", _make_authentication("token_a2"))
+        assert store.load("a").access_token == "token_a"
+        assert sorted(os.listdir(self._tempdir.name)) == [
+            "tokens.json",
+            "tokens.json.lock",
+        ]
+
+    def test_file_store_save_waits_for_other_processes(self):
+        path = os.path.join(self._tempdir.name, "tokens.json")
+        store = FileTokenStore(path)
+        with cache_file_lock(path):
+            thread = threading.Thread(
+                target=store.save, args=("a", _make_authentication("token_a"))
+            )
+            thread.start()
+            thread.join(0.1)
+            assert thread.is_alive()
+            assert FileTokenStore(path).load("a") is None
+        thread.join()
+        assert store.load("a").access_token == "token_a"
+
+    def test_sqlite_store(self):
+        path = os.path.join(self._tempdir.name, "tokens.db")
+        store = SQLiteTokenStore(path)
+        self._assert_round_trip(store)
+        keys = [str(index) for index in range(1200)]
+        store.save_many({key: _make_authentication(key) for key in keys})
+        assert len(store.load_many(keys)) == 1200
+        store.close()
+
+    def test_refresh_is_picked_up_from_store(self):
+        path = os.path.join(self._tempdir.name, "tokens.json")
+        FileTokenStore(path).save(
+            "email:user", _make_authentication("old_token", timedelta(days=1))
+        )
+        api = MagicMock()
+        api.refresh_access_token.return_value = _make_token()
+        first, second = (
+            Authenticator(
+                api, "email", "user", "pass", token_store=FileTokenStore(path)
+            )
+            for _ in range(2)
+        )
+        assert first.should_refresh() and second.should_refresh()
+
+        refreshed = first.refresh_access_token()
+        assert second.refresh_access_token().access_token == refreshed.access_token
+        api.refresh_access_token.assert_called_once_with("old_token")
+
+    def test_tokens_that_need_refreshing_are_not_adopted(self):
+        store = MemoryTokenStore()
+        store.save("email:user", _make_authentication("old_token", timedelta(days=2)))
+        api = MagicMock()
+        api.refresh_access_token.return_value = _make_token()
+        authenticator = Authenticator(api, "email", "user", "pass", token_store=store)
+        # Another process saved a token that is newer but also due
+        store.save("email:user", _make_authentication("other", timedelta(days=3)))
+        refreshed = authenticator.refresh_access_token()
+        api.refresh_access_token.assert_called_once_with("old_token")
+        assert refreshed.access_token not in ("old_token", "other")
+
+        # An older token is never adopted
+        store.save("email:user", _make_authentication("older", timedelta(days=20)))
+        refreshed = authenticator.refresh_access_token(force=True)
+        assert refreshed.access_token != "older"
+        assert api.refresh_access_token.call_count == 2
+
+    def test_refresh_locks_are_per_key(self):
+        store = FileTokenStore(os.path.join(self._tempdir.name, "tokens.json"))
+
+        def _hold(key):
+            with store.refresh_lock(key):
+                pass
+
+        with store.refresh_lock("email:one"):
+            other = threading.Thread(target=_hold, args=("email:two",))
+            other.start()
+            other.join(1)
+            assert not other.is_alive()
+            same = threading.Thread(target=_hold, args=("email:one",))
+            same.start()
+            same.join(0.1)
+            assert same.is_alive()
+        same.join()
+
+    def test_authenticator_uses_store(self):
+        store = MemoryTokenStore()
+        store.save("email:user", _make_authentication("stored"))
+        authenticator = Authenticator(
+            MagicMock(), "email", "user", "pass", token_store=store
+        )
+        assert authenticator.authentication.access_token == "stored"
+
+        store.save("email:user", _make_authentication("expired", timedelta(days=-1)))
+        authenticator = Authenticator(
+            MagicMock(), "email", "user", "pass", token_store=store
+        )
+        assert (
+            authenticator.authentication.state
+            == AuthenticationState.REQUIRES_AUTHENTICATION
+        )
+
+
+class TestTokenStoresAsync(aiounittest.AsyncTestCase):
+    async def test_saves_are_coalesced(self):
+        store = MemoryTokenStore(coalesce_delay=0.01)
+        with patch.object(store, "save_many", wraps=store.save_many) as save_many:
+            await asyncio.gather(
+                *(
+                    store.async_save(key, _make_authentication(key))
+                    for key in ("a", "b", "c")
+                )
+            )
+            await store.async_save("a", _make_authentication("a2"))
+        assert save_many.call_count == 2
+        assert set(save_many.call_args_list[0][0][0]) == {"a", "b", "c"}
+        assert (await store.async_load("a")).access_token == "a2"
+
+    async def test_flush_writes_right_away(self):
+        store = MemoryTokenStore(coalesce_delay=60)
+        pending = asyncio.ensure_future(
+            store.async_save("a", _make_authentication("a"))
+        )
+        await asyncio.sleep(0)
+        await asyncio.wait_for(
+            store.async_save("b", _make_authentication("b"), flush=True), 1
+        )
+        await pending
+        assert set(store.load_many(["a", "b"])) == {"a", "b"}
+
+    async def test_batch_setup(self):
+        store = MemoryTokenStore()
+        store.save_many(
+            {
+                "email:one": _make_authentication("one"),
+                "email:two": _make_authentication("two"),
+            }
+        )
+        authenticators = [
+            AuthenticatorAsync(MagicMock(), "email", user, "pass", token_store=store)
+            for user in ("one", "two", "three")
+        ]
+        with patch.object(store, "load_many", wraps=store.load_many) as load_many:
+            await async_setup_authentications(store, authenticators)
+        load_many.assert_called_once()
+        assert [
+            authenticator.authentication.access_token
+            for authenticator in authenticators
+        ] == ["one", "two", None]
+        assert (
+            authenticators[2].authentication.state
+            == AuthenticationState.REQUIRES_AUTHENTICATION
+        )
+
+    async def test_concurrent_refresh_calls_api_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tokens.db")
+            SQLiteTokenStore(path).save(
+                "email:user", _make_authentication("old_token", timedelta(days=1))
+            )
+
+            async def _async_refresh_access_token(access_token):
+                await asyncio.sleep(0.1)
+                return _make_token()
+
+            api = MagicMock()
+            api.async_refresh_access_token = AsyncMock(
+                side_effect=_async_refresh_access_token
+            )
+            authenticators = []
+            for _ in range(3):
+                authenticator = AuthenticatorAsync(
+                    api,
+                    "email",
+                    "user",
+                    "pass",
+                    token_store=SQLiteTokenStore(path, coalesce_delay=0),
+                )
+                await authenticator.async_setup_authentication()
+                authenticators.append(authenticator)
+
+            results = await asyncio.gather(
+                *(
+                    authenticator.async_refresh_access_token()
+                    for authenticator in authenticators
+                )
+            )
+            api.async_refresh_access_token.assert_called_once_with("old_token")
+            assert len({result.access_token for result in results}) == 1
+            assert results[0].access_token != "old_token"
@@ -0,0 +1,114 @@
+from contextlib import contextmanager
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+from aiohttp import ClientSession
+from aioresponses import aioresponses
+import aiounittest
+
+from yalexs.api_async import ApiAsync
+from yalexs.api_common import API_GET_LOCK_URL, API_LOCK_ASYNC_URL, HYPER_BRIDGE_PARAM
+from yalexs.exceptions import AugustApiAIOHTTPError
+from yalexs.lock import LockDetail
+from yalexs.pubnub_async import AugustPubNub
+import yalexs.tracing
+from yalexs.tracing import TracingMiddleware, start_pubnub_span, start_span
+
+ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+class FakeSpan:
+    def __init__(self, name, attributes, links=None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.links = links
+        self.exceptions = []
+        self.ended = False
+
+    def get_span_context(self):
+        return ("context", self.name)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, error):
+        self.exceptions.append(error)
+
+    def end(self):
+        self.ended = True
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        span = FakeSpan(name, attributes)
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None, links=None):
+        span = FakeSpan(name, attributes, links)
+        self.spans.append(span)
+        yield span
+        span.end()
+
+
+class TestTracing(aiounittest.AsyncTestCase):
+    def test_noop_without_tracer(self):
+        with patch.object(yalexs.tracing, "_tracer", None):
+            assert start_span("one") is start_span("two")
+            assert start_pubnub_span("device", "channel") is start_span("one")
+            with start_span("one"):
+                pass
+
+    @aioresponses()
+    async def test_command_linked_to_pubnub_message(self, mock):
+        lock = LockDetail(json.loads(load_fixture("get_lock.doorsense_init.json")))
+        lock._pubsub_channel = "channel"
+        august_pubnub = AugustPubNub()
+        august_pubnub.register_device(lock)
+        mock.put(
+            (API_LOCK_ASYNC_URL + HYPER_BRIDGE_PARAM).format(lock_id=lock.device_id),
+            body="",
+        )
+        mock.get(API_GET_LOCK_URL.format(lock_id=lock.device_id), status=500)
+        tracer = FakeTracer()
+        api = ApiAsync(ClientSession(), middlewares=[TracingMiddleware()])
+
+        with patch.object(yalexs.tracing, "_tracer", tracer), patch(
+            "yalexs.tracing._links", side_effect=lambda context: [context]
+        ):
+            await api.async_lock_async(ACCESS_TOKEN, lock.device_id)
+            with self.assertRaises(AugustApiAIOHTTPError):
+                await api.async_get_lock_detail(ACCESS_TOKEN, lock.device_id)
+            august_pubnub.message(
+                None,
+                MagicMock(
+                    channel="channel",
+                    timetoken="16159387543830000",
+                    message={"status": "locked"},
+                ),
+            )
+
+        command, detail, message = tracer.spans
+        assert command.name == "yalexs.api remoteoperate_lock_async"
+        assert command.attributes["http.method"] == "PUT"
+        assert command.attributes["http.status_code"] == 200
+        assert command.attributes["yalexs.attempt"] == 1
+        assert command.ended
+        assert detail.attributes["http.status_code"] == 500
+        assert isinstance(detail.exceptions[0], AugustApiAIOHTTPError)
+        assert message.name == "yalexs.pubnub.message"
+        assert message.attributes["yalexs.device_id"] == lock.device_id
+        assert message.links == [command.get_span_context()]
+        assert message.ended
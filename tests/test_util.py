@@ -17,6 +17,7 @@ from yalexs.api import _convert_lock_result_to_activities
 from yalexs.doorbell import DoorbellDetail
 from yalexs.lock import LockDetail, LockDoorStatus, LockStatus
 from yalexs.util import (
+    FieldChange,
     as_utc_from_local,
     update_doorbell_image_from_activity,
     update_lock_detail_from_activity,
@@ -183,6 +184,80 @@ class TestLockDetail(unittest.TestCase):
         assert lock.bridge_is_online is True
         assert bridge_online_activity.source == SOURCE_PUBNUB
 
+    def test_update_lock_with_activity_changes(self):
+        lock = LockDetail(
+            json.loads(load_fixture("get_lock.online_with_doorsense.json"))
+        )
+        old_lock_status_datetime = lock.lock_status_datetime
+        unlock_operation_activity = LockOperationActivity(
+            SOURCE_LOG, json.loads(load_fixture("unlock_activity.json"))
+        )
+        lock_operation_activity = LockOperationActivity(
+            SOURCE_LOG, json.loads(load_fixture("lock_activity.json"))
+        )
+        changes = []
+        self.assertTrue(
+            update_lock_detail_from_activity(lock, unlock_operation_activity, changes)
+        )
+        unlock_time = as_utc_from_local(
+            datetime.datetime.fromtimestamp(1582007217000 / 1000)
+        )
+        assert changes == [
+            FieldChange(
+                "ABC",
+                "lock_status",
+                LockStatus.LOCKED,
+                LockStatus.UNLOCKED,
+                unlock_operation_activity,
+            ),
+            FieldChange(
+                "ABC",
+                "lock_status_datetime",
+                old_lock_status_datetime,
+                unlock_time,
+                unlock_operation_activity,
+            ),
+        ]
+
+        # Older activities do not change anything
+        changes = []
+        self.assertFalse(
+            update_lock_detail_from_activity(lock, unlock_operation_activity, changes)
+        )
+        assert changes == []
+
+        changes = []
+        self.assertTrue(
+            update_lock_detail_from_activity(lock, lock_operation_activity, changes)
+        )
+        assert [change.field for change in changes] == [
+            "lock_status",
+            "lock_status_datetime",
+        ]
+        assert changes[0].old_value == LockStatus.UNLOCKED
+        assert changes[0].new_value == LockStatus.LOCKED
+
+        bridge_offline_activity = BridgeOperationActivity(
+            SOURCE_PUBNUB,
+            {
+                "action": "associated_bridge_offline",
+                "dateTime": 1512906510272.0,
+                "deviceID": lock.device_id,
+            },
+        )
+        changes = []
+        self.assertTrue(
+            update_lock_detail_from_activity(lock, bridge_offline_activity, changes)
+        )
+        assert changes == [
+            FieldChange("ABC", "bridge_is_online", True, False, bridge_offline_activity)
+        ]
+        changes = []
+        self.assertTrue(
+            update_lock_detail_from_activity(lock, bridge_offline_activity, changes)
+        )
+        assert changes == []
+
 
 class TestDetail(unittest.TestCase):
     def test_update_doorbell_image_from_activity(self):
@@ -207,14 +282,40 @@ class TestDetail(unittest.TestCase):
         doorbell_motion_activity = DoorbellMotionActivity(
             SOURCE_LOG, json.loads(load_fixture("doorbell_motion_activity.json"))
         )
+        changes = []
         self.assertTrue(
-            update_doorbell_image_from_activity(doorbell, doorbell_motion_activity)
+            update_doorbell_image_from_activity(
+                doorbell, doorbell_motion_activity, changes
+            )
         )
         self.assertEqual(
             dateutil.parser.parse("2020-02-20T17:44:45Z"),
             doorbell.image_created_at_datetime,
         )
         self.assertEqual("https://my.updated.image/image.jpg", doorbell.image_url)
+        assert changes == [
+            FieldChange(
+                "K98GiDT45GUL",
+                "image_url",
+                "https://image.com/vmk16naaaa7ibuey7sar.jpg",
+                "https://my.updated.image/image.jpg",
+                doorbell_motion_activity,
+            ),
+            FieldChange(
+                "K98GiDT45GUL",
+                "image_created_at_datetime",
+                dateutil.parser.parse("2017-12-10T08:01:35Z"),
+                dateutil.parser.parse("2020-02-20T17:44:45Z"),
+                doorbell_motion_activity,
+            ),
+        ]
+        changes = []
+        self.assertFalse(
+            update_doorbell_image_from_activity(
+                doorbell, doorbell_motion_activity, changes
+            )
+        )
+        assert changes == []
         old_doorbell_motion_activity = DoorbellMotionActivity(
             SOURCE_LOG, json.loads(load_fixture("doorbell_motion_activity_old.json"))
         )
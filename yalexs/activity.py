@@ -3,8 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from enum import Enum
 
-import dateutil.parser
-
+from yalexs.datetime_util import parse_datetime
 from yalexs.lock import LockDoorStatus, LockStatus
 from yalexs.users import get_user_info
 
@@ -163,9 +162,10 @@ class Activity:
         self._activity_id = entities.get("activity")
         self._house_id = entities.get("house")
 
-        self._activity_time = epoch_to_datetime(
-            data.get("dateTime", data.get("timestamp"))
-        )
+        date_time = data.get("dateTime")
+        if date_time is None:
+            date_time = data.get("timestamp")
+        self._activity_time = epoch_to_datetime(date_time)
         self._action = data.get("action")
         self._device_id = data.get("deviceID")
         self._device_name = data.get("deviceName")
@@ -230,7 +230,7 @@ class BaseDoorbellMotionActivity(Activity):
         if image is None:
             return
         if "created_at" in image:
-            self._image_created_at_datetime = dateutil.parser.parse(image["created_at"])
+            self._image_created_at_datetime = parse_datetime(image["created_at"])
         else:
             self._image_created_at_datetime = self._activity_time
 
@@ -303,7 +303,9 @@ class DoorbellViewActivity(DoorbellBaseActionActivity):
 
 class LockOperationActivity(Activity):
     def __init__(self, source, data):
-        calling_user = data.get("callingUser", data.get("user", {}))
+        calling_user = data.get("callingUser")
+        if calling_user is None:
+            calling_user = data.get("user", {})
         action = data.get("action")
         info = data.get("info", {})
         user_id = calling_user.get("UserID")
@@ -423,3 +425,18 @@ class DoorOperationActivity(Activity):
 class BridgeOperationActivity(Activity):
     def __init__(self, source, data):
         super().__init__(source, ActivityType.BRIDGE_OPERATION, data)
+
+
+ACTIVITY_ACTION_TO_CLASS = {
+    action: activity_class
+    for actions, activity_class in (
+        (ACTIVITY_ACTIONS_DOORBELL_DING, DoorbellDingActivity),
+        (ACTIVITY_ACTIONS_DOORBELL_MOTION, DoorbellMotionActivity),
+        (ACTIVITY_ACTIONS_DOORBELL_IMAGE_CAPTURE, DoorbellImageCaptureActivity),
+        (ACTIVITY_ACTIONS_DOORBELL_VIEW, DoorbellViewActivity),
+        (ACTIVITY_ACTIONS_LOCK_OPERATION, LockOperationActivity),
+        (ACTIVITY_ACTIONS_DOOR_OPERATION, DoorOperationActivity),
+        (ACTIVITY_ACTIONS_BRIDGE_OPERATION, BridgeOperationActivity),
+    )
+    for action in actions
+}
@@ -4,44 +4,134 @@ import json
 import logging
 import time
 
-from requests import Session, request
-from requests.exceptions import HTTPError
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError, Timeout
+from urllib3.util.retry import Retry
 
 from yalexs.api_common import (
     API_LOCK_URL,
     API_RETRY_ATTEMPTS,
     API_RETRY_TIME,
     API_UNLOCK_URL,
-    HEADER_ACCEPT_VERSION,
     HEADER_AUGUST_ACCESS_TOKEN,
     ApiCommon,
-    _api_headers,
+    PreparedRequest,
     _convert_lock_result_to_activities,
     _process_activity_json,
     _process_doorbells_json,
     _process_locks_json,
 )
+from yalexs.deadline import _deadline_exceeded, deadline_remaining
+from yalexs.debug_log import DebugLogPolicy
 from yalexs.doorbell import DoorbellDetail
 from yalexs.exceptions import AugustApiHTTPError
 from yalexs.lock import LockDetail, determine_door_state, determine_lock_status
+from yalexs.middleware import (
+    RequestContext,
+    _after_response,
+    _before_request,
+    _on_error,
+    _on_retry,
+)
 from yalexs.pin import Pin
+from yalexs.transport import RequestsTransport, Transport
+
+API_POOL_CONNECTIONS = 4
+API_POOL_MAXSIZE = 10
+API_CONNECT_RETRIES = 3
+API_CONNECT_RETRY_BACKOFF = 0.5
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def create_http_session(
+    pool_connections=API_POOL_CONNECTIONS,
+    pool_maxsize=API_POOL_MAXSIZE,
+    connect_retries=API_CONNECT_RETRIES,
+) -> Session:
+    """Create a requests Session tuned for the yale access api.
+
+    Connections are kept alive and pooled per host. Only failures to
+    connect are retried since the request never reached the api; 429s
+    are retried by the Api itself.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=connect_retries,
+            connect=connect_retries,
+            read=0,
+            status=0,
+            backoff_factor=API_CONNECT_RETRY_BACKOFF,
+            raise_on_status=False,
+        ),
+    )
+    http_session = Session()
+    http_session.mount("https://", adapter)
+    http_session.mount("http://", adapter)
+    return http_session
+
+
 class Api(ApiCommon):
-    def __init__(self, timeout=10, command_timeout=60, http_session: Session = None):
+    def __init__(
+        self,
+        timeout=10,
+        command_timeout=60,
+        http_session: Session = None,
+        transport: Transport = None,
+        base_url: str = None,
+        middlewares=(),
+        debug_log_policy: DebugLogPolicy = None,
+    ):
+        """Create an Api.
+
+        If http_session is not passed the Api creates and owns a
+        pooled session which is closed by close() or when the Api
+        is used as a context manager.
+
+        Requests are sent with transport if passed, otherwise over
+        http_session to base_url or the production api, through
+        middlewares in order. debug_log_policy controls what is
+        logged at debug level.
+        """
         self._timeout = timeout
         self._command_timeout = command_timeout
-        self._http_session = http_session
+        self._owns_http_session = http_session is None
+        self._http_session = (
+            create_http_session() if http_session is None else http_session
+        )
+        self._transport = (
+            RequestsTransport(self._http_session, base_url)
+            if transport is None
+            else transport
+        )
+        self._middlewares = tuple(middlewares)
+        self._debug_log_policy = debug_log_policy or DebugLogPolicy()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the http session if it is owned by the Api."""
+        if self._owns_http_session:
+            self._http_session.close()
+
+    @property
+    def http_session(self) -> Session:
+        return self._http_session
 
     def get_session(self, install_id, identifier, password):
-        return self._dict_to_api(
+        return self._request_to_api(
             self._build_get_session_request(install_id, identifier, password)
         )
 
     def send_verification_code(self, access_token, login_method, username):
-        return self._dict_to_api(
+        return self._request_to_api(
             self._build_send_verification_code_request(
                 access_token, login_method, username
             )
@@ -50,7 +140,7 @@ class Api(ApiCommon):
     def validate_verification_code(
         self, access_token, login_method, username, verification_code
     ):
-        return self._dict_to_api(
+        return self._request_to_api(
             self._build_validate_verification_code_request(
                 access_token, login_method, username, verification_code
             )
@@ -58,36 +148,36 @@ class Api(ApiCommon):
 
     def get_doorbells(self, access_token):
         return _process_doorbells_json(
-            self._dict_to_api(self._build_get_doorbells_request(access_token)).json()
+            self._request_to_api(self._build_get_doorbells_request(access_token)).json()
         )
 
     def get_doorbell_detail(self, access_token, doorbell_id):
         return DoorbellDetail(
-            self._dict_to_api(
+            self._request_to_api(
                 self._build_get_doorbell_detail_request(access_token, doorbell_id)
             ).json()
         )
 
     def wakeup_doorbell(self, access_token, doorbell_id):
-        self._dict_to_api(
+        self._request_to_api(
             self._build_wakeup_doorbell_request(access_token, doorbell_id)
         )
         return True
 
     def get_user(self, access_token):
-        return self._dict_to_api(self._build_get_user_request(access_token)).json()
+        return self._request_to_api(self._build_get_user_request(access_token)).json()
 
     def get_houses(self, access_token):
-        return self._dict_to_api(self._build_get_houses_request(access_token))
+        return self._request_to_api(self._build_get_houses_request(access_token))
 
     def get_house(self, access_token, house_id):
-        return self._dict_to_api(
+        return self._request_to_api(
             self._build_get_house_request(access_token, house_id)
         ).json()
 
     def get_house_activities(self, access_token, house_id, limit=8):
         return _process_activity_json(
-            self._dict_to_api(
+            self._request_to_api(
                 self._build_get_house_activities_request(
                     access_token, house_id, limit=limit
                 )
@@ -96,7 +186,7 @@ class Api(ApiCommon):
 
     def get_locks(self, access_token):
         return _process_locks_json(
-            self._dict_to_api(self._build_get_locks_request(access_token)).json()
+            self._request_to_api(self._build_get_locks_request(access_token)).json()
         )
 
     def get_operable_locks(self, access_token):
@@ -106,13 +196,13 @@ class Api(ApiCommon):
 
     def get_lock_detail(self, access_token, lock_id):
         return LockDetail(
-            self._dict_to_api(
+            self._request_to_api(
                 self._build_get_lock_detail_request(access_token, lock_id)
             ).json()
         )
 
     def get_lock_status(self, access_token, lock_id, door_status=False):
-        json_dict = self._dict_to_api(
+        json_dict = self._request_to_api(
             self._build_get_lock_status_request(access_token, lock_id)
         ).json()
 
@@ -125,7 +215,7 @@ class Api(ApiCommon):
         return determine_lock_status(json_dict.get("status"))
 
     def get_lock_door_status(self, access_token, lock_id, lock_status=False):
-        json_dict = self._dict_to_api(
+        json_dict = self._request_to_api(
             self._build_get_lock_status_request(access_token, lock_id)
         ).json()
 
@@ -138,14 +228,14 @@ class Api(ApiCommon):
         return determine_door_state(json_dict.get("doorState"))
 
     def get_pins(self, access_token, lock_id):
-        json_dict = self._dict_to_api(
+        json_dict = self._request_to_api(
             self._build_get_pins_request(access_token, lock_id)
         ).json()
 
         return [Pin(pin_json) for pin_json in json_dict.get("loaded", [])]
 
     def _call_lock_operation(self, url_str, access_token, lock_id):
-        return self._dict_to_api(
+        return self._request_to_api(
             self._build_call_lock_operation_request(
                 url_str, access_token, lock_id, self._command_timeout
             )
@@ -193,67 +283,106 @@ class Api(ApiCommon):
 
     def refresh_access_token(self, access_token):
         """Obtain a new api token."""
-        return self._dict_to_api(
+        return self._request_to_api(
             self._build_refresh_access_token_request(access_token)
         ).headers[HEADER_AUGUST_ACCESS_TOKEN]
 
-    def _dict_to_api(self, api_dict):
-        url = api_dict["url"]
-        method = api_dict["method"]
-        access_token = api_dict.get("access_token", None)
-        del api_dict["url"]
-        del api_dict["method"]
-        if access_token:
-            del api_dict["access_token"]
-
-        payload = api_dict.get("params") or api_dict.get("json")
+    def _request_to_api(self, request: PreparedRequest):
+        endpoint, method, url = request.endpoint, request.method, request.url
+        timeout = self._timeout if request.timeout is None else request.timeout
 
-        if "headers" not in api_dict:
-            api_dict["headers"] = _api_headers(access_token=access_token)
-
-        if "version" in api_dict:
-            api_dict["headers"][HEADER_ACCEPT_VERSION] = api_dict["version"]
-            del api_dict["version"]
-
-        if "timeout" not in api_dict:
-            api_dict["timeout"] = self._timeout
-
-        _LOGGER.debug(
-            "About to call %s with header=%s and payload=%s",
-            url,
-            api_dict["headers"],
-            payload,
+        policy = self._debug_log_policy
+        debug_enabled = _LOGGER.isEnabledFor(logging.DEBUG) and policy.should_log(
+            endpoint
         )
-
-        attempts = 0
-        while attempts < API_RETRY_ATTEMPTS:
-            attempts += 1
-            response = (
-                self._http_session.request(method, url, **api_dict)
-                if self._http_session is not None
-                else request(method, url, **api_dict)
-            )
+        if debug_enabled:
             _LOGGER.debug(
-                "Received API response from url: %s, code: %s, headers: %s, content: %s",
+                "About to call %s with header=%s and payload=%s",
                 url,
-                response.status_code,
-                response.headers,
-                response.content,
+                policy.lazy(request.headers),
+                policy.lazy(request.params or request.json),
             )
-            if response.status_code == 429:
-                _LOGGER.debug(
-                    "August sent a 429 (attempt: %d), sleeping and trying again",
-                    attempts,
-                )
-                time.sleep(API_RETRY_TIME)
-                continue
-            break
-
-        _raise_response_exceptions(response)
 
+        middlewares = self._middleware_chain
+        if middlewares:
+            # before_request may change the headers so give it its own copy
+            context = RequestContext(
+                endpoint,
+                method,
+                url,
+                request.transport_kwargs(timeout, bool(middlewares.before_request)),
+            )
+            kwargs = context.kwargs
+        else:
+            context = None
+            kwargs = request.transport_kwargs(timeout)
+        attempts = 0
+        try:
+            while attempts < API_RETRY_ATTEMPTS:
+                attempts += 1
+                remaining = deadline_remaining()
+                if remaining is not None:
+                    if remaining <= 0:
+                        raise _deadline_exceeded(url)
+                    kwargs["timeout"] = _clamp_timeout(timeout, remaining)
+                if context:
+                    _before_request(middlewares, context)
+                    method, url, kwargs = context.method, context.url, context.kwargs
+                try:
+                    response = self._transport.request(method, url, **kwargs)
+                except Timeout as err:
+                    if remaining is not None and deadline_remaining() <= 0:
+                        raise _deadline_exceeded(url) from err
+                    raise
+                if debug_enabled:
+                    _LOGGER.debug(
+                        "Received API response from url: %s, code: %s, headers: %s, content: %s",
+                        url,
+                        response.status_code,
+                        policy.lazy(response.headers),
+                        policy.lazy(response.content),
+                    )
+                if context:
+                    context.set_response(response, response.status_code)
+                if response.status_code == 429 and attempts < API_RETRY_ATTEMPTS:
+                    _LOGGER.debug(
+                        "August sent a 429 (attempt: %d), sleeping and trying again",
+                        attempts,
+                    )
+                    if context:
+                        _on_retry(middlewares, context)
+                    remaining = deadline_remaining()
+                    if remaining is not None and remaining <= API_RETRY_TIME:
+                        raise _deadline_exceeded(url)
+                    time.sleep(API_RETRY_TIME)
+                    continue
+                break
+
+            _raise_response_exceptions(response)
+        except BaseException as err:
+            # Cancelled calls fail too, so spans and metrics are closed
+            if context:
+                _on_error(middlewares, context, err)
+            raise
+
+        if context:
+            _after_response(middlewares, context)
         return response
 
 
+def _clamp_timeout(timeout, remaining):
+    """Shorten a requests timeout, which may be a (connect, read) tuple.
+
+    requests applies the timeout to connecting and to each read, not
+    to the whole request.
+    """
+    if isinstance(timeout, tuple):
+        return tuple(
+            remaining if value is None else min(value, remaining) for value in timeout
+        )
+    return remaining if timeout is None else min(timeout, remaining)
+
+
 def _raise_response_exceptions(response):
     try:
         response.raise_for_status()
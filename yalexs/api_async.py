@@ -1,9 +1,17 @@
 """Api calls for sync."""
 
 import asyncio
+from contextlib import asynccontextmanager
 import logging
-
-from aiohttp import ClientResponseError, ServerDisconnectedError
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Union
+
+from aiohttp import (
+    ClientResponseError,
+    ClientSession,
+    ClientTimeout,
+    ServerDisconnectedError,
+    TCPConnector,
+)
 
 from yalexs.api_common import (
     API_LOCK_ASYNC_URL,
@@ -13,37 +21,161 @@ from yalexs.api_common import (
     API_STATUS_ASYNC_URL,
     API_UNLOCK_ASYNC_URL,
     API_UNLOCK_URL,
-    HEADER_ACCEPT_VERSION,
     HEADER_AUGUST_ACCESS_TOKEN,
     HYPER_BRIDGE_PARAM,
     ApiCommon,
-    _api_headers,
+    PreparedRequest,
     _convert_lock_result_to_activities,
     _process_activity_json,
     _process_doorbells_json,
     _process_locks_json,
 )
+from yalexs.deadline import _deadline_exceeded, deadline_remaining
+from yalexs.debug_log import DebugLogPolicy
 from yalexs.doorbell import DoorbellDetail
 from yalexs.exceptions import AugustApiAIOHTTPError
-from yalexs.lock import LockDetail, determine_door_state, determine_lock_status
+from yalexs.lock import (
+    Lock,
+    LockDetail,
+    LockStatus,
+    determine_door_state,
+    determine_lock_status,
+)
+from yalexs.middleware import (
+    RequestContext,
+    _after_response,
+    _before_request,
+    _on_error,
+    _on_retry,
+)
 from yalexs.pin import Pin
+from yalexs.transport import AiohttpTransport, AsyncTransport
+
+API_CONNECTION_LIMIT = 100
+API_CONNECTION_LIMIT_PER_HOST = 20
+API_DNS_CACHE_TTL = 300
+API_KEEPALIVE_TIMEOUT = 60
+API_CONNECT_TIMEOUT = 5
 
 _LOGGER = logging.getLogger(__name__)
 
 
+class ConnectionPoolStats(NamedTuple):
+    """A point in time view of an aiohttp connection pool."""
+
+    limit: int
+    limit_per_host: int
+    acquired: int
+    idle: int
+
+
+class BulkOperationResult(NamedTuple):
+    """The outcome for one lock of a bulk operation."""
+
+    lock_id: str
+    lock_status: Optional[LockStatus]
+    error: Optional[Exception]
+
+
+def _bulk_group_key(lock: Union[str, Lock, LockDetail]) -> str:
+    """Group locks that share a bridge, other locks run on their own."""
+    if isinstance(lock, LockDetail) and lock.bridge is not None:
+        return lock.bridge.device_id
+    return lock if isinstance(lock, str) else lock.device_id
+
+
+@asynccontextmanager
+async def async_create_api_async(
+    timeout=10,
+    command_timeout=60,
+    connect_timeout=API_CONNECT_TIMEOUT,
+    limit=API_CONNECTION_LIMIT,
+    limit_per_host=API_CONNECTION_LIMIT_PER_HOST,
+    ttl_dns_cache=API_DNS_CACHE_TTL,
+    keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+    base_url=None,
+) -> AsyncIterator["ApiAsync"]:
+    """Create an ApiAsync with its own tuned aiohttp session.
+
+    The timeouts are split into a connect phase bounded by
+    connect_timeout and a read phase bounded by timeout, or
+    command_timeout for lock operations. The session and its
+    connections are closed on exit.
+    """
+    connector = TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=ttl_dns_cache,
+        keepalive_timeout=keepalive_timeout,
+    )
+    async with ClientSession(connector=connector) as aiohttp_session:
+        yield ApiAsync(
+            aiohttp_session,
+            timeout=_split_timeout(connect_timeout, timeout),
+            command_timeout=_split_timeout(connect_timeout, command_timeout),
+            base_url=base_url,
+        )
+
+
+def _split_timeout(connect_timeout, read_timeout):
+    return ClientTimeout(
+        total=connect_timeout + read_timeout,
+        connect=connect_timeout,
+        sock_read=read_timeout,
+    )
+
+
 class ApiAsync(ApiCommon):
-    def __init__(self, aiohttp_session, timeout=10, command_timeout=60):
+    def __init__(
+        self,
+        aiohttp_session,
+        timeout=10,
+        command_timeout=60,
+        transport: AsyncTransport = None,
+        base_url: str = None,
+        middlewares=(),
+        debug_log_policy: DebugLogPolicy = None,
+    ):
+        """Create an ApiAsync.
+
+        timeout and command_timeout may be a number of seconds
+        or an aiohttp ClientTimeout.
+
+        Requests are sent with transport if passed, otherwise over
+        aiohttp_session to base_url or the production api, through
+        middlewares in order. debug_log_policy controls what is
+        logged at debug level.
+        """
         self._timeout = timeout
         self._command_timeout = command_timeout
         self._aiohttp_session = aiohttp_session
+        self._transport = (
+            AiohttpTransport(aiohttp_session, base_url)
+            if transport is None
+            else transport
+        )
+        self._middlewares = tuple(middlewares)
+        self._debug_log_policy = debug_log_policy or DebugLogPolicy()
+
+    def connection_pool_stats(self) -> ConnectionPoolStats:
+        """Return the current state of the session's connection pool."""
+        connector = self._aiohttp_session.connector
+        # aiohttp does not expose the pool size publicly
+        # pylint: disable=protected-access
+        return ConnectionPoolStats(
+            connector.limit,
+            connector.limit_per_host,
+            len(connector._acquired),
+            sum(len(conns) for conns in connector._conns.values()),
+        )
 
     async def async_get_session(self, install_id, identifier, password):
-        return await self._async_dict_to_api(
+        return await self._async_request_to_api(
             self._build_get_session_request(install_id, identifier, password)
         )
 
     async def async_send_verification_code(self, access_token, login_method, username):
-        return await self._async_dict_to_api(
+        return await self._async_request_to_api(
             self._build_send_verification_code_request(
                 access_token, login_method, username
             )
@@ -52,49 +184,49 @@ class ApiAsync(ApiCommon):
     async def async_validate_verification_code(
         self, access_token, login_method, username, verification_code
     ):
-        return await self._async_dict_to_api(
+        return await self._async_request_to_api(
             self._build_validate_verification_code_request(
                 access_token, login_method, username, verification_code
             )
         )
 
     async def async_get_doorbells(self, access_token):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_doorbells_request(access_token)
         )
         return _process_doorbells_json(await response.json())
 
     async def async_get_doorbell_detail(self, access_token, doorbell_id):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_doorbell_detail_request(access_token, doorbell_id)
         )
         return DoorbellDetail(await response.json())
 
     async def async_wakeup_doorbell(self, access_token, doorbell_id):
-        await self._async_dict_to_api(
+        await self._async_request_to_api(
             self._build_wakeup_doorbell_request(access_token, doorbell_id)
         )
         return True
 
     async def async_get_user(self, access_token):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_user_request(access_token)
         )
         return await response.json()
 
     async def async_get_houses(self, access_token):
-        return await self._async_dict_to_api(
+        return await self._async_request_to_api(
             self._build_get_houses_request(access_token)
         )
 
     async def async_get_house(self, access_token, house_id):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_house_request(access_token, house_id)
         )
         return await response.json()
 
     async def async_get_house_activities(self, access_token, house_id, limit=8):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_house_activities_request(
                 access_token, house_id, limit=limit
             )
@@ -102,7 +234,7 @@ class ApiAsync(ApiCommon):
         return _process_activity_json(await response.json())
 
     async def async_get_locks(self, access_token):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_locks_request(access_token)
         )
         return _process_locks_json(await response.json())
@@ -113,13 +245,13 @@ class ApiAsync(ApiCommon):
         return [lock for lock in locks if lock.is_operable]
 
     async def async_get_lock_detail(self, access_token, lock_id):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_lock_detail_request(access_token, lock_id)
         )
         return LockDetail(await response.json())
 
     async def async_get_lock_status(self, access_token, lock_id, door_status=False):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_lock_status_request(access_token, lock_id)
         )
         json_dict = await response.json()
@@ -135,7 +267,7 @@ class ApiAsync(ApiCommon):
     async def async_get_lock_door_status(
         self, access_token, lock_id, lock_status=False
     ):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_lock_status_request(access_token, lock_id)
         )
         json_dict = await response.json()
@@ -149,7 +281,7 @@ class ApiAsync(ApiCommon):
         return determine_door_state(json_dict.get("doorState"))
 
     async def async_get_pins(self, access_token, lock_id):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_get_pins_request(access_token, lock_id)
         )
         json_dict = await response.json()
@@ -157,7 +289,7 @@ class ApiAsync(ApiCommon):
         return [Pin(pin_json) for pin_json in json_dict.get("loaded", [])]
 
     async def _async_call_lock_operation(self, url_str, access_token, lock_id):
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_call_lock_operation_request(
                 url_str, access_token, lock_id, self._command_timeout
             )
@@ -166,7 +298,7 @@ class ApiAsync(ApiCommon):
 
     async def _async_call_async_lock_operation(self, url_str, access_token, lock_id):
         """Call an operation that will queue."""
-        response = await self._async_dict_to_api(
+        response = await self._async_request_to_api(
             self._build_call_lock_operation_request(
                 url_str, access_token, lock_id, self._command_timeout
             )
@@ -245,6 +377,70 @@ class ApiAsync(ApiCommon):
             await self._async_unlock(access_token, lock_id)
         )
 
+    async def async_bulk_lock(
+        self, access_token, locks: Iterable[Union[str, Lock, LockDetail]]
+    ) -> AsyncIterator[BulkOperationResult]:
+        """Lock many locks, yielding a result for each as it completes.
+
+        See _async_bulk_operation.
+        """
+        async for result in self._async_bulk_operation(
+            self.async_lock, access_token, locks
+        ):
+            yield result
+
+    async def async_bulk_unlock(
+        self, access_token, locks: Iterable[Union[str, Lock, LockDetail]]
+    ) -> AsyncIterator[BulkOperationResult]:
+        """Unlock many locks, yielding a result for each as it completes.
+
+        See _async_bulk_operation.
+        """
+        async for result in self._async_bulk_operation(
+            self.async_unlock, access_token, locks
+        ):
+            yield result
+
+    async def _async_bulk_operation(self, operation, access_token, locks):
+        """Run an operation on many locks.
+
+        locks may be lock ids, Locks or LockDetails. Locks behind the
+        same bridge, known from LockDetail.bridge, are operated one at
+        a time since a bridge only handles one operation at once; all
+        other locks are operated concurrently. A lock that fails has
+        its error in the result and does not stop the others.
+        """
+        groups: Dict[str, List[str]] = {}
+        seen = set()
+        for lock in locks:
+            lock_id = lock if isinstance(lock, str) else lock.device_id
+            if lock_id in seen:
+                continue
+            seen.add(lock_id)
+            groups.setdefault(_bulk_group_key(lock), []).append(lock_id)
+
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def _async_run_group(lock_ids):
+            for lock_id in lock_ids:
+                try:
+                    lock_status = await operation(access_token, lock_id)
+                except Exception as err:  # pylint: disable=broad-except
+                    results.put_nowait(BulkOperationResult(lock_id, None, err))
+                else:
+                    results.put_nowait(BulkOperationResult(lock_id, lock_status, None))
+
+        tasks = [
+            asyncio.create_task(_async_run_group(lock_ids))
+            for lock_ids in groups.values()
+        ]
+        try:
+            for _ in range(len(seen)):
+                yield await results.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+
     async def async_status_async(self, access_token, lock_id, hyper_bridge=True):
         """Queue a remote unlock operation and get the status via pubnub."""
         if hyper_bridge:
@@ -258,68 +454,116 @@ class ApiAsync(ApiCommon):
     async def async_refresh_access_token(self, access_token):
         """Obtain a new api token."""
         return (
-            await self._async_dict_to_api(
+            await self._async_request_to_api(
                 self._build_refresh_access_token_request(access_token)
             )
         ).headers[HEADER_AUGUST_ACCESS_TOKEN]
 
-    async def _async_dict_to_api(self, api_dict):
-        url = api_dict["url"]
-        method = api_dict["method"]
-        access_token = api_dict.get("access_token", None)
-        del api_dict["url"]
-        del api_dict["method"]
-        if access_token:
-            del api_dict["access_token"]
-
-        payload = api_dict.get("params") or api_dict.get("json")
-
-        if "headers" not in api_dict:
-            api_dict["headers"] = _api_headers(access_token=access_token)
-
-        if "version" in api_dict:
-            api_dict["headers"][HEADER_ACCEPT_VERSION] = api_dict["version"]
-            del api_dict["version"]
+    async def _async_request_to_api(self, request: PreparedRequest):
+        endpoint, method, url = request.endpoint, request.method, request.url
+        timeout = self._timeout if request.timeout is None else request.timeout
 
-        if "timeout" not in api_dict:
-            api_dict["timeout"] = self._timeout
-
-        _LOGGER.debug(
-            "About to call %s with header=%s and payload=%s",
-            url,
-            api_dict["headers"],
-            payload,
+        policy = self._debug_log_policy
+        debug_enabled = _LOGGER.isEnabledFor(logging.DEBUG) and policy.should_log(
+            endpoint
         )
+        if debug_enabled:
+            _LOGGER.debug(
+                "About to call %s with header=%s and payload=%s",
+                url,
+                policy.lazy(request.headers),
+                policy.lazy(request.params or request.json),
+            )
 
+        middlewares = self._middleware_chain
+        if middlewares:
+            # before_request may change the headers so give it its own copy
+            context = RequestContext(
+                endpoint,
+                method,
+                url,
+                request.transport_kwargs(timeout, bool(middlewares.before_request)),
+            )
+            kwargs = context.kwargs
+        else:
+            context = None
+            kwargs = request.transport_kwargs(timeout)
         attempts = 0
-        debug_enabled = _LOGGER.isEnabledFor(logging.DEBUG)
-        while attempts < API_RETRY_ATTEMPTS:
-            attempts += 1
-            try:
-                response = await self._aiohttp_session.request(method, url, **api_dict)
-            except ServerDisconnectedError:
-                # Try again if we get disconnected
-                continue
-            if debug_enabled:
-                _LOGGER.debug(
-                    "Received API response from url: %s, code: %s, headers: %s, content: %s",
-                    url,
-                    response.status,
-                    response.headers,
-                    await response.read(),
-                )
-            if response.status == 429:
-                _LOGGER.debug(
-                    "August sent a 429 (attempt: %d), sleeping and trying again",
-                    attempts,
-                )
-                asyncio.sleep(API_RETRY_TIME)
-                continue
-            break
+        try:
+            while attempts < API_RETRY_ATTEMPTS:
+                attempts += 1
+                remaining = deadline_remaining()
+                if remaining is not None:
+                    if remaining <= 0:
+                        raise _deadline_exceeded(url)
+                    kwargs["timeout"] = _clamp_timeout(timeout, remaining)
+                if context:
+                    _before_request(middlewares, context)
+                    method, url, kwargs = context.method, context.url, context.kwargs
+                try:
+                    response = await self._transport.async_request(
+                        method, url, **kwargs
+                    )
+                except ServerDisconnectedError as err:
+                    if attempts >= API_RETRY_ATTEMPTS:
+                        raise
+                    # Try again if we get disconnected
+                    if context:
+                        context.set_error(err)
+                        _on_retry(middlewares, context)
+                    continue
+                except asyncio.TimeoutError as err:
+                    if remaining is not None and deadline_remaining() <= 0:
+                        raise _deadline_exceeded(url) from err
+                    raise
+                if debug_enabled:
+                    _LOGGER.debug(
+                        "Received API response from url: %s, code: %s, headers: %s, content: %s",
+                        url,
+                        response.status,
+                        policy.lazy(response.headers),
+                        policy.lazy(await response.read()),
+                    )
+                if context:
+                    context.set_response(response, response.status)
+                if response.status == 429 and attempts < API_RETRY_ATTEMPTS:
+                    _LOGGER.debug(
+                        "August sent a 429 (attempt: %d), sleeping and trying again",
+                        attempts,
+                    )
+                    if context:
+                        _on_retry(middlewares, context)
+                    # Free the connection while waiting
+                    response.release()
+                    remaining = deadline_remaining()
+                    if remaining is not None and remaining <= API_RETRY_TIME:
+                        raise _deadline_exceeded(url)
+                    await asyncio.sleep(API_RETRY_TIME)
+                    continue
+                break
+
+            _raise_response_exceptions(response)
+        except BaseException as err:
+            # Cancelled calls fail too, so spans and metrics are closed
+            if context:
+                _on_error(middlewares, context, err)
+            raise
+
+        if context:
+            _after_response(middlewares, context)
+        return response
 
-        _raise_response_exceptions(response)
 
-        return response
+def _clamp_timeout(timeout, remaining):
+    """Shorten a timeout in seconds or a ClientTimeout to remaining."""
+    if isinstance(timeout, ClientTimeout):
+        return ClientTimeout(
+            total=remaining if timeout.total is None else min(timeout.total, remaining),
+            connect=timeout.connect,
+            sock_read=timeout.sock_read,
+            sock_connect=timeout.sock_connect,
+        )
+    return remaining if timeout is None else min(timeout, remaining)
 
 
 def _raise_response_exceptions(response):
@@ -329,15 +573,19 @@ def _raise_response_exceptions(response):
         if err.status == 422:
             raise AugustApiAIOHTTPError(
                 "The operation failed because the bridge (connect) is offline.",
+                status=err.status,
             ) from err
         if err.status == 423:
             raise AugustApiAIOHTTPError(
                 "The operation failed because the bridge (connect) is in use.",
+                status=err.status,
             ) from err
         if err.status == 408:
             raise AugustApiAIOHTTPError(
                 "The operation timed out because the bridge (connect) failed to respond.",
+                status=err.status,
             ) from err
         raise AugustApiAIOHTTPError(
             f"The operation failed with error code {err.status}: {err.message}.",
+            status=err.status,
         ) from err
@@ -1,33 +1,32 @@
 """Api functions common between sync and async."""
+
+from collections import OrderedDict
+from functools import lru_cache
 import logging
-from typing import Any, Dict
-
-import dateutil.parser
-
-from yalexs.activity import (
-    ACTIVITY_ACTIONS_BRIDGE_OPERATION,
-    ACTIVITY_ACTIONS_DOOR_OPERATION,
-    ACTIVITY_ACTIONS_DOORBELL_DING,
-    ACTIVITY_ACTIONS_DOORBELL_IMAGE_CAPTURE,
-    ACTIVITY_ACTIONS_DOORBELL_MOTION,
-    ACTIVITY_ACTIONS_DOORBELL_VIEW,
-    ACTIVITY_ACTIONS_LOCK_OPERATION,
-    SOURCE_LOCK_OPERATE,
-    SOURCE_LOG,
-    BridgeOperationActivity,
-    DoorbellDingActivity,
-    DoorbellImageCaptureActivity,
-    DoorbellMotionActivity,
-    DoorbellViewActivity,
-    DoorOperationActivity,
-    LockOperationActivity,
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
 )
+
+from yalexs.activity import ACTIVITY_ACTION_TO_CLASS, SOURCE_LOCK_OPERATE, SOURCE_LOG
+from yalexs.datetime_util import parse_datetime
 from yalexs.doorbell import Doorbell
 from yalexs.lock import Lock, LockDoorStatus, determine_door_state, door_state_to_string
+from yalexs.middleware import ApiMiddleware, _MiddlewareChain
 
 API_RETRY_TIME = 2.5
 API_RETRY_ATTEMPTS = 10
 
+# The prepared headers are kept for this many access tokens
+HEADERS_CACHE_SIZE = 64
+
 HEADER_ACCEPT_VERSION = "Accept-Version"
 HEADER_AUGUST_ACCESS_TOKEN = "x-august-access-token"  # nosec
 HEADER_AUGUST_API_KEY = "x-august-api-key"
@@ -94,6 +93,85 @@ def _api_headers(access_token=None):
     return headers
 
 
+class PreparedRequest(NamedTuple):
+    """A request ready to be sent, which is never mutated.
+
+    headers is a read-only mapping shared by the requests an Api
+    makes with the same token and version; it is copied before
+    middleware sees it.
+    """
+
+    endpoint: str
+    method: str
+    url: str
+    headers: Mapping[str, str]
+    params: Optional[Dict[str, Any]] = None
+    json: Optional[Dict[str, Any]] = None
+    timeout: Any = None
+
+    def transport_kwargs(self, timeout, copy_headers=False) -> Dict[str, Any]:
+        """Return the keyword arguments for a transport."""
+        kwargs = {
+            "headers": dict(self.headers) if copy_headers else self.headers,
+            "timeout": timeout,
+        }
+        if self.params is not None:
+            kwargs["params"] = self.params
+        if self.json is not None:
+            kwargs["json"] = self.json
+        return kwargs
+
+
+class RequestTemplate(NamedTuple):
+    """The fixed parts of a request to an endpoint."""
+
+    endpoint: str
+    method: str
+    url: str
+    version: Optional[str] = None
+
+    def prepare(
+        self, headers, params=None, json=None, timeout=None, **url_args
+    ) -> PreparedRequest:
+        """Fill in the url template."""
+        return PreparedRequest(
+            self.endpoint,
+            self.method,
+            self.url.format(**url_args) if url_args else self.url,
+            headers,
+            params,
+            json,
+            timeout,
+        )
+
+
+GET_SESSION = RequestTemplate("get_session", "post", API_GET_SESSION_URL)
+SEND_VERIFICATION_CODE = {
+    login_method: RequestTemplate("send_verification_code", "post", url)
+    for login_method, url in API_SEND_VERIFICATION_CODE_URLS.items()
+}
+VALIDATE_VERIFICATION_CODE = {
+    login_method: RequestTemplate("validate_verification_code", "post", url)
+    for login_method, url in API_VALIDATE_VERIFICATION_CODE_URLS.items()
+}
+GET_DOORBELLS = RequestTemplate("get_doorbells", "get", API_GET_DOORBELLS_URL)
+GET_DOORBELL = RequestTemplate("get_doorbell_detail", "get", API_GET_DOORBELL_URL)
+WAKEUP_DOORBELL = RequestTemplate("wakeup_doorbell", "put", API_WAKEUP_DOORBELL_URL)
+GET_HOUSES = RequestTemplate("get_houses", "get", API_GET_HOUSES_URL)
+GET_HOUSE = RequestTemplate("get_house", "get", API_GET_HOUSE_URL)
+GET_HOUSE_ACTIVITIES = RequestTemplate(
+    "get_house_activities", "get", API_GET_HOUSE_ACTIVITIES_URL, version="4.0.0"
+)
+GET_LOCKS = RequestTemplate("get_locks", "get", API_GET_LOCKS_URL)
+GET_USER = RequestTemplate("get_user", "get", API_GET_USER_URL)
+GET_LOCK = RequestTemplate("get_lock_detail", "get", API_GET_LOCK_URL)
+GET_LOCK_STATUS = RequestTemplate("get_lock_status", "get", API_GET_LOCK_STATUS_URL)
+GET_PINS = RequestTemplate("get_pins", "get", API_GET_PINS_URL)
+REFRESH_ACCESS_TOKEN = RequestTemplate(
+    "refresh_access_token", "get", API_GET_HOUSES_URL
+)
+
+
 def _convert_lock_result_to_activities(lock_json_dict):
     activities = []
     lock_info_json_dict = lock_json_dict.get("info", {})
@@ -117,25 +195,11 @@ def _convert_lock_result_to_activities(lock_json_dict):
 
 def _activity_from_dict(source: str, activity_dict: Dict[str, Any]):
     _LOGGER.debug("Processing activity: %s", activity_dict)
-    action = activity_dict.get("action")
-
-    if action in ACTIVITY_ACTIONS_DOORBELL_DING:
-        return DoorbellDingActivity(source, activity_dict)
-    if action in ACTIVITY_ACTIONS_DOORBELL_MOTION:
-        return DoorbellMotionActivity(source, activity_dict)
-    if action in ACTIVITY_ACTIONS_DOORBELL_IMAGE_CAPTURE:
-        return DoorbellImageCaptureActivity(source, activity_dict)
-    if action in ACTIVITY_ACTIONS_DOORBELL_VIEW:
-        return DoorbellViewActivity(source, activity_dict)
-    if action in ACTIVITY_ACTIONS_LOCK_OPERATION:
-        return LockOperationActivity(source, activity_dict)
-    if action in ACTIVITY_ACTIONS_DOOR_OPERATION:
-        return DoorOperationActivity(source, activity_dict)
-    if action in ACTIVITY_ACTIONS_BRIDGE_OPERATION:
-        return BridgeOperationActivity(source, activity_dict)
-
-    _LOGGER.debug("Unknown activity: %s", activity_dict)
-    return None
+    activity_class = ACTIVITY_ACTION_TO_CLASS.get(activity_dict.get("action"))
+    if activity_class is None:
+        _LOGGER.debug("Unknown activity: %s", activity_dict)
+        return None
+    return activity_class(source, activity_dict)
 
 
 def _map_lock_result_to_activity(lock_id, activity_epoch, action_text):
@@ -150,7 +214,7 @@ def _map_lock_result_to_activity(lock_id, activity_epoch, action_text):
 
 
 def _datetime_string_to_epoch(datetime_string):
-    return dateutil.parser.parse(datetime_string).timestamp() * 1000
+    return parse_datetime(datetime_string).timestamp() * 1000
 
 
 def _process_activity_json(json_dict):
@@ -173,19 +237,96 @@ def _process_locks_json(json_dict):
     return [Lock(device_id, data) for device_id, data in json_dict.items()]
 
 
+def _lock_operation_endpoint(url_str):
+    """Name a remoteoperate url, ie remoteoperate_unlock_async."""
+    path, _, query = url_str.partition("?")
+    endpoint = "remoteoperate_" + path.rsplit("/", 1)[-1]
+    if "type=async" in query:
+        return endpoint + "_async"
+    return endpoint
+
+
+@lru_cache(maxsize=None)
+def _lock_operation_template(url_str):
+    return RequestTemplate(_lock_operation_endpoint(url_str), "put", url_str)
+
+
 class ApiCommon:
     """Api dict shared between async and sync."""
 
+    _middleware_chain = _MiddlewareChain()
+    _headers_cache: Optional["OrderedDict[Optional[str], Dict]"] = None
+
+    def add_middleware(self, middleware: ApiMiddleware) -> Callable[[], None]:
+        """Add middleware to the end of the chain.
+
+        Returns a callable that can be used to remove it.
+        """
+        # Replace rather than mutate so calls in flight keep their chain
+        self._middlewares = (*self._middlewares, middleware)
+
+        def _remove_middleware():
+            self._middlewares = tuple(
+                item for item in self._middlewares if item is not middleware
+            )
+
+        return _remove_middleware
+
+    @property
+    def _middlewares(self) -> Tuple[ApiMiddleware, ...]:
+        return self._middleware_chain.middlewares
+
+    @_middlewares.setter
+    def _middlewares(self, middlewares: Iterable[ApiMiddleware]) -> None:
+        self._middleware_chain = _MiddlewareChain(middlewares)
+
+    @property
+    def debug_log_policy(self):
+        """The DebugLogPolicy that controls debug logging."""
+        return self._debug_log_policy
+
+    @debug_log_policy.setter
+    def debug_log_policy(self, policy):
+        self._debug_log_policy = policy
+
+    def _prepare(self, template, access_token=None, **kwargs) -> PreparedRequest:
+        """Prepare a request with the headers for access_token.
+
+        The headers are kept for the last HEADERS_CACHE_SIZE tokens used.
+        """
+        cache = self._headers_cache
+        if cache is None:
+            cache = self._headers_cache = OrderedDict()
+        token_headers = cache.get(access_token)
+        if token_headers is None:
+            token_headers = cache[access_token] = {}
+            while len(cache) > HEADERS_CACHE_SIZE:
+                try:
+                    cache.popitem(last=False)
+                except KeyError:
+                    break
+        else:
+            try:
+                cache.move_to_end(access_token)
+            except KeyError:
+                pass
+        headers = token_headers.get(template.version)
+        if headers is None:
+            headers = _api_headers(access_token=access_token)
+            if template.version:
+                headers[HEADER_ACCEPT_VERSION] = template.version
+            headers = token_headers[template.version] = MappingProxyType(headers)
+        return template.prepare(headers, **kwargs)
+
     def _build_get_session_request(self, install_id, identifier, password):
-        return {
-            "method": "post",
-            "url": API_GET_SESSION_URL,
-            "json": {
+        return self._prepare(
+            GET_SESSION,
+            json={
                 "installId": install_id,
                 "identifier": identifier,
                 "password": password,
             },
-        }
+        )
 
     def _build_send_verification_code_request(
         self, access_token, login_method, username
@@ -195,103 +336,66 @@ class ApiCommon:
         else:
             json = {"value": username}
 
-        return {
-            "method": "post",
-            "url": API_SEND_VERIFICATION_CODE_URLS[login_method],
-            "access_token": access_token,
-            "json": json,
-        }
+        return self._prepare(
+            SEND_VERIFICATION_CODE[login_method], access_token, json=json
+        )
 
     def _build_validate_verification_code_request(
         self, access_token, login_method, username, verification_code
     ):
-        return {
-            "method": "post",
-            "url": API_VALIDATE_VERIFICATION_CODE_URLS[login_method],
-            "access_token": access_token,
-            "json": {login_method: username, "code": str(verification_code)},
-        }
+        return self._prepare(
+            VALIDATE_VERIFICATION_CODE[login_method],
+            access_token,
+            json={login_method: username, "code": str(verification_code)},
+        )
 
     def _build_get_doorbells_request(self, access_token):
-        return {
-            "method": "get",
-            "url": API_GET_DOORBELLS_URL,
-            "access_token": access_token,
-        }
+        return self._prepare(GET_DOORBELLS, access_token)
 
     def _build_get_doorbell_detail_request(self, access_token, doorbell_id):
-        return {
-            "method": "get",
-            "url": API_GET_DOORBELL_URL.format(doorbell_id=doorbell_id),
-            "access_token": access_token,
-        }
+        return self._prepare(GET_DOORBELL, access_token, doorbell_id=doorbell_id)
 
     def _build_wakeup_doorbell_request(self, access_token, doorbell_id):
-        return {
-            "method": "put",
-            "url": API_WAKEUP_DOORBELL_URL.format(doorbell_id=doorbell_id),
-            "access_token": access_token,
-        }
+        return self._prepare(WAKEUP_DOORBELL, access_token, doorbell_id=doorbell_id)
 
     def _build_get_houses_request(self, access_token):
-        return {"method": "get", "access_token": access_token}
+        return self._prepare(GET_HOUSES, access_token)
 
     def _build_get_house_request(self, access_token, house_id):
-        return {
-            "method": "get",
-            "url": API_GET_HOUSE_URL.format(house_id=house_id),
-            "access_token": access_token,
-        }
+        return self._prepare(GET_HOUSE, access_token, house_id=house_id)
 
     def _build_get_house_activities_request(self, access_token, house_id, limit=8):
-        return {
-            "method": "get",
-            "url": API_GET_HOUSE_ACTIVITIES_URL.format(house_id=house_id),
-            "version": "4.0.0",
-            "access_token": access_token,
-            "params": {"limit": limit},
-        }
+        return self._prepare(
+            GET_HOUSE_ACTIVITIES,
+            access_token,
+            params={"limit": limit},
+            house_id=house_id,
+        )
 
     def _build_get_locks_request(self, access_token):
-        return {"method": "get", "url": API_GET_LOCKS_URL, "access_token": access_token}
+        return self._prepare(GET_LOCKS, access_token)
 
     def _build_get_user_request(self, access_token):
-        return {"method": "get", "url": API_GET_USER_URL, "access_token": access_token}
+        return self._prepare(GET_USER, access_token)
 
     def _build_get_lock_detail_request(self, access_token, lock_id):
-        return {
-            "method": "get",
-            "url": API_GET_LOCK_URL.format(lock_id=lock_id),
-            "access_token": access_token,
-        }
+        return self._prepare(GET_LOCK, access_token, lock_id=lock_id)
 
     def _build_get_lock_status_request(self, access_token, lock_id):
-        return {
-            "method": "get",
-            "url": API_GET_LOCK_STATUS_URL.format(lock_id=lock_id),
-            "access_token": access_token,
-        }
+        return self._prepare(GET_LOCK_STATUS, access_token, lock_id=lock_id)
 
     def _build_get_pins_request(self, access_token, lock_id):
-        return {
-            "method": "get",
-            "url": API_GET_PINS_URL.format(lock_id=lock_id),
-            "access_token": access_token,
-        }
+        return self._prepare(GET_PINS, access_token, lock_id=lock_id)
 
     def _build_refresh_access_token_request(self, access_token):
-        return {
-            "method": "get",
-            "url": API_GET_HOUSES_URL,
-            "access_token": access_token,
-        }
+        return self._prepare(REFRESH_ACCESS_TOKEN, access_token)
 
     def _build_call_lock_operation_request(
         self, url_str, access_token, lock_id, timeout
     ):
-        return {
-            "method": "put",
-            "url": url_str.format(lock_id=lock_id),
-            "access_token": access_token,
-            "timeout": timeout,
-        }
+        return self._prepare(
+            _lock_operation_template(url_str),
+            access_token,
+            timeout=timeout,
+            lock_id=lock_id,
+        )
@@ -1,4 +1,3 @@
-from datetime import datetime, timedelta, timezone
 import json
 import logging
 import os
@@ -6,13 +5,13 @@ import os
 import requests
 
 from yalexs.authenticator_common import (
-    Authentication,
     AuthenticationState,
     AuthenticatorCommon,
     ValidationResult,
     from_authentication_json,
     to_authentication_json,
 )
+from yalexs.cache_file import atomic_write, cache_file_lock, read_cache_file
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -23,36 +22,22 @@ class Authenticator(AuthenticatorCommon):
         self._setup_authentication()
 
     def _setup_authentication(self):
+        if self._token_store is not None:
+            self.setup_from_authentication(
+                self._token_store.load(self._token_store_key), self._token_store_key
+            )
+            return
+
         access_token_cache_file = self._access_token_cache_file
         if access_token_cache_file is not None and os.path.exists(
             access_token_cache_file
         ):
             with open(access_token_cache_file) as file:
                 try:
-                    self._authentication = from_authentication_json(json.load(file))
-
-                    # If token is to expire within 7 days then print a warning.
-                    if self._authentication.is_expired():
-                        _LOGGER.error("Token has expired.")
-                        self._authentication = Authentication(
-                            AuthenticationState.REQUIRES_AUTHENTICATION,
-                            install_id=self._install_id,
-                        )
-                    # If token is not expired but less then 7 days before it
-                    # will.
-                    elif (
-                        self._authentication.parsed_expiration_time()
-                        - datetime.now(timezone.utc)
-                    ) < timedelta(days=7):
-                        exp_time = self._authentication.access_token_expires
-                        _LOGGER.warning(
-                            "API Token is going to expire at %s "
-                            "hours. Deleting file %s will result "
-                            "in a new token being requested next"
-                            " time",
-                            exp_time,
-                            access_token_cache_file,
-                        )
+                    self.setup_from_authentication(
+                        from_authentication_json(json.load(file)),
+                        f"file {access_token_cache_file}",
+                    )
                     return
                 except json.decoder.JSONDecodeError as error:
                     _LOGGER.error(
@@ -61,9 +46,7 @@ class Authenticator(AuthenticatorCommon):
                         error,
                     )
 
-        self._authentication = Authentication(
-            AuthenticationState.REQUIRES_AUTHENTICATION, install_id=self._install_id
-        )
+        self.setup_from_authentication(None, None)
 
     def authenticate(self):
         if self._authentication.state == AuthenticationState.AUTHENTICATED:
@@ -113,15 +96,35 @@ class Authenticator(AuthenticatorCommon):
             _LOGGER.warning("Tried to refresh access token when not authenticated")
             return self._authentication
 
-        refreshed_token = self._api.refresh_access_token(
-            self._authentication.access_token
-        )
+        # Only one process sharing the cache file or token store
+        # refreshes, the others wait for the lock and pick up the token
+        previous_token = self._authentication.access_token
+        with self._refresh_lock():
+            if self._adopt_cached_authentication(
+                self._load_cached_authentication(), previous_token
+            ):
+                return self._authentication
 
-        authentication = self._process_refreshed_access_token(refreshed_token)
-        self._cache_authentication(authentication)
+            refreshed_token = self._api.refresh_access_token(previous_token)
+
+            authentication = self._process_refreshed_access_token(refreshed_token)
+            self._cache_authentication(authentication)
         return authentication
 
+    def _refresh_lock(self):
+        if self._token_store is not None:
+            return self._token_store.refresh_lock(self._token_store_key)
+        return cache_file_lock(self._access_token_cache_file)
+
+    def _load_cached_authentication(self):
+        if self._token_store is not None:
+            return self._token_store.load(self._token_store_key)
+        return read_cache_file(self._access_token_cache_file)
+
     def _cache_authentication(self, authentication):
-        if self._access_token_cache_file is not None:
-            with open(self._access_token_cache_file, "w") as file:
-                file.write(to_authentication_json(authentication))
+        if self._token_store is not None:
+            self._token_store.save(self._token_store_key, authentication)
+        elif self._access_token_cache_file is not None:
+            atomic_write(
+                self._access_token_cache_file, to_authentication_json(authentication)
+            )
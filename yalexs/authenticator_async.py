@@ -1,19 +1,23 @@
-from datetime import datetime, timedelta, timezone
+import asyncio
 import json
 import logging
 import os
 
-import aiofiles
 from aiohttp import ClientError
 
 from yalexs.authenticator_common import (
-    Authentication,
     AuthenticationState,
     AuthenticatorCommon,
     ValidationResult,
     from_authentication_json,
     to_authentication_json,
 )
+from yalexs.cache_file import (
+    async_cache_file_lock,
+    async_read_cache_file,
+    atomic_write,
+)
+from yalexs.tracing import start_span
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -23,39 +27,26 @@ class AuthenticatorAsync(AuthenticatorCommon):
         super().__init__(*args, **kwargs)
 
     async def async_setup_authentication(self):
+        if self._token_store is not None:
+            self.setup_from_authentication(
+                await self._token_store.async_load(self._token_store_key),
+                self._token_store_key,
+            )
+            return
+
         access_token_cache_file = self._access_token_cache_file
         if access_token_cache_file is not None and os.path.exists(
             access_token_cache_file
         ):
+            import aiofiles  # pylint: disable=import-outside-toplevel
+
             async with aiofiles.open(access_token_cache_file, "r") as file:
                 try:
                     contents = await file.read()
-                    self._authentication = from_authentication_json(
-                        json.loads(contents)
+                    self.setup_from_authentication(
+                        from_authentication_json(json.loads(contents)),
+                        f"file {access_token_cache_file}",
                     )
-
-                    # If token is to expire within 7 days then print a warning.
-                    if self._authentication.is_expired():
-                        _LOGGER.error("Token has expired.")
-                        self._authentication = Authentication(
-                            AuthenticationState.REQUIRES_AUTHENTICATION,
-                            install_id=self._install_id,
-                        )
-                    # If token is not expired but less then 7 days before it
-                    # will.
-                    elif (
-                        self._authentication.parsed_expiration_time()
-                        - datetime.now(timezone.utc)
-                    ) < timedelta(days=7):
-                        exp_time = self._authentication.access_token_expires
-                        _LOGGER.warning(
-                            "API Token is going to expire at %s "
-                            "hours. Deleting file %s will result "
-                            "in a new token being requested next"
-                            " time",
-                            exp_time,
-                            access_token_cache_file,
-                        )
                     return
                 except json.decoder.JSONDecodeError as error:
                     _LOGGER.error(
@@ -64,9 +55,7 @@ class AuthenticatorAsync(AuthenticatorCommon):
                         error,
                     )
 
-        self._authentication = Authentication(
-            AuthenticationState.REQUIRES_AUTHENTICATION, install_id=self._install_id
-        )
+        self.setup_from_authentication(None, None)
 
     async def async_authenticate(self):
         if self._authentication.state == AuthenticationState.AUTHENTICATED:
@@ -119,15 +108,44 @@ class AuthenticatorAsync(AuthenticatorCommon):
             _LOGGER.warning("Tried to refresh access token when not authenticated")
             return self._authentication
 
-        refreshed_token = await self._api.async_refresh_access_token(
-            self._authentication.access_token
-        )
-
-        authentication = self._process_refreshed_access_token(refreshed_token)
-        await self._async_cache_authentication(authentication)
+        # Only one process sharing the cache file or token store
+        # refreshes, the others wait for the lock and pick up the token
+        previous_token = self._authentication.access_token
+        async with self._async_refresh_lock():
+            if self._adopt_cached_authentication(
+                await self._async_load_cached_authentication(), previous_token
+            ):
+                return self._authentication
+
+            with start_span("yalexs.refresh_access_token"):
+                refreshed_token = await self._api.async_refresh_access_token(
+                    previous_token
+                )
+
+                authentication = self._process_refreshed_access_token(refreshed_token)
+                # Write now so the lock is not held for the coalesce delay
+                await self._async_cache_authentication(authentication, flush=True)
         return authentication
 
-    async def _async_cache_authentication(self, authentication):
-        if self._access_token_cache_file is not None:
-            async with aiofiles.open(self._access_token_cache_file, "w") as file:
-                await file.write(to_authentication_json(authentication))
+    def _async_refresh_lock(self):
+        if self._token_store is not None:
+            return self._token_store.async_refresh_lock(self._token_store_key)
+        return async_cache_file_lock(self._access_token_cache_file)
+
+    async def _async_load_cached_authentication(self):
+        if self._token_store is not None:
+            return await self._token_store.async_load(self._token_store_key)
+        return await async_read_cache_file(self._access_token_cache_file)
+
+    async def _async_cache_authentication(self, authentication, flush=False):
+        if self._token_store is not None:
+            await self._token_store.async_save(
+                self._token_store_key, authentication, flush
+            )
+        elif self._access_token_cache_file is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                atomic_write,
+                self._access_token_cache_file,
+                to_authentication_json(authentication),
+            )
@@ -4,10 +4,8 @@ import json
 import logging
 import uuid
 
-import dateutil.parser
-import jwt
-
-from yalexs.api import HEADER_AUGUST_ACCESS_TOKEN
+from yalexs.api_common import HEADER_AUGUST_ACCESS_TOKEN
+from yalexs.datetime_util import parse_datetime
 
 # The default time before expiration to refresh a token
 DEFAULT_RENEWAL_THRESHOLD = timedelta(days=7)
@@ -50,7 +48,7 @@ class Authentication:
         self._access_token_expires = access_token_expires
         self._parsed_expiration_time = None
         if access_token_expires:
-            self._parsed_expiration_time = dateutil.parser.parse(access_token_expires)
+            self._parsed_expiration_time = parse_datetime(access_token_expires)
 
     @property
     def install_id(self):
@@ -101,6 +99,8 @@ class AuthenticatorCommon:
         install_id=None,
         access_token_cache_file=None,
         access_token_renewal_threshold=DEFAULT_RENEWAL_THRESHOLD,
+        token_store=None,
+        token_store_key=None,
     ):
         self._api = api
         self._login_method = login_method
@@ -110,6 +110,75 @@ class AuthenticatorCommon:
         self._access_token_cache_file = access_token_cache_file
         self._access_token_renewal_threshold = access_token_renewal_threshold
         self._authentication = None
+        self._token_store = token_store
+        self._token_store_key = (
+            f"{login_method}:{username}" if token_store_key is None else token_store_key
+        )
+
+    @property
+    def authentication(self):
+        return self._authentication
+
+    @property
+    def access_token_renewal_threshold(self):
+        return self._access_token_renewal_threshold
+
+    @property
+    def token_store_key(self):
+        return self._token_store_key
+
+    def setup_from_authentication(self, authentication, source=None):
+        """Use an authentication loaded from a cache unless it has expired.
+
+        source describes where it was loaded from for log messages.
+        """
+        if authentication is None:
+            self._authentication = Authentication(
+                AuthenticationState.REQUIRES_AUTHENTICATION, install_id=self._install_id
+            )
+            return
+
+        self._authentication = authentication
+        # If token is to expire within 7 days then print a warning.
+        if authentication.is_expired():
+            _LOGGER.error("Token has expired.")
+            self._authentication = Authentication(
+                AuthenticationState.REQUIRES_AUTHENTICATION,
+                install_id=self._install_id,
+            )
+        # If token is not expired but less then 7 days before it
+        # will.
+        elif (
+            authentication.parsed_expiration_time() - datetime.now(timezone.utc)
+        ) < timedelta(days=7):
+            _LOGGER.warning(
+                "API Token is going to expire at %s "
+                "hours. Deleting %s will result "
+                "in a new token being requested next"
+                " time",
+                authentication.access_token_expires,
+                source,
+            )
+
+    def _adopt_cached_authentication(self, cached, previous_token):
+        """Use a token another process refreshed while we waited for the lock.
+
+        The cached token is only used if it expires after ours and
+        does not need to be refreshed itself.
+        """
+        if (
+            cached is None
+            or cached.state != AuthenticationState.AUTHENTICATED
+            or cached.access_token == previous_token
+            or cached.parsed_expiration_time()
+            <= self._authentication.parsed_expiration_time()
+            or cached.parsed_expiration_time() - datetime.now(timezone.utc)
+            < self._access_token_renewal_threshold
+        ):
+            return False
+        _LOGGER.debug("Using access token refreshed by another process")
+        self._authentication = cached
+        return True
 
     def _authentication_from_session_response(
         self, install_id, response_headers, json_dict
@@ -139,6 +208,8 @@ class AuthenticatorCommon:
         )
 
     def _process_refreshed_access_token(self, refreshed_token):
+        import jwt  # pylint: disable=import-outside-toplevel
+
         jwt_claims = jwt.decode(refreshed_token, options={"verify_signature": False})
 
         if "exp" not in jwt_claims:
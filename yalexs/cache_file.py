@@ -0,0 +1,104 @@
+"""Share an access token cache file between processes."""
+
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+import json
+import logging
+import os
+import tempfile
+from typing import AsyncIterator, Iterator, Optional, Union
+
+from yalexs.authenticator_common import Authentication, from_authentication_json
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+LOCK_SUFFIX = ".lock"
+TEMP_PREFIX = ".yalexs-"
+TEMP_SUFFIX = ".tmp"
+LOCK_POLL_INTERVAL = 0.05
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@contextmanager
+def cache_file_lock(path: Optional[str]) -> Iterator[None]:
+    """Hold an exclusive lock shared by every process using a cache file.
+
+    The lock is taken on path + ".lock" since the cache file itself
+    is replaced when it is written. Nothing is locked when path is
+    None or on platforms without fcntl.
+    """
+    if path is None or fcntl is None:
+        yield
+        return
+    with open(path + LOCK_SUFFIX, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def async_cache_file_lock(path: Optional[str]) -> AsyncIterator[None]:
+    """Hold the lock of cache_file_lock without blocking the event loop."""
+    if path is None or fcntl is None:
+        yield
+        return
+    with open(path + LOCK_SUFFIX, "a") as lock_file:
+        # Poll rather than block in an executor so waiting can be cancelled
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def read_cache_file(path: Optional[str]) -> Optional[Authentication]:
+    """Return the Authentication in a cache file or None if it cannot be read."""
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return _parse_cache_file(path, file.read())
+
+
+async def async_read_cache_file(path: Optional[str]) -> Optional[Authentication]:
+    if path is None or not os.path.exists(path):
+        return None
+    import aiofiles  # pylint: disable=import-outside-toplevel
+
+    async with aiofiles.open(path, "r") as file:
+        return _parse_cache_file(path, await file.read())
+
+
+def _parse_cache_file(path: str, contents: str) -> Optional[Authentication]:
+    try:
+        return from_authentication_json(json.loads(contents))
+    except (json.decoder.JSONDecodeError, KeyError, ValueError) as error:
+        _LOGGER.error("Unable to read cache file (%s): %s", path, error)
+        return None
+
+
+def atomic_write(path: str, contents: Union[str, bytes]) -> None:
+    """Write text or bytes to a temporary file and rename it over path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=TEMP_PREFIX, suffix=TEMP_SUFFIX
+    )
+    try:
+        with os.fdopen(fd, "wb" if isinstance(contents, bytes) else "w") as file:
+            file.write(contents)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,151 @@
+"""Stop sending lock operations to bridges that are failing."""
+
+from enum import Enum
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from yalexs.activity import ACTION_BRIDGE_ONLINE, Activity
+from yalexs.exceptions import AugustApiCircuitOpenError
+from yalexs.middleware import ApiMiddleware, RequestContext, _remoteoperate_lock_id
+
+# Bridge offline, bridge in use and bridge timed out
+BRIDGE_FAILURE_STATUSES = {408, 422, 423}
+
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_TIMEOUT = 60
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class _Circuit:
+    __slots__ = ("state", "failures", "opened_at", "probe_started_at")
+
+    def __init__(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at: Optional[float] = None
+
+
+def _lock_id(context: RequestContext) -> Optional[str]:
+    if context.endpoint is None or not context.endpoint.startswith("remoteoperate_"):
+        return None
+    return _remoteoperate_lock_id(context.url)
+
+
+class BridgeCircuitBreaker(ApiMiddleware):
+    """A circuit breaker for the bridge of each lock.
+
+    Add it with api.add_middleware(BridgeCircuitBreaker()). Only
+    remoteoperate requests go through the breaker.
+
+    After failure_threshold bridge failures in a row (408, 422 or 423)
+    the circuit for the lock opens and operations fail right away with
+    AugustApiCircuitOpenError. After reset_timeout seconds one operation
+    is let through as a probe; if it succeeds the circuit closes, if
+    the bridge fails again it opens for another reset_timeout. A probe
+    that has not finished after reset_timeout no longer blocks another
+    one from being sent.
+
+    Pass pubnub activities to process_activities so the circuit closes
+    as soon as the bridge reports it is back online.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+    ) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def state(self, lock_id: str) -> CircuitState:
+        """Return the circuit state for a lock."""
+        with self._lock:
+            circuit = self._circuits.get(lock_id)
+            if circuit is None:
+                return CircuitState.CLOSED
+            if (
+                circuit.state == CircuitState.OPEN
+                and time.monotonic() - circuit.opened_at >= self._reset_timeout
+            ):
+                return CircuitState.HALF_OPEN
+            return circuit.state
+
+    def bridge_online(self, lock_id: str) -> None:
+        """Close the circuit for a lock whose bridge is back online."""
+        with self._lock:
+            self._circuits.pop(lock_id, None)
+
+    def process_activities(self, activities: Iterable[Activity]) -> None:
+        """Close circuits for bridge online activities."""
+        for activity in activities:
+            if activity.action == ACTION_BRIDGE_ONLINE:
+                self.bridge_online(activity.device_id)
+
+    def before_request(self, context: RequestContext) -> None:
+        lock_id = _lock_id(context)
+        if lock_id is None or "circuit_probe" in context.data:
+            # Retries of a probe are part of the probe
+            return
+        with self._lock:
+            circuit = self._circuits.get(lock_id)
+            if circuit is None or circuit.state == CircuitState.CLOSED:
+                return
+            now = time.monotonic()
+            if (
+                circuit.state == CircuitState.OPEN
+                and now - circuit.opened_at >= self._reset_timeout
+            ):
+                circuit.state = CircuitState.HALF_OPEN
+            if circuit.state == CircuitState.HALF_OPEN and (
+                circuit.probe_started_at is None
+                or now - circuit.probe_started_at >= self._reset_timeout
+            ):
+                circuit.probe_started_at = now
+                context.data["circuit_probe"] = now
+                return
+        raise AugustApiCircuitOpenError(
+            f"The operation was not sent because the bridge (connect) for {lock_id}"
+            " recently failed."
+        )
+
+    def after_response(self, context: RequestContext) -> None:
+        lock_id = _lock_id(context)
+        if lock_id is None:
+            return
+        with self._lock:
+            self._circuits.pop(lock_id, None)
+
+    def on_error(self, context: RequestContext) -> None:
+        lock_id = _lock_id(context)
+        if lock_id is None or isinstance(context.error, AugustApiCircuitOpenError):
+            return
+        with self._lock:
+            circuit = self._circuits.get(lock_id)
+            if "circuit_probe" in context.data:
+                probe_started_at = context.data.pop("circuit_probe")
+                if circuit is None:
+                    # The bridge came back online during the probe
+                    return
+                if circuit.probe_started_at == probe_started_at:
+                    circuit.probe_started_at = None
+                if context.status in BRIDGE_FAILURE_STATUSES:
+                    circuit.state = CircuitState.OPEN
+                    circuit.opened_at = time.monotonic()
+                return
+            if context.status not in BRIDGE_FAILURE_STATUSES:
+                return
+            if circuit is None:
+                circuit = self._circuits[lock_id] = _Circuit()
+            circuit.failures += 1
+            if circuit.failures >= self._failure_threshold:
+                circuit.state = CircuitState.OPEN
+                circuit.opened_at = time.monotonic()
@@ -0,0 +1,118 @@
+"""Serialize lock operations for each lock."""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from yalexs.lock import LockStatus
+
+OPERATION_LOCK = "lock"
+OPERATION_UNLOCK = "unlock"
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    """Avoid never retrieved warnings when every caller went away."""
+    if not future.cancelled():
+        future.exception()
+
+
+class _Command:
+    __slots__ = ("operation", "access_token", "future")
+
+    def __init__(self, operation: str, access_token: str) -> None:
+        self.operation = operation
+        self.access_token = access_token
+        self.future = asyncio.get_running_loop().create_future()
+        self.future.add_done_callback(_consume_exception)
+
+
+class _LockCommands:
+    __slots__ = ("running", "pending", "worker")
+
+    def __init__(self) -> None:
+        self.running: Optional[_Command] = None
+        self.pending: Optional[_Command] = None
+        self.worker: Optional[asyncio.Task] = None
+
+
+class LockCommandQueue:
+    """Send one lock operation at a time to each lock.
+
+    The bridge rejects a second operation with a 423 while one is in
+    progress, so operations for the same lock wait for the previous
+    one to finish. Operations that are waiting are coalesced: only the
+    last one requested is sent and every caller waiting on it gets its
+    result. Lock, unlock, lock sent while another operation is in
+    progress results in a single lock.
+    """
+
+    def __init__(self, api) -> None:
+        self._api = api
+        self._locks: Dict[str, _LockCommands] = {}
+
+    def queue_depth(self, lock_id: str) -> int:
+        """Return the number of operations in progress or waiting for a lock."""
+        commands = self._locks.get(lock_id)
+        if commands is None:
+            return 0
+        return (commands.running is not None) + (commands.pending is not None)
+
+    async def async_lock(self, access_token: str, lock_id: str) -> LockStatus:
+        """Queue a remote lock operation and return the LockStatus."""
+        return await self._async_queue(OPERATION_LOCK, access_token, lock_id)
+
+    async def async_unlock(self, access_token: str, lock_id: str) -> LockStatus:
+        """Queue a remote unlock operation and return the LockStatus."""
+        return await self._async_queue(OPERATION_UNLOCK, access_token, lock_id)
+
+    async def _async_queue(self, operation: str, access_token: str, lock_id: str):
+        commands = self._locks.get(lock_id)
+        if commands is None:
+            commands = self._locks[lock_id] = _LockCommands()
+        if commands.pending is None:
+            commands.pending = _Command(operation, access_token)
+        else:
+            _LOGGER.debug(
+                "Coalescing %s into %s for %s",
+                commands.pending.operation,
+                operation,
+                lock_id,
+            )
+            commands.pending.operation = operation
+            commands.pending.access_token = access_token
+        future = commands.pending.future
+        if commands.worker is None:
+            commands.worker = asyncio.create_task(self._async_run(lock_id, commands))
+        # Other callers may be waiting on the same result
+        return await asyncio.shield(future)
+
+    async def _async_run(self, lock_id: str, commands: _LockCommands) -> None:
+        try:
+            while commands.pending is not None:
+                command = commands.running = commands.pending
+                commands.pending = None
+                try:
+                    result = await self._async_execute(command, lock_id)
+                except asyncio.CancelledError:
+                    command.future.cancel()
+                    if commands.pending is not None:
+                        commands.pending.future.cancel()
+                        commands.pending = None
+                    raise
+                except Exception as err:  # pylint: disable=broad-except
+                    command.future.set_exception(err)
+                else:
+                    command.future.set_result(result)
+                finally:
+                    commands.running = None
+        finally:
+            commands.worker = None
+            if self._locks.get(lock_id) is commands:
+                del self._locks[lock_id]
+
+    async def _async_execute(self, command: _Command, lock_id: str):
+        if command.operation == OPERATION_LOCK:
+            return await self._api.async_lock(command.access_token, lock_id)
+        return await self._api.async_unlock(command.access_token, lock_id)
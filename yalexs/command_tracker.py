@@ -0,0 +1,138 @@
+"""Wait for queued lock operations to be confirmed over pubnub."""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Tuple
+
+from yalexs.lock import LockStatus, determine_lock_status
+from yalexs.pubnub_async import AugustPubNub, PubNubEvent
+
+COMMAND_COMPLETION_TIMEOUT = 30
+
+LOCK_COMPLETED = frozenset({LockStatus.LOCKED, LockStatus.JAMMED})
+UNLOCK_COMPLETED = frozenset({LockStatus.UNLOCKED, LockStatus.JAMMED})
+STATUS_COMPLETED = frozenset(LockStatus) - {LockStatus.UNKNOWN}
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CommandResult(NamedTuple):
+    """The outcome of a lock operation.
+
+    confirmed is False when pubnub did not report the new state in
+    time and lock_status was fetched from the api instead. elapsed is
+    the seconds from sending the operation to knowing the result.
+    """
+
+    lock_id: str
+    lock_status: LockStatus
+    confirmed: bool
+    elapsed: float
+
+
+class CommandTracker:
+    """Send queued lock operations and wait for pubnub to confirm them.
+
+    The lock must be registered with the AugustPubNub so its messages
+    are delivered. Call close() to stop listening.
+    """
+
+    def __init__(
+        self,
+        api,
+        august_pubnub: AugustPubNub,
+        timeout: float = COMMAND_COMPLETION_TIMEOUT,
+    ) -> None:
+        self._api = api
+        self._timeout = timeout
+        self._waiters: Dict[str, List[Tuple[FrozenSet, asyncio.Future]]] = {}
+        self._unsubscribe = august_pubnub.subscribe_events(self._handle_event)
+
+    def close(self) -> None:
+        """Stop listening to pubnub."""
+        self._unsubscribe()
+
+    async def async_lock(
+        self, access_token: str, lock_id: str, hyper_bridge: bool = True
+    ) -> CommandResult:
+        """Lock and wait until the lock reports it is locked."""
+        return await self._async_track(
+            self._api.async_lock_async,
+            LOCK_COMPLETED,
+            access_token,
+            lock_id,
+            hyper_bridge,
+        )
+
+    async def async_unlock(
+        self, access_token: str, lock_id: str, hyper_bridge: bool = True
+    ) -> CommandResult:
+        """Unlock and wait until the lock reports it is unlocked."""
+        return await self._async_track(
+            self._api.async_unlock_async,
+            UNLOCK_COMPLETED,
+            access_token,
+            lock_id,
+            hyper_bridge,
+        )
+
+    async def async_status(
+        self, access_token: str, lock_id: str, hyper_bridge: bool = True
+    ) -> CommandResult:
+        """Wake the lock and wait until it reports its status."""
+        return await self._async_track(
+            self._api.async_status_async,
+            STATUS_COMPLETED,
+            access_token,
+            lock_id,
+            hyper_bridge,
+        )
+
+    async def _async_track(
+        self,
+        send: Callable,
+        completed: FrozenSet[LockStatus],
+        access_token: str,
+        lock_id: str,
+        hyper_bridge: bool,
+    ) -> CommandResult:
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        # Listen before sending since pubnub can be faster than the api
+        waiter = (completed, future)
+        self._waiters.setdefault(lock_id, []).append(waiter)
+        try:
+            await send(access_token, lock_id, hyper_bridge)
+            try:
+                lock_status = await asyncio.wait_for(future, self._timeout)
+            except asyncio.TimeoutError:
+                lock_status = None
+        finally:
+            self._remove_waiter(lock_id, waiter)
+        if lock_status is not None:
+            return CommandResult(lock_id, lock_status, True, time.monotonic() - start)
+        _LOGGER.debug(
+            "No pubnub confirmation for %s after %ss, fetching status",
+            lock_id,
+            self._timeout,
+        )
+        lock_status = await self._api.async_get_lock_status(access_token, lock_id)
+        return CommandResult(lock_id, lock_status, False, time.monotonic() - start)
+
+    def _remove_waiter(self, lock_id: str, waiter) -> None:
+        waiters = self._waiters.get(lock_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del self._waiters[lock_id]
+
+    def _handle_event(self, event: PubNubEvent) -> None:
+        waiters = self._waiters.get(event.device_id)
+        if not waiters:
+            return
+        lock_status = determine_lock_status(event.message.get("status"))
+        for completed, future in waiters:
+            if lock_status in completed and not future.done():
+                future.set_result(lock_status)
@@ -0,0 +1,10 @@
+"""Datetime parsing that defers importing dateutil until it is needed."""
+
+from datetime import datetime
+
+
+def parse_datetime(datetime_string: str) -> datetime:
+    """Parse a datetime string returned from the api."""
+    import dateutil.parser  # pylint: disable=import-outside-toplevel
+
+    return dateutil.parser.parse(datetime_string)
@@ -0,0 +1,52 @@
+"""Bound the time api calls may take."""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+from typing import Iterator, Optional
+
+from yalexs.exceptions import AugustApiDeadlineExceededError
+
+_deadline: ContextVar[Optional[float]] = ContextVar("yalexs_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Make api calls in the block finish within seconds.
+
+    Retries, the sleeps between them and the http timeout of each
+    attempt are cut short to fit, and a call that cannot finish in
+    time raises AugustApiDeadlineExceededError. A nested deadline
+    can only shorten the one around it.
+
+    The blocking Api can only shorten the requests timeouts, which
+    bound connecting and each read of the response rather than the
+    whole request, so a server that keeps sending slowly can hold a
+    call past the deadline. ApiAsync bounds the whole request.
+
+    The deadline is kept in a context variable so it follows the
+    current task or thread.
+    """
+    new_deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and current < new_deadline:
+        new_deadline = current
+    token = _deadline.set(new_deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_remaining() -> Optional[float]:
+    """Return the seconds left before the deadline or None if there is none."""
+    current = _deadline.get()
+    if current is None:
+        return None
+    return current - time.monotonic()
+
+
+def _deadline_exceeded(url: str) -> AugustApiDeadlineExceededError:
+    return AugustApiDeadlineExceededError(
+        f"The deadline was exceeded before the call to {url} could finish."
+    )
@@ -0,0 +1,89 @@
+"""Control what the api logs at debug level."""
+
+import random
+import re
+from typing import Any, Iterable, Mapping, Optional
+
+from yalexs.api_common import HEADER_AUGUST_ACCESS_TOKEN
+
+DEFAULT_MAX_BODY_SIZE = 2048
+
+REDACTED = "**REDACTED**"
+REDACTED_HEADERS = frozenset({HEADER_AUGUST_ACCESS_TOKEN, "authorization"})
+REDACTED_KEYS = frozenset({"password", "code", "accessToken"})
+
+_JWT_RE = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*")
+
+
+class _Redacted:
+    """Format a value only if the log record is emitted."""
+
+    __slots__ = ("_value", "_policy")
+
+    def __init__(self, value, policy: "DebugLogPolicy") -> None:
+        self._value = value
+        self._policy = policy
+
+    def __str__(self) -> str:
+        return self._policy.format(self._value)
+
+
+class DebugLogPolicy:
+    """Decide which api calls are logged at debug level and how.
+
+    Each Api or ApiAsync has its own policy so logging can be turned
+    up for a single account. Only calls to endpoints, when given, are
+    logged and of those only sample_rate of them. Bodies are cut to
+    max_body_size characters and tokens, passwords and verification
+    codes are redacted.
+
+    Nothing is read or formatted for calls that will not be logged.
+    """
+
+    def __init__(
+        self,
+        endpoints: Optional[Iterable[str]] = None,
+        sample_rate: float = 1.0,
+        max_body_size: Optional[int] = DEFAULT_MAX_BODY_SIZE,
+        redact: bool = True,
+    ) -> None:
+        self.endpoints = None if endpoints is None else frozenset(endpoints)
+        self.sample_rate = sample_rate
+        self.max_body_size = max_body_size
+        self.redact = redact
+
+    def should_log(self, endpoint: Optional[str]) -> bool:
+        """Decide if a call to endpoint is logged."""
+        if self.endpoints is not None and endpoint not in self.endpoints:
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def lazy(self, value) -> _Redacted:
+        """Wrap a value to be formatted when the log record is emitted."""
+        return _Redacted(value, self)
+
+    def format(self, value: Any) -> str:
+        """Redact and truncate headers, a payload or a body for the log."""
+        if isinstance(value, (bytes, bytearray)):
+            value = value.decode("utf-8", "replace")
+        if self.redact:
+            value = _redact(value)
+        text = str(value)
+        if self.max_body_size is not None and len(text) > self.max_body_size:
+            return f"{text[:self.max_body_size]}... ({len(text)} characters)"
+        return text
+
+
+def _redact(value: Any) -> Any:
+    if isinstance(value, str):
+        return _JWT_RE.sub(REDACTED, value)
+    if isinstance(value, Mapping):
+        return {
+            key: (
+                REDACTED
+                if str(key).lower() in REDACTED_HEADERS or key in REDACTED_KEYS
+                else _redact(item)
+            )
+            for key, item in value.items()
+        }
+    return value
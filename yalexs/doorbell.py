@@ -1,9 +1,13 @@
 import datetime
 
-import dateutil.parser
-import requests
-
+from yalexs.datetime_util import parse_datetime
 from yalexs.device import Device, DeviceDetail
+from yalexs.streaming import (
+    DEFAULT_CHUNK_SIZE,
+    async_read_response_into,
+    async_stream_response,
+    stream_response,
+)
 
 DOORBELL_STATUS_KEY = "status"
 
@@ -70,9 +74,7 @@ class DoorbellDetail(DeviceDetail):
             self._model = data["type"]
 
         if "created_at" in recent_image:
-            self._image_created_at_datetime = dateutil.parser.parse(
-                recent_image["created_at"]
-            )
+            self._image_created_at_datetime = parse_datetime(recent_image["created_at"])
 
         self._battery_level = None
         if "telemetry" in data:
@@ -137,11 +139,70 @@ class DoorbellDetail(DeviceDetail):
     def has_subscription(self):
         return self._has_subscription
 
-    async def async_get_doorbell_image(self, aiohttp_session, timeout=10):
+    async def async_get_doorbell_image(
+        self, aiohttp_session, timeout=10, image_cache=None
+    ):
+        """Download the doorbell image.
+
+        Pass a DoorbellImageCache to only download each image once.
+        """
+        if image_cache is not None:
+            return await image_cache.async_get_image(
+                aiohttp_session,
+                self._image_url,
+                self._image_created_at_datetime,
+                timeout,
+            )
         response = await aiohttp_session.request(
             "get", self._image_url, timeout=timeout
         )
         return await response.read()
 
-    def get_doorbell_image(self, timeout=10):
-        return requests.get(self._image_url, timeout=timeout).content
+    def get_doorbell_image(self, timeout=10, http_session=None):
+        """Download the doorbell image.
+
+        Pass the Api's http_session to reuse its pooled connections.
+        """
+        if http_session is None:
+            import requests  # pylint: disable=import-outside-toplevel
+
+            http_session = requests
+        return http_session.get(self._image_url, timeout=timeout).content
+
+    async def async_stream_doorbell_image(
+        self, aiohttp_session, destination, timeout=10, chunk_size=DEFAULT_CHUNK_SIZE
+    ):
+        """Download the doorbell image to a path, file object or async sink.
+
+        Returns the number of bytes written.
+        """
+        response = await aiohttp_session.request(
+            "get", self._image_url, timeout=timeout
+        )
+        return await async_stream_response(response, destination, chunk_size)
+
+    async def async_get_doorbell_image_into(
+        self, aiohttp_session, buffer, timeout=10, chunk_size=DEFAULT_CHUNK_SIZE
+    ):
+        """Download the doorbell image into a reused bytearray.
+
+        Returns a memoryview of the image in buffer.
+        """
+        response = await aiohttp_session.request(
+            "get", self._image_url, timeout=timeout
+        )
+        return await async_read_response_into(response, buffer, chunk_size)
+
+    def stream_doorbell_image(
+        self, destination, timeout=10, http_session=None, chunk_size=DEFAULT_CHUNK_SIZE
+    ):
+        """Download the doorbell image to a path or file object.
+
+        Returns the number of bytes written.
+        """
+        if http_session is None:
+            import requests  # pylint: disable=import-outside-toplevel
+
+            http_session = requests
+        response = http_session.get(self._image_url, timeout=timeout, stream=True)
+        return stream_response(response, destination, chunk_size)
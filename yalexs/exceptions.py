@@ -1,9 +1,44 @@
-from requests.exceptions import HTTPError
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from requests.exceptions import HTTPError
+
+    class AugustApiHTTPError(HTTPError):
+        """An yale access api error with a friendly user consumable string."""
 
 
 class AugustApiAIOHTTPError(Exception):
     """An yale access api error with a friendly user consumable string."""
 
+    def __init__(self, message, status=None):
+        """Create the error with the http status of the response if any."""
+        super().__init__(message)
+        self.status = status
 
-class AugustApiHTTPError(HTTPError):
-    """An yale access api error with a friendly user consumable string."""
+
+class AugustApiCircuitOpenError(AugustApiAIOHTTPError):
+    """A lock operation was not sent because its bridge recently failed."""
+
+
+class AugustApiDeadlineExceededError(TimeoutError):
+    """An api call could not finish before its deadline."""
+
+
+def __getattr__(name):
+    """Define AugustApiHTTPError on first use.
+
+    This avoids importing requests for users of the async api.
+    """
+    if name != "AugustApiHTTPError":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from requests.exceptions import (  # pylint: disable=import-outside-toplevel
+        HTTPError,
+    )
+
+    class AugustApiHTTPError(HTTPError):
+        """An yale access api error with a friendly user consumable string."""
+
+    AugustApiHTTPError.__qualname__ = name
+    globals()[name] = AugustApiHTTPError
+    return AugustApiHTTPError
@@ -0,0 +1,237 @@
+"""A local fake of the yale access api for tests and benchmarks."""
+
+import asyncio
+import base64
+import copy
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from yalexs.api_common import HEADER_AUGUST_ACCESS_TOKEN
+
+FIXTURE_FILES = {
+    "get_locks": "get_locks.json",
+    "get_lock_detail": "get_lock.online.json",
+    "get_house_activities": "get_house_activities.json",
+    "get_doorbells": "get_doorbells.json",
+    "get_doorbell_detail": "get_doorbell.json",
+    "get_pins": "get_pins.json",
+    "lock": "lock.json",
+    "unlock": "unlock.json",
+}
+
+LOCK_STATUS_BY_OPERATION = {
+    "lock": "kAugLockState_Locked",
+    "unlock": "kAugLockState_Unlocked",
+}
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def make_access_token(expires_in: int = 86400) -> str:
+    """Make an unsigned jwt that the authenticators can decode."""
+    header = _b64(json.dumps({"alg": "none", "typ": "JWT"}).encode())
+    claims = _b64(json.dumps({"exp": int(time.time()) + expires_in}).encode())
+    return f"{header}.{claims}.fake"
+
+
+class FakeAugustServer:
+    """An in-process aiohttp server that mimics the yale access api.
+
+    Responses are served from the json fixtures in fixtures_dir, see
+    FIXTURE_FILES, with the device id in detail responses replaced by
+    the one requested. Lock operations update the status that is
+    returned for the lock.
+
+    Every response can be delayed by latency seconds. error_rate and
+    rate_limit_rate are the chance of a request failing with a 500 or
+    a 429. inject_status queues exact failures for tests.
+    """
+
+    def __init__(
+        self,
+        fixtures_dir: str,
+        latency: float = 0,
+        error_rate: float = 0,
+        rate_limit_rate: float = 0,
+        seed: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.request_counts: Dict[str, int] = {}
+        self._fixtures = {
+            name: _load_fixture(fixtures_dir, filename)
+            for name, filename in FIXTURE_FILES.items()
+        }
+        self._lock_status: Dict[str, str] = {}
+        self._injected: List[list] = []
+        self._random = random.Random(seed)
+        self._host = host
+        self._port = port
+        self._runner: Optional[web.AppRunner] = None
+        self._app = web.Application(middlewares=[self._fault_middleware])
+        self._app.add_routes(
+            [
+                web.post("/session", self._session),
+                web.get("/users/me", self._user),
+                web.get("/users/houses/mine", self._houses),
+                web.get(
+                    "/houses/{house_id}/activities",
+                    self._fixture_handler("get_house_activities"),
+                ),
+                web.get("/users/locks/mine", self._fixture_handler("get_locks")),
+                web.get("/locks/{lock_id}", self._lock_detail),
+                web.get("/locks/{lock_id}/status", self._lock_status_handler),
+                web.get("/locks/{lock_id}/pins", self._fixture_handler("get_pins")),
+                web.put("/remoteoperate/{lock_id}/{operation}", self._operate),
+                web.get(
+                    "/users/doorbells/mine", self._fixture_handler("get_doorbells")
+                ),
+                web.get("/doorbells/{doorbell_id}", self._doorbell_detail),
+                web.put("/doorbells/{doorbell_id}/wakeup", self._empty),
+            ]
+        )
+
+    async def __aenter__(self) -> "FakeAugustServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """Start listening."""
+        self._runner = web.AppRunner(self._app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        self._port = self._runner.addresses[0][1]
+
+    async def close(self) -> None:
+        """Stop listening and close open connections."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self._host}:{self._port}"
+
+    def inject_status(self, status: int, count: int = 1, path: str = None) -> None:
+        """Fail the next count requests, or only those for path, with status."""
+        self._injected.append([status, count, path])
+
+    def set_lock_status(self, lock_id: str, status: str) -> None:
+        """Set the raw status returned for a lock."""
+        self._lock_status[lock_id] = status
+
+    def _pop_injected_status(self, path: str) -> Optional[int]:
+        for injected in self._injected:
+            status, count, injected_path = injected
+            if injected_path is not None and injected_path != path:
+                continue
+            if count <= 1:
+                self._injected.remove(injected)
+            else:
+                injected[1] = count - 1
+            return status
+        return None
+
+    @web.middleware
+    async def _fault_middleware(self, request, handler):
+        route = request.match_info.route.resource
+        name = route.canonical if route is not None else request.path
+        self.request_counts[name] = self.request_counts.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        status = self._pop_injected_status(request.path)
+        if status is None:
+            if self.rate_limit_rate and self._random.random() < self.rate_limit_rate:
+                status = 429
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status = 500
+        if status is not None:
+            return web.json_response(
+                {"code": status, "message": "Injected failure"}, status=status
+            )
+        return await handler(request)
+
+    def _fixture(self, name):
+        return copy.deepcopy(self._fixtures[name])
+
+    def _fixture_handler(self, name):
+        async def _handler(_request):
+            return web.json_response(self._fixture(name))
+
+        return _handler
+
+    async def _session(self, _request):
+        return web.json_response(
+            {
+                "expiresAt": "2099-01-01T00:00:00.000Z",
+                "vPassword": True,
+                "vInstallId": True,
+            },
+            headers={HEADER_AUGUST_ACCESS_TOKEN: make_access_token()},
+        )
+
+    async def _user(self, _request):
+        return web.json_response({"UserID": "fake-user"})
+
+    async def _houses(self, _request):
+        return web.json_response(
+            [], headers={HEADER_AUGUST_ACCESS_TOKEN: make_access_token()}
+        )
+
+    async def _empty(self, _request):
+        return web.json_response({})
+
+    async def _lock_detail(self, request):
+        lock_id = request.match_info["lock_id"]
+        detail = self._fixture("get_lock_detail")
+        detail["LockID"] = lock_id
+        if lock_id in self._lock_status:
+            detail["LockStatus"]["status"] = self._lock_status[lock_id]
+        return web.json_response(detail)
+
+    async def _lock_status_handler(self, request):
+        lock_id = request.match_info["lock_id"]
+        return web.json_response(
+            {
+                "status": self._lock_status.get(lock_id, "kAugLockState_Locked"),
+                "doorState": "kAugDoorState_Closed",
+            }
+        )
+
+    async def _operate(self, request):
+        lock_id = request.match_info["lock_id"]
+        operation = request.match_info["operation"]
+        if operation in LOCK_STATUS_BY_OPERATION:
+            self._lock_status[lock_id] = LOCK_STATUS_BY_OPERATION[operation]
+        if request.query.get("type") == "async":
+            return web.Response(text="")
+        if operation not in LOCK_STATUS_BY_OPERATION:
+            raise web.HTTPNotFound()
+        result = self._fixture(operation)
+        result["info"]["lockID"] = lock_id
+        result["status"] = self._lock_status[lock_id]
+        return web.json_response(result)
+
+    async def _doorbell_detail(self, request):
+        detail = self._fixture("get_doorbell_detail")
+        detail["doorbellID"] = request.match_info["doorbell_id"]
+        return web.json_response(detail)
+
+
+def _load_fixture(fixtures_dir, filename):
+    with open(os.path.join(fixtures_dir, filename), encoding="utf-8") as file:
+        return json.load(file)
@@ -0,0 +1,187 @@
+"""Cache doorbell images in memory and on disk."""
+
+import asyncio
+from collections import OrderedDict
+import datetime
+import hashlib
+import logging
+import os
+from typing import Dict, Optional
+
+from yalexs.cache_file import TEMP_PREFIX, TEMP_SUFFIX, atomic_write
+
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_MEMORY_BYTES = 16 * 1024 * 1024
+IMAGE_SUFFIX = ".jpg"
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def image_cache_key(
+    image_url: str, image_created_at: Optional[datetime.datetime] = None
+) -> str:
+    """Return the key of an image, a hash of its url and creation time."""
+    created_at = "" if image_created_at is None else image_created_at.isoformat()
+    return hashlib.sha256(f"{image_url}|{created_at}".encode()).hexdigest()
+
+
+class DoorbellImageCache:
+    """Keep doorbell images so each one is only downloaded once.
+
+    Images are keyed by their url and creation time. The most
+    recently used ones are kept in memory up to max_memory_bytes and
+    on disk in directory up to max_disk_bytes, the least recently
+    used being evicted first. Concurrent requests for an image that
+    is not cached share a single download. Temporary files left in
+    directory by a write that never finished are removed when the
+    cache is created.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+        max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+    ) -> None:
+        self._directory = directory
+        self._max_disk_bytes = max_disk_bytes
+        self._max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._downloads: Dict[str, asyncio.Future] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load_disk_index()
+
+    @property
+    def disk_bytes(self) -> int:
+        return self._disk_bytes
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._memory or key in self._disk
+
+    async def async_get_image(
+        self,
+        aiohttp_session,
+        image_url: str,
+        image_created_at: Optional[datetime.datetime] = None,
+        timeout=10,
+    ) -> bytes:
+        """Return an image from the cache, downloading it if needed."""
+        key = image_cache_key(image_url, image_created_at)
+        image = self._memory.get(key)
+        if image is not None:
+            self._memory.move_to_end(key)
+            return image
+        download = self._downloads.get(key)
+        if download is None:
+            download = asyncio.ensure_future(
+                self._async_fetch(aiohttp_session, key, image_url, timeout)
+            )
+            self._downloads[key] = download
+            download.add_done_callback(lambda _: self._downloads.pop(key, None))
+        return await asyncio.shield(download)
+
+    async def async_stop(self) -> None:
+        """Cancel the downloads in progress."""
+        downloads = list(self._downloads.values())
+        for download in downloads:
+            download.cancel()
+        await asyncio.gather(*downloads, return_exceptions=True)
+
+    async def _async_fetch(self, aiohttp_session, key, image_url, timeout) -> bytes:
+        if key in self._disk:
+            try:
+                image = await self._async_read(key)
+            except OSError as err:
+                _LOGGER.debug("Failed to read cached image %s: %s", key, err)
+                self._forget_disk(key)
+            else:
+                self._disk.move_to_end(key)
+                self._remember(key, image)
+                return image
+
+        response = await aiohttp_session.request("get", image_url, timeout=timeout)
+        response.raise_for_status()
+        image = await response.read()
+        self._remember(key, image)
+        await self._async_write(key, image)
+        return image
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key + IMAGE_SUFFIX)
+
+    async def _async_read(self, key: str) -> bytes:
+        import aiofiles  # pylint: disable=import-outside-toplevel
+
+        path = self._path(key)
+        async with aiofiles.open(path, "rb") as file:
+            image = await file.read()
+        # Keep the order of the disk tier across restarts
+        os.utime(path)
+        return image
+
+    async def _async_write(self, key: str, image: bytes) -> None:
+        if len(image) > self._max_disk_bytes:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, atomic_write, self._path(key), image
+            )
+        except OSError as err:
+            _LOGGER.warning("Failed to cache image %s: %s", key, err)
+            return
+        self._forget_disk(key)
+        self._disk[key] = len(image)
+        self._disk_bytes += len(image)
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        while self._disk_bytes > self._max_disk_bytes:
+            oldest = next(iter(self._disk))
+            self._forget_disk(oldest)
+            try:
+                os.unlink(self._path(oldest))
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key: str, image: bytes) -> None:
+        if len(image) > self._max_memory_bytes or key in self._memory:
+            return
+        self._memory[key] = image
+        self._memory_bytes += len(image)
+        while self._memory_bytes > self._max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _forget_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _load_disk_index(self) -> None:
+        entries = []
+        with os.scandir(self._directory) as scan:
+            for entry in scan:
+                if not entry.is_file():
+                    continue
+                name = entry.name
+                if name.startswith(TEMP_PREFIX) and name.endswith(TEMP_SUFFIX):
+                    try:
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        pass
+                elif name.endswith(IMAGE_SUFFIX):
+                    stat = entry.stat()
+                    entries.append(
+                        (stat.st_mtime, name[: -len(IMAGE_SUFFIX)], stat.st_size)
+                    )
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
@@ -0,0 +1,138 @@
+"""Download new doorbell images before anyone asks for them."""
+
+import asyncio
+import datetime
+import logging
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from yalexs.activity import (
+    Activity,
+    DoorbellImageCaptureActivity,
+    DoorbellMotionActivity,
+)
+from yalexs.doorbell import DoorbellDetail
+from yalexs.image_cache import DoorbellImageCache, image_cache_key
+from yalexs.pubnub_activity import activities_from_pubnub_message
+
+DEFAULT_MAX_CONCURRENT_PREFETCHES = 4
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DoorbellImagePrefetcher:
+    """Fetch doorbell images into a DoorbellImageCache as they are taken.
+
+    The image of a motion or image capture activity for a tracked
+    DoorbellDetail is downloaded in the background when it is not
+    older than the image of the detail, so it is already cached when
+    it is first requested. The detail itself is never changed; that
+    is left to the caller. At most max_concurrent images are
+    downloaded at once.
+
+    The prefetcher may be created outside of the event loop.
+    """
+
+    def __init__(
+        self,
+        image_cache: DoorbellImageCache,
+        aiohttp_session,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_PREFETCHES,
+        timeout=10,
+    ) -> None:
+        self._image_cache = image_cache
+        self._aiohttp_session = aiohttp_session
+        self._max_concurrent = max_concurrent
+        # Made in the running loop, on python 3.9 it binds to a loop
+        # when it is created
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._timeout = timeout
+        self._doorbell_details: Dict[str, DoorbellDetail] = {}
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def add_doorbell_detail(self, doorbell_detail: DoorbellDetail) -> None:
+        """Track a DoorbellDetail."""
+        self._doorbell_details[doorbell_detail.device_id] = doorbell_detail
+
+    def remove_doorbell_detail(self, device_id: str) -> None:
+        """Stop tracking a DoorbellDetail."""
+        self._doorbell_details.pop(device_id, None)
+
+    @property
+    def pending(self) -> Set[str]:
+        """The keys of the images being fetched."""
+        return set(self._pending)
+
+    def process_activities(self, activities: Iterable[Activity]) -> None:
+        """Fetch the images of new motion and image capture activities."""
+        for activity in activities:
+            if not isinstance(
+                activity, (DoorbellMotionActivity, DoorbellImageCaptureActivity)
+            ):
+                continue
+            doorbell_detail = self._doorbell_details.get(activity.device_id)
+            image_created_at = activity.image_created_at_datetime
+            if (
+                doorbell_detail is None
+                or activity.image_url is None
+                or image_created_at is None
+            ):
+                continue
+            # The detail may already have been updated with this image
+            current_created_at = doorbell_detail.image_created_at_datetime
+            if current_created_at is None or current_created_at <= image_created_at:
+                self.prefetch(activity.image_url, image_created_at)
+
+    def subscribe_pubnub(self, august_pubnub) -> Callable[[], None]:
+        """Process the activities of pubnub messages for tracked doorbells.
+
+        Returns a callable that can be used to unsubscribe.
+        """
+
+        def _on_event(event):
+            doorbell_detail = self._doorbell_details.get(event.device_id)
+            if doorbell_detail is not None:
+                self.process_activities(
+                    activities_from_pubnub_message(
+                        doorbell_detail, event.date_time, event.message
+                    )
+                )
+
+        return august_pubnub.subscribe_events(_on_event)
+
+    def prefetch(
+        self, image_url: str, image_created_at: Optional[datetime.datetime] = None
+    ) -> Optional[asyncio.Task]:
+        """Fetch an image in the background unless it is cached or pending."""
+        key = image_cache_key(image_url, image_created_at)
+        if key in self._image_cache:
+            return None
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._async_prefetch(image_url, image_created_at)
+            )
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return task
+
+    async def _async_prefetch(
+        self, image_url: str, image_created_at: Optional[datetime.datetime]
+    ) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrent)
+        async with self._semaphore:
+            try:
+                await self._image_cache.async_get_image(
+                    self._aiohttp_session, image_url, image_created_at, self._timeout
+                )
+            except Exception as err:  # pylint: disable=broad-except
+                _LOGGER.debug("Failed to prefetch image %s: %s", image_url, err)
+
+    async def async_stop(self) -> None:
+        """Cancel the fetches in progress and the downloads of the image cache."""
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._image_cache.async_stop()
+        self._semaphore = None
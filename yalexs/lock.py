@@ -2,9 +2,8 @@ import datetime
 from enum import Enum
 from typing import List, Optional
 
-import dateutil.parser
-
 from yalexs.bridge import BridgeDetail, BridgeStatus
+from yalexs.datetime_util import parse_datetime
 from yalexs.device import Device, DeviceDetail
 from yalexs.keypad import KeypadDetail
 
@@ -77,9 +76,7 @@ class LockDetail(DeviceDetail):
             self._door_state = determine_door_state(lock_status.get(DOOR_STATE_KEY))
 
             if "dateTime" in lock_status:
-                self._lock_status_datetime = dateutil.parser.parse(
-                    lock_status["dateTime"]
-                )
+                self._lock_status_datetime = parse_datetime(lock_status["dateTime"])
                 self._door_state_datetime = self._lock_status_datetime
 
             if (
@@ -0,0 +1,175 @@
+"""Per endpoint request metrics."""
+
+from bisect import bisect_left
+import threading
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from yalexs.middleware import ApiMiddleware, RequestContext
+
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class EndpointMetrics:
+    """Counters and a latency histogram for one endpoint."""
+
+    __slots__ = (
+        "requests",
+        "retries",
+        "rate_limited",
+        "errors",
+        "latency_counts",
+        "latency_sum",
+    )
+
+    def __init__(self, bucket_count: int) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.errors: Dict[str, int] = {}
+        # One count per bucket plus one for larger values
+        self.latency_counts = [0] * (bucket_count + 1)
+        self.latency_sum = 0.0
+
+    def as_dict(self, buckets: Sequence[float]) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "errors": dict(self.errors),
+            "latency": {
+                "buckets": dict(zip((*buckets, float("inf")), self.latency_counts)),
+                "sum": self.latency_sum,
+                "count": sum(self.latency_counts),
+            },
+        }
+
+
+class MetricsRegistry(ApiMiddleware):
+    """Collect request metrics for an Api or ApiAsync.
+
+    Add the registry with api.add_middleware(registry). Metrics are
+    keyed by endpoint name. Latency covers the whole call including
+    retries and is counted in the first bucket it fits.
+
+    Pass threadsafe=False when the registry is only used by ApiAsync
+    on one event loop to skip locking in the hooks.
+    """
+
+    def __init__(
+        self,
+        buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS,
+        threadsafe: bool = True,
+    ) -> None:
+        self._buckets = tuple(sorted(buckets))
+        self._endpoints: Dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+        if not threadsafe:
+            self.on_retry = self._on_retry
+            self.after_response = self._observe
+            self.on_error = self._on_error
+
+    @property
+    def buckets(self) -> Sequence[float]:
+        return self._buckets
+
+    def _metrics(self, endpoint: Optional[str]) -> EndpointMetrics:
+        endpoint = endpoint or "unknown"
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints[endpoint] = EndpointMetrics(len(self._buckets))
+        return metrics
+
+    def _observe(self, context: RequestContext) -> EndpointMetrics:
+        """Count a finished call, this is after_response without the lock."""
+        metrics = self._endpoints.get(context.endpoint)
+        if metrics is None:
+            metrics = self._metrics(context.endpoint)
+        elapsed = context.elapsed
+        metrics.requests += 1
+        metrics.latency_counts[bisect_left(self._buckets, elapsed)] += 1
+        metrics.latency_sum += elapsed
+        return metrics
+
+    def _on_retry(self, context: RequestContext) -> None:
+        metrics = self._metrics(context.endpoint)
+        metrics.retries += 1
+        if context.status == 429:
+            metrics.rate_limited += 1
+
+    def _on_error(self, context: RequestContext) -> None:
+        errors = self._observe(context).errors
+        error_class = type(context.error).__name__
+        errors[error_class] = errors.get(error_class, 0) + 1
+
+    def on_retry(self, context: RequestContext) -> None:
+        with self._lock:
+            self._on_retry(context)
+
+    def after_response(self, context: RequestContext) -> None:
+        with self._lock:
+            self._observe(context)
+
+    def on_error(self, context: RequestContext) -> None:
+        with self._lock:
+            self._on_error(context)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a copy of the metrics keyed by endpoint."""
+        with self._lock:
+            return {
+                endpoint: metrics.as_dict(self._buckets)
+                for endpoint, metrics in self._endpoints.items()
+            }
+
+    def reset(self) -> None:
+        """Clear all metrics."""
+        with self._lock:
+            self._endpoints.clear()
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text(registry: MetricsRegistry, prefix: str = "yalexs_api") -> str:
+    """Render the metrics in the Prometheus text exposition format."""
+    snapshot = registry.snapshot()
+    lines = []
+
+    def _counter(name, help_text, key):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        for endpoint, metrics in snapshot.items():
+            lines.append(f'{prefix}_{name}{{endpoint="{endpoint}"}} {metrics[key]}')
+
+    _counter("requests_total", "Api calls made.", "requests")
+    _counter("retries_total", "Api call attempts that were retried.", "retries")
+    _counter("rate_limited_total", "Attempts rejected with a 429.", "rate_limited")
+
+    lines.append(f"# HELP {prefix}_errors_total Api calls that failed.")
+    lines.append(f"# TYPE {prefix}_errors_total counter")
+    for endpoint, metrics in snapshot.items():
+        for error_class, count in metrics["errors"].items():
+            lines.append(
+                f'{prefix}_errors_total{{endpoint="{endpoint}",'
+                f'error="{error_class}"}} {count}'
+            )
+
+    name = f"{prefix}_request_duration_seconds"
+    lines.append(f"# HELP {name} Api call latency including retries.")
+    lines.append(f"# TYPE {name} histogram")
+    for endpoint, metrics in snapshot.items():
+        latency = metrics["latency"]
+        cumulative = 0
+        for bound, count in latency["buckets"].items():
+            cumulative += count
+            lines.append(
+                f'{name}_bucket{{endpoint="{endpoint}",'
+                f'le="{_format_value(bound)}"}} {cumulative}'
+            )
+        lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {latency["sum"]}')
+        lines.append(f'{name}_count{{endpoint="{endpoint}"}} {latency["count"]}')
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,175 @@
+"""Hooks around the http calls made by Api and ApiAsync."""
+
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+
+class RequestContext:
+    """The state of one api call as seen by middleware.
+
+    endpoint names the request, ie get_lock_detail or
+    remoteoperate_lock. method, url and kwargs (headers, params,
+    json and timeout) may be changed in before_request to alter
+    the request that is sent.
+
+    attempt counts from 1 and increases each time the call is
+    retried. Times are from time.monotonic().
+    """
+
+    __slots__ = (
+        "endpoint",
+        "method",
+        "url",
+        "kwargs",
+        "attempt",
+        "start_time",
+        "attempt_start_time",
+        "end_time",
+        "response",
+        "status",
+        "error",
+        "data",
+    )
+
+    def __init__(self, endpoint: str, method: str, url: str, kwargs: Dict) -> None:
+        self.endpoint = endpoint
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.attempt = 0
+        self.start_time = time.monotonic()
+        self.attempt_start_time = self.start_time
+        self.end_time: Optional[float] = None
+        self.response: Any = None
+        self.status: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self.data: Dict[str, Any] = {}
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the call started, over all attempts."""
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    @property
+    def attempt_elapsed(self) -> float:
+        """Seconds spent on the current attempt."""
+        return (self.end_time or time.monotonic()) - self.attempt_start_time
+
+    def start_attempt(self) -> None:
+        self.attempt += 1
+        if self.attempt == 1:
+            # Set up by __init__
+            return
+        self.attempt_start_time = time.monotonic()
+        self.end_time = None
+        self.response = None
+        self.status = None
+        self.error = None
+
+    def set_response(self, response, status: int) -> None:
+        self.end_time = time.monotonic()
+        self.response = response
+        self.status = status
+
+    def set_error(self, error: BaseException) -> None:
+        if self.end_time is None:
+            self.end_time = time.monotonic()
+        self.error = error
+
+
+class ApiMiddleware:
+    """Base class for api middleware.
+
+    Subclasses override the hooks they need. before_request is
+    called for each attempt in the order middleware was added, the
+    other hooks are called in reverse order so the first middleware
+    wraps the rest.
+
+    before_request may raise to fail the call without sending it.
+    Hooks are called from the event loop for ApiAsync and must not
+    block. Data for a call can be kept in context.data.
+    """
+
+    def before_request(self, context: RequestContext) -> None:
+        """Called before each attempt is sent."""
+
+    def after_response(self, context: RequestContext) -> None:
+        """Called once when the call succeeds."""
+
+    def on_retry(self, context: RequestContext) -> None:
+        """Called when an attempt will be retried."""
+
+    def on_error(self, context: RequestContext) -> None:
+        """Called once when the call fails with context.error.
+
+        This includes calls that are cancelled, in which case
+        context.error is an asyncio.CancelledError.
+        """
+
+
+def _remoteoperate_lock_id(url: str) -> str:
+    """Return the lock id from a /remoteoperate/{lock_id}/{operation} url."""
+    return url.partition("?")[0].rsplit("/", 2)[-2]
+
+
+def _hooks(middlewares: Sequence[ApiMiddleware], name: str) -> Tuple[Callable, ...]:
+    """Return the bound hooks of the middleware that override name."""
+    default = getattr(ApiMiddleware, name)
+    return tuple(
+        hook
+        for hook in (getattr(middleware, name) for middleware in middlewares)
+        if getattr(hook, "__func__", None) is not default
+    )
+
+
+class _MiddlewareChain:
+    """The hooks of a sequence of middleware in the order they are called.
+
+    Hooks a middleware does not override are left out so they cost
+    nothing per call, and a chain without hooks is false.
+    """
+
+    __slots__ = (
+        "middlewares",
+        "before_request",
+        "after_response",
+        "on_retry",
+        "on_error",
+    )
+
+    def __init__(self, middlewares: Sequence[ApiMiddleware] = ()) -> None:
+        self.middlewares = tuple(middlewares)
+        self.before_request = _hooks(self.middlewares, "before_request")
+        reverse = self.middlewares[::-1]
+        self.after_response = _hooks(reverse, "after_response")
+        self.on_retry = _hooks(reverse, "on_retry")
+        self.on_error = _hooks(reverse, "on_error")
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.before_request or self.after_response or self.on_retry or self.on_error
+        )
+
+
+def _before_request(chain: _MiddlewareChain, context: RequestContext) -> None:
+    context.start_attempt()
+    for hook in chain.before_request:
+        hook(context)
+
+
+def _on_retry(chain: _MiddlewareChain, context: RequestContext) -> None:
+    for hook in chain.on_retry:
+        hook(context)
+
+
+def _after_response(chain: _MiddlewareChain, context: RequestContext) -> None:
+    for hook in chain.after_response:
+        hook(context)
+
+
+def _on_error(
+    chain: _MiddlewareChain, context: RequestContext, error: BaseException
+) -> None:
+    context.set_error(error)
+    for hook in chain.on_error:
+        hook(context)
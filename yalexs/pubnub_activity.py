@@ -14,9 +14,9 @@ from yalexs.activity import (
     ACTION_LOCK_LOCKING,
     ACTION_LOCK_UNLOCK,
     ACTION_LOCK_UNLOCKING,
+    ACTIVITY_ACTION_TO_CLASS,
     SOURCE_PUBNUB,
 )
-from yalexs.api_common import _activity_from_dict
 from yalexs.doorbell import DOORBELL_STATUS_KEY, DoorbellDetail
 from yalexs.lock import (
     DOOR_STATE_KEY,
@@ -30,12 +30,33 @@ from yalexs.lock import (
 
 from .device import Device
 
+LOCK_STATUS_TO_ACTION = {
+    LockStatus.LOCKED: ACTION_LOCK_LOCK,
+    LockStatus.UNLOCKED: ACTION_LOCK_UNLOCK,
+    LockStatus.LOCKING: ACTION_LOCK_LOCKING,
+    LockStatus.UNLOCKING: ACTION_LOCK_UNLOCKING,
+    LockStatus.JAMMED: ACTION_LOCK_JAMMED,
+}
+DOOR_STATE_TO_ACTION = {
+    LockDoorStatus.OPEN: ACTION_DOOR_OPEN,
+    LockDoorStatus.CLOSED: ACTION_DOOR_CLOSED,
+}
+BRIDGE_ACTIONS = {ACTION_BRIDGE_ONLINE, ACTION_BRIDGE_OFFLINE}
+DOORBELL_ACTIONS = {
+    ACTION_DOORBELL_MOTION_DETECTED,
+    ACTION_DOORBELL_IMAGE_CAPTURE,
+    ACTION_DOORBELL_BUTTON_PUSHED,
+}
+
 
 def activities_from_pubnub_message(
     device: Device, date_time: datetime, message: Dict[str, Any]
 ):
     """Create activities from pubnub."""
     activities = []
+    # The envelope is built once per message and shared by every
+    # activity created from it since the activity constructors
+    # copy out what they need and never hold on to the dict.
     activity_dict = {
         "deviceID": device.device_id,
         "house": device.house_id,
@@ -44,7 +65,7 @@ def activities_from_pubnub_message(
     }
     if isinstance(device, LockDetail):
         activity_dict["deviceType"] = "lock"
-        activity_dict["info"] = message.get("info", {})
+        activity_dict["info"] = dict(message.get("info", {}))
         calling_user_id = message.get("callingUserID")
         if calling_user_id:
             activity_dict["callingUser"] = {"UserID": calling_user_id}
@@ -53,48 +74,33 @@ def activities_from_pubnub_message(
 
         if LOCK_STATUS_KEY in message:
             status = message[LOCK_STATUS_KEY]
-            if status == ACTION_BRIDGE_ONLINE:
-                _add_activity(activities, activity_dict, ACTION_BRIDGE_ONLINE)
-            elif status == ACTION_BRIDGE_OFFLINE:
-                _add_activity(activities, activity_dict, ACTION_BRIDGE_OFFLINE)
-            lock_status = determine_lock_status(status)
-            if lock_status == LockStatus.LOCKED:
-                _add_activity(activities, activity_dict, ACTION_LOCK_LOCK)
-            elif lock_status == LockStatus.UNLOCKED:
-                _add_activity(activities, activity_dict, ACTION_LOCK_UNLOCK)
-            elif lock_status == LockStatus.LOCKING:
-                _add_activity(activities, activity_dict, ACTION_LOCK_LOCKING)
-            elif lock_status == LockStatus.UNLOCKING:
-                _add_activity(activities, activity_dict, ACTION_LOCK_UNLOCKING)
-            elif lock_status == LockStatus.JAMMED:
-                _add_activity(activities, activity_dict, ACTION_LOCK_JAMMED)
+            if status in BRIDGE_ACTIONS:
+                _add_activity(activities, activity_dict, status)
+            action = LOCK_STATUS_TO_ACTION.get(determine_lock_status(status))
+            if action:
+                _add_activity(activities, activity_dict, action)
         if DOOR_STATE_KEY in message:
-            door_state = determine_door_state(message[DOOR_STATE_KEY])
-            if door_state == LockDoorStatus.OPEN:
-                _add_activity(activities, activity_dict, ACTION_DOOR_OPEN)
-            elif door_state == LockDoorStatus.CLOSED:
-                _add_activity(activities, activity_dict, ACTION_DOOR_CLOSED)
+            action = DOOR_STATE_TO_ACTION.get(
+                determine_door_state(message[DOOR_STATE_KEY])
+            )
+            if action:
+                _add_activity(activities, activity_dict, action)
 
     elif isinstance(device, DoorbellDetail):
         activity_dict["deviceType"] = "doorbell"
-        info = activity_dict["info"] = message.get("data", {})
+        info = activity_dict["info"] = dict(message.get("data", {}))
         info.setdefault("image", info.get("result", {}))
         info.setdefault("started", activity_dict["dateTime"])
         info.setdefault("ended", activity_dict["dateTime"])
 
         if DOORBELL_STATUS_KEY in message:
             status = message[DOORBELL_STATUS_KEY]
-            if status in (
-                ACTION_DOORBELL_MOTION_DETECTED,
-                ACTION_DOORBELL_IMAGE_CAPTURE,
-                ACTION_DOORBELL_BUTTON_PUSHED,
-            ):
+            if status in DOORBELL_ACTIONS:
                 _add_activity(activities, activity_dict, status)
 
     return activities
 
 
 def _add_activity(activities, activity_dict, action):
-    activity_dict = activity_dict.copy()
     activity_dict["action"] = action
-    activities.append(_activity_from_dict(SOURCE_PUBNUB, activity_dict))
+    activities.append(ACTIVITY_ACTION_TO_CLASS[action](SOURCE_PUBNUB, activity_dict))
@@ -2,23 +2,47 @@
 
 import datetime
 import logging
+from types import MappingProxyType
+from typing import Any, Mapping, NamedTuple, Optional
 
 from pubnub.callbacks import SubscribeCallback
 from pubnub.enums import PNReconnectionPolicy, PNStatusCategory
-from pubnub.pnconfiguration import PNConfiguration
-from pubnub.pubnub_asyncio import PubNubAsyncio
+
+from yalexs.tracing import start_pubnub_span
 
 AUGUST_CHANNEL = "sub-c-1030e062-0ebe-11e5-a5c2-0619f8945a4f"
 
 _LOGGER = logging.getLogger(__name__)
 
 
+class PubNubEvent(NamedTuple):
+    """A pubnub message shared by every subscriber."""
+
+    device_id: str
+    channel: str
+    timetoken: Optional[int]
+    date_time: datetime.datetime
+    message: Mapping[str, Any]
+
+
+def freeze_message(value):
+    """Return a read-only view of a pubnub message payload."""
+    if isinstance(value, dict):
+        return MappingProxyType(
+            {key: freeze_message(val) for key, val in value.items()}
+        )
+    if isinstance(value, list):
+        return tuple(freeze_message(val) for val in value)
+    return value
+
+
 class AugustPubNub(SubscribeCallback):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.connected = False
         self._device_channels = {}
         self._subscriptions = []
+        self._event_subscriptions = []
 
     def presence(self, pubnub, presence):
         _LOGGER.debug("Recieved new presence: %s", presence)
@@ -50,9 +74,8 @@ class AugustPubNub(SubscribeCallback):
             self.connected = True
             now = datetime.datetime.utcnow()
             # Callback with an empty message to force a refresh
-            for callback in self._subscriptions:
-                for device_id in self._device_channels.values():
-                    callback(device_id, now, {})
+            for channel, device_id in self._device_channels.items():
+                self._dispatch(device_id, channel, None, now, None)
 
         elif status.category == PNStatusCategory.PNConnectedCategory:
             self.connected = True
@@ -67,18 +90,45 @@ class AugustPubNub(SubscribeCallback):
             message.timetoken,
             message.message,
         )
-        for callback in self._subscriptions:
-            callback(
+        timetoken = int(message.timetoken)
+        with start_pubnub_span(device_id, message.channel):
+            self._dispatch(
                 device_id,
+                message.channel,
+                timetoken,
                 datetime.datetime.fromtimestamp(
-                    int(message.timetoken) / 10000000, tz=datetime.timezone.utc
+                    timetoken / 10000000, tz=datetime.timezone.utc
                 ),
                 message.message,
             )
 
+    def _dispatch(self, device_id, channel, timetoken, date_time, message):
+        """Deliver a single message to all subscribers.
+
+        A message of None is sent as an empty message. The read-only
+        event is only built when there are subscribe_events() callbacks.
+        """
+        for callback in self._subscriptions:
+            callback(device_id, date_time, {} if message is None else message)
+        if self._event_subscriptions:
+            event = PubNubEvent(
+                device_id,
+                channel,
+                timetoken,
+                date_time,
+                freeze_message({} if message is None else message),
+            )
+            for callback in self._event_subscriptions:
+                callback(event)
+
     def subscribe(self, update_callback):
         """Add an callback subscriber.
 
+        The callback is called with the device id, the date time and the
+        pubnub message dict. For compatibility the dict is the one pubnub
+        decoded and it is shared by every subscribe() callback, so it must
+        not be changed; use subscribe_events() for a read-only message.
+
         Returns a callable that can be used to unsubscribe.
         """
         self._subscriptions.append(update_callback)
@@ -88,6 +138,18 @@ class AugustPubNub(SubscribeCallback):
 
         return _unsubscribe
 
+    def subscribe_events(self, event_callback):
+        """Add a subscriber that is called with a PubNubEvent.
+
+        Returns a callable that can be used to unsubscribe.
+        """
+        self._event_subscriptions.append(event_callback)
+
+        def _unsubscribe():
+            self._event_subscriptions.remove(event_callback)
+
+        return _unsubscribe
+
     def register_device(self, device_detail):
         """Regiter a device to get updates."""
         if device_detail.pubsub_channel is None:
@@ -102,6 +164,12 @@ class AugustPubNub(SubscribeCallback):
 
 def async_create_pubnub(user_uuid, subscriptions):
     """Create a pubnub subscription."""
+    # The pubnub asyncio client is slow to import so it is only
+    # loaded once a subscription is created.
+    # pylint: disable=import-outside-toplevel
+    from pubnub.pnconfiguration import PNConfiguration
+    from pubnub.pubnub_asyncio import PubNubAsyncio
+
     pnconfig = PNConfiguration()
     pnconfig.subscribe_key = AUGUST_CHANNEL
     pnconfig.uuid = f"pn-{str(user_uuid).upper()}"
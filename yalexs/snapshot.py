@@ -0,0 +1,248 @@
+"""Snapshot and restore device details for a warm startup."""
+
+import asyncio
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import tempfile
+
+from yalexs.doorbell import DoorbellDetail
+from yalexs.lock import LockDetail, LockDoorStatus, LockStatus
+
+SNAPSHOT_VERSION = 1
+
+DEVICE_TYPE_LOCK = "lock"
+DEVICE_TYPE_DOORBELL = "doorbell"
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _datetime_to_str(value):
+    return None if value is None else value.isoformat()
+
+
+def _str_to_datetime(value):
+    return None if value is None else datetime.fromisoformat(value)
+
+
+def device_detail_to_snapshot(device_detail):
+    """Convert a LockDetail or DoorbellDetail to a json serializable dict."""
+    if isinstance(device_detail, LockDetail):
+        bridge = device_detail.bridge
+        return {
+            "type": DEVICE_TYPE_LOCK,
+            "data": device_detail.raw,
+            "state": {
+                "lock_status": device_detail.lock_status.value,
+                "lock_status_datetime": _datetime_to_str(
+                    device_detail.lock_status_datetime
+                ),
+                "door_state": device_detail.door_state.value,
+                "door_state_datetime": _datetime_to_str(
+                    device_detail.door_state_datetime
+                ),
+                "bridge_is_online": (
+                    None
+                    if bridge is None or bridge.status is None
+                    else device_detail.bridge_is_online
+                ),
+            },
+        }
+    if isinstance(device_detail, DoorbellDetail):
+        return {
+            "type": DEVICE_TYPE_DOORBELL,
+            "data": device_detail.raw,
+            "state": {
+                "image_url": device_detail.image_url,
+                "image_created_at_datetime": _datetime_to_str(
+                    device_detail.image_created_at_datetime
+                ),
+            },
+        }
+    raise ValueError(f"Unsupported device detail: {device_detail}")
+
+
+def device_detail_from_snapshot(snapshot):
+    """Restore a LockDetail or DoorbellDetail from a snapshot dict."""
+    device_type = snapshot["type"]
+    state = snapshot["state"]
+    if device_type == DEVICE_TYPE_LOCK:
+        lock_detail = LockDetail(snapshot["data"])
+        lock_status = LockStatus(state["lock_status"])
+        if lock_status != lock_detail.lock_status:
+            lock_detail.lock_status = lock_status
+        door_state = LockDoorStatus(state["door_state"])
+        if door_state != lock_detail.door_state:
+            lock_detail.door_state = door_state
+        lock_status_datetime = _str_to_datetime(state["lock_status_datetime"])
+        if lock_status_datetime is not None:
+            lock_detail.lock_status_datetime = lock_status_datetime
+        door_state_datetime = _str_to_datetime(state["door_state_datetime"])
+        if door_state_datetime is not None:
+            lock_detail.door_state_datetime = door_state_datetime
+        if state["bridge_is_online"] is not None:
+            lock_detail.set_online(state["bridge_is_online"])
+        return lock_detail
+    if device_type == DEVICE_TYPE_DOORBELL:
+        doorbell_detail = DoorbellDetail(snapshot["data"])
+        doorbell_detail.image_url = state["image_url"]
+        image_created_at_datetime = _str_to_datetime(state["image_created_at_datetime"])
+        if image_created_at_datetime is not None:
+            doorbell_detail.image_created_at_datetime = image_created_at_datetime
+        return doorbell_detail
+    raise ValueError(f"Unsupported device type: {device_type}")
+
+
+def to_snapshot(device_details):
+    """Create a snapshot of many device details."""
+    return {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "devices": [
+            device_detail_to_snapshot(device_detail) for device_detail in device_details
+        ],
+    }
+
+
+def from_snapshot(snapshot):
+    """Restore device details from a snapshot.
+
+    Returns an empty list if the snapshot is from another version.
+    """
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        _LOGGER.warning(
+            "Ignoring snapshot with unsupported version: %s", snapshot.get("version")
+        )
+        return []
+    return [device_detail_from_snapshot(device) for device in snapshot["devices"]]
+
+
+def _temp_path(path):
+    """Create an empty temp file next to path so it can be renamed over it."""
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix=os.path.basename(path),
+        suffix=".tmp",
+    )
+    os.close(fd)
+    return temp_path
+
+
+def save_snapshot(path, device_details):
+    """Atomically write a snapshot of device details to path."""
+    contents = json.dumps(to_snapshot(device_details))
+    temp_path = _temp_path(path)
+    try:
+        with open(temp_path, "w") as file:
+            file.write(contents)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_snapshot(path):
+    """Load device details from a snapshot file.
+
+    Returns an empty list if the file does not exist or is unreadable.
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path) as file:
+            contents = file.read()
+    except OSError as error:
+        _LOGGER.error("Unable to read snapshot file (%s): %s", path, error)
+        return []
+    return _load_snapshot_contents(path, contents)
+
+
+async def async_save_snapshot(path, device_details):
+    """Atomically write a snapshot of device details to path."""
+    import aiofiles  # pylint: disable=import-outside-toplevel
+
+    contents = json.dumps(to_snapshot(device_details))
+    temp_path = _temp_path(path)
+    try:
+        async with aiofiles.open(temp_path, "w") as file:
+            await file.write(contents)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+async def async_load_snapshot(path):
+    """Load device details from a snapshot file.
+
+    Returns an empty list if the file does not exist or is unreadable.
+    """
+    if not os.path.exists(path):
+        return []
+    import aiofiles  # pylint: disable=import-outside-toplevel
+
+    try:
+        async with aiofiles.open(path, "r") as file:
+            contents = await file.read()
+    except OSError as error:
+        _LOGGER.error("Unable to read snapshot file (%s): %s", path, error)
+        return []
+    return _load_snapshot_contents(path, contents)
+
+
+def _load_snapshot_contents(path, contents):
+    try:
+        return from_snapshot(json.loads(contents))
+    except (AttributeError, KeyError, TypeError, ValueError) as error:
+        _LOGGER.error("Unable to read snapshot file (%s): %s", path, error)
+        return []
+
+
+async def async_warm_start(api, access_token, path, lock_ids=None, doorbell_ids=None):
+    """Serve device details from a snapshot while refreshing them.
+
+    Returns the restored details keyed by device id right away along
+    with a task that fetches fresh details from the api, saves a new
+    snapshot and resolves to the fresh details keyed by device id.
+
+    The locks and doorbells in the snapshot are refreshed unless
+    lock_ids or doorbell_ids are passed. Devices that fail to refresh
+    keep their snapshot details.
+    """
+    device_details = {
+        device_detail.device_id: device_detail
+        for device_detail in await async_load_snapshot(path)
+    }
+    if lock_ids is None:
+        lock_ids = [
+            device_id
+            for device_id, device_detail in device_details.items()
+            if isinstance(device_detail, LockDetail)
+        ]
+    if doorbell_ids is None:
+        doorbell_ids = [
+            device_id
+            for device_id, device_detail in device_details.items()
+            if isinstance(device_detail, DoorbellDetail)
+        ]
+
+    async def _async_refresh():
+        results = await asyncio.gather(
+            *(api.async_get_lock_detail(access_token, lock_id) for lock_id in lock_ids),
+            *(
+                api.async_get_doorbell_detail(access_token, doorbell_id)
+                for doorbell_id in doorbell_ids
+            ),
+            return_exceptions=True,
+        )
+        fresh_details = dict(device_details)
+        for device_id, result in zip([*lock_ids, *doorbell_ids], results):
+            if isinstance(result, BaseException):
+                _LOGGER.warning("Failed to refresh %s: %s", device_id, result)
+                continue
+            fresh_details[device_id] = result
+        await async_save_snapshot(path, fresh_details.values())
+        return fresh_details
+
+    return device_details, asyncio.create_task(_async_refresh())
@@ -0,0 +1,102 @@
+"""Fold batches of activities into device state."""
+
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from yalexs.activity import Activity, ActivityType
+from yalexs.lock import LockDetail
+from yalexs.util import FieldChange, update_lock_detail_from_activity
+
+LOCK_STATE_ACTIVITY_TYPES = {
+    ActivityType.LOCK_OPERATION: ActivityType.LOCK_OPERATION,
+    ActivityType.LOCK_OPERATION_WITHOUT_OPERATOR: ActivityType.LOCK_OPERATION,
+    ActivityType.DOOR_OPERATION: ActivityType.DOOR_OPERATION,
+    ActivityType.BRIDGE_OPERATION: ActivityType.BRIDGE_OPERATION,
+}
+
+
+class LockStateStore:
+    """Keep LockDetails up to date from batches of activities.
+
+    Only the latest lock, door and bridge activity for each lock
+    in a batch is applied so the cost of applying a batch scales
+    with the number of locks instead of the number of activities.
+
+    Subscribers are called with the list of FieldChanges each
+    time a batch changes the state of at least one lock.
+    """
+
+    def __init__(self, lock_details: Iterable[LockDetail] = ()) -> None:
+        self._lock_details: Dict[str, LockDetail] = {}
+        self._subscriptions: List[Callable[[List[FieldChange]], None]] = []
+        for lock_detail in lock_details:
+            self.add_lock_detail(lock_detail)
+
+    def add_lock_detail(self, lock_detail: LockDetail) -> None:
+        """Track a LockDetail."""
+        self._lock_details[lock_detail.device_id] = lock_detail
+
+    def remove_lock_detail(self, device_id: str) -> None:
+        """Stop tracking a LockDetail."""
+        self._lock_details.pop(device_id, None)
+
+    def get_lock_detail(self, device_id: str) -> Optional[LockDetail]:
+        """Return the tracked LockDetail for a device."""
+        return self._lock_details.get(device_id)
+
+    @property
+    def lock_details(self) -> Iterable[LockDetail]:
+        return self._lock_details.values()
+
+    def subscribe(
+        self, update_callback: Callable[[List[FieldChange]], None]
+    ) -> Callable[[], None]:
+        """Add a callback subscriber.
+
+        Returns a callable that can be used to unsubscribe.
+        """
+        self._subscriptions.append(update_callback)
+
+        def _unsubscribe():
+            self._subscriptions.remove(update_callback)
+
+        return _unsubscribe
+
+    def apply_activities(self, activities: Iterable[Activity]) -> Set[str]:
+        """Apply a batch of activities in any order.
+
+        Returns the device ids of the locks that were updated.
+        """
+        latest: Dict[tuple, Activity] = {}
+        lock_details = self._lock_details
+        for activity in activities:
+            kind = LOCK_STATE_ACTIVITY_TYPES.get(activity.activity_type)
+            if kind is None or activity.device_id not in lock_details:
+                continue
+            key = (activity.device_id, kind)
+            current = latest.get(key)
+            if current is None or _is_newer(activity, current, kind):
+                latest[key] = activity
+
+        updated = set()
+        changes = [] if self._subscriptions else None
+        for (device_id, _), activity in latest.items():
+            if update_lock_detail_from_activity(
+                lock_details[device_id], activity, changes
+            ):
+                updated.add(device_id)
+        if changes:
+            for callback in self._subscriptions:
+                callback(changes)
+        return updated
+
+
+def _is_newer(activity: Activity, current: Activity, kind: ActivityType) -> bool:
+    """Check if an activity should replace the current winner.
+
+    Lock and door activities with the same time keep the first one
+    seen, matching update_lock_detail_from_activity. Bridge activities
+    are not time checked when applied so the last one seen wins.
+    """
+    if kind == ActivityType.BRIDGE_OPERATION:
+        return activity.activity_end_time >= current.activity_end_time
+    return activity.activity_end_time > current.activity_end_time
@@ -0,0 +1,80 @@
+"""Stream http response bodies without buffering them in memory."""
+
+import inspect
+import os
+from typing import Any, Union
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+Destination = Union[str, os.PathLike, Any]
+
+
+async def async_stream_response(
+    response, destination: Destination, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """Write an aiohttp response body to destination a chunk at a time.
+
+    destination is a path, a binary file object or an async sink
+    whose write method is a coroutine. Returns the number of bytes
+    written.
+    """
+    response.raise_for_status()
+    try:
+        if isinstance(destination, (str, os.PathLike)):
+            import aiofiles  # pylint: disable=import-outside-toplevel
+
+            async with aiofiles.open(destination, "wb") as file:
+                return await _async_write_chunks(response, file.write, chunk_size)
+        return await _async_write_chunks(response, destination.write, chunk_size)
+    finally:
+        response.release()
+
+
+async def _async_write_chunks(response, write, chunk_size: int) -> int:
+    size = 0
+    async for chunk in response.content.iter_chunked(chunk_size):
+        result = write(chunk)
+        if inspect.isawaitable(result):
+            await result
+        size += len(chunk)
+    return size
+
+
+async def async_read_response_into(
+    response, buffer: bytearray, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> memoryview:
+    """Read an aiohttp response body into a reused buffer.
+
+    The buffer grows if the body does not fit. Returns a memoryview
+    of the body, which must be released before the buffer is reused.
+    """
+    response.raise_for_status()
+    size = 0
+    try:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            end = size + len(chunk)
+            buffer[size:end] = chunk
+            size = end
+    finally:
+        response.release()
+    return memoryview(buffer)[:size]
+
+
+def stream_response(
+    response, destination: Destination, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """Write a requests response body to a path or binary file object."""
+    with response:
+        response.raise_for_status()
+        if isinstance(destination, (str, os.PathLike)):
+            with open(destination, "wb") as file:
+                return _write_chunks(response, file.write, chunk_size)
+        return _write_chunks(response, destination.write, chunk_size)
+
+
+def _write_chunks(response, write, chunk_size: int) -> int:
+    size = 0
+    for chunk in response.iter_content(chunk_size):
+        write(chunk)
+        size += len(chunk)
+    return size
@@ -0,0 +1,183 @@
+"""Refresh the access tokens of many accounts in the background."""
+
+import asyncio
+from datetime import timedelta
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from yalexs.authenticator_async import AuthenticatorAsync
+from yalexs.authenticator_common import Authentication, AuthenticationState
+
+DEFAULT_MAX_CONCURRENT_REFRESHES = 4
+DEFAULT_REFRESH_JITTER = timedelta(hours=6)
+DEFAULT_RETRY_INTERVAL = timedelta(minutes=5)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TokenRefreshManager:
+    """Refresh the tokens of many AuthenticatorAsync before they expire.
+
+    Each authenticator is scheduled a random time of up to jitter
+    ahead of its access_token_renewal_threshold so tokens issued
+    together are not all refreshed together. At most max_concurrent
+    refreshes run at once and a refresh that fails is tried again
+    after retry_interval.
+
+    The old token stays in place until the new one replaces it, so
+    api calls using authenticator.authentication never wait on a
+    refresh.
+
+    The manager may be created outside of the event loop; its
+    asyncio primitives are made when they are first used in it.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_REFRESHES,
+        jitter: timedelta = DEFAULT_REFRESH_JITTER,
+        retry_interval: timedelta = DEFAULT_RETRY_INTERVAL,
+    ) -> None:
+        self._max_concurrent = max_concurrent
+        # Made in the running loop, on python 3.9 they bind to a loop
+        # when they are created
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._jitter = jitter.total_seconds()
+        self._retry_interval = retry_interval.total_seconds()
+        self._heap: List[Tuple[float, int, AuthenticatorAsync]] = []
+        # The entry for each authenticator that is still current, older
+        # entries are skipped when they reach the top of the heap
+        self._scheduled: Dict[AuthenticatorAsync, int] = {}
+        self._refreshing: Dict[AuthenticatorAsync, asyncio.Future] = {}
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    def add(self, authenticator: AuthenticatorAsync) -> Callable[[], None]:
+        """Start refreshing the token of an authenticator.
+
+        Returns a callable that can be used to stop.
+        """
+        self._schedule(authenticator, self._refresh_time(authenticator))
+
+        def _remove():
+            self._scheduled.pop(authenticator, None)
+
+        return _remove
+
+    def start(self) -> None:
+        """Start refreshing in the background."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._async_run())
+
+    async def async_stop(self) -> None:
+        """Stop refreshing and wait for the background tasks to finish."""
+        tasks = list(self._background_tasks)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # The next start may be in another event loop
+        self._semaphore = self._wakeup = None
+
+    def next_refresh(self, authenticator: AuthenticatorAsync) -> Optional[float]:
+        """Return when the token will be refreshed as a unix timestamp."""
+        entry = self._scheduled.get(authenticator)
+        for refresh_at, count, _ in self._heap:
+            if count == entry:
+                return refresh_at
+        return None
+
+    async def async_refresh(
+        self, authenticator: AuthenticatorAsync, force: bool = False
+    ) -> Authentication:
+        """Refresh the token of an authenticator now.
+
+        Calls made while a refresh of the same authenticator is in
+        progress wait for it rather than starting another.
+        """
+        future = self._refreshing.get(authenticator)
+        if future is None:
+            future = asyncio.ensure_future(self._async_refresh(authenticator, force))
+            self._refreshing[authenticator] = future
+            future.add_done_callback(
+                lambda _: self._refreshing.pop(authenticator, None)
+            )
+        return await asyncio.shield(future)
+
+    async def _async_refresh(
+        self, authenticator: AuthenticatorAsync, force: bool
+    ) -> Authentication:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrent)
+        async with self._semaphore:
+            try:
+                authentication = await authenticator.async_refresh_access_token(
+                    force=force
+                )
+            except Exception:
+                if authenticator in self._scheduled:
+                    self._schedule(authenticator, time.time() + self._retry_interval)
+                raise
+        if authenticator in self._scheduled:
+            self._schedule(authenticator, self._refresh_time(authenticator))
+        return authentication
+
+    def _refresh_time(self, authenticator: AuthenticatorAsync) -> float:
+        authentication = authenticator.authentication
+        now = time.time()
+        if (
+            authentication is None
+            or authentication.state != AuthenticationState.AUTHENTICATED
+        ):
+            return now + self._retry_interval
+        renew_at = (
+            authentication.parsed_expiration_time().timestamp()
+            - authenticator.access_token_renewal_threshold.total_seconds()
+            - random.uniform(0, self._jitter)  # nosec
+        )
+        return max(renew_at, now)
+
+    def _schedule(self, authenticator: AuthenticatorAsync, refresh_at: float) -> None:
+        count = next(self._counter)
+        self._scheduled[authenticator] = count
+        if self._wakeup is not None and (
+            not self._heap or refresh_at < self._heap[0][0]
+        ):
+            self._wakeup.set()
+        heapq.heappush(self._heap, (refresh_at, count, authenticator))
+
+    async def _async_run(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and (
+                self._heap[0][0] <= now
+                or self._scheduled.get(self._heap[0][2]) != self._heap[0][1]
+            ):
+                _, count, authenticator = heapq.heappop(self._heap)
+                if self._scheduled.get(authenticator) == count:
+                    task = asyncio.ensure_future(
+                        self._async_background_refresh(authenticator)
+                    )
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._background_tasks.discard)
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _async_background_refresh(self, authenticator: AuthenticatorAsync):
+        try:
+            await self.async_refresh(authenticator, force=True)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Failed to refresh access token, will try again")
@@ -0,0 +1,233 @@
+"""Stores for the authentication of many accounts."""
+
+from abc import ABC, abstractmethod
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import (
+    AsyncContextManager,
+    ContextManager,
+    Dict,
+    Iterable,
+    Mapping,
+    Optional,
+)
+
+from yalexs.authenticator_common import (
+    Authentication,
+    from_authentication_json,
+    to_authentication_json,
+)
+from yalexs.cache_file import async_cache_file_lock, atomic_write, cache_file_lock
+
+DEFAULT_COALESCE_DELAY = 0.1
+REFRESH_LOCK_SUFFIX = ".refresh"
+SQLITE_MAX_KEYS_PER_QUERY = 500
+
+
+class TokenStore(ABC):
+    """Load and save the Authentication of accounts by key.
+
+    Subclasses implement load_many and save_many. The async methods
+    run them in the default executor, and saves made within
+    coalesce_delay of each other are written in a single save_many.
+
+    Stores shared between processes set _refresh_lock_path so only
+    one process refreshes the token of a key at a time.
+    """
+
+    _refresh_lock_path: Optional[str] = None
+
+    def __init__(self, coalesce_delay: float = DEFAULT_COALESCE_DELAY) -> None:
+        self._coalesce_delay = coalesce_delay
+        self._pending: Dict[str, Authentication] = {}
+        self._flush: Optional[asyncio.Future] = None
+        self._flush_now: Optional[asyncio.Event] = None
+
+    @abstractmethod
+    def load_many(self, keys: Iterable[str]) -> Dict[str, Authentication]:
+        """Return the stored Authentication of each key that has one."""
+
+    @abstractmethod
+    def save_many(self, authentications: Mapping[str, Authentication]) -> None:
+        """Store the Authentication of each key."""
+
+    def load(self, key: str) -> Optional[Authentication]:
+        return self.load_many([key]).get(key)
+
+    def refresh_lock(self, key: str) -> ContextManager[None]:
+        """Return a lock to hold while the Authentication of key is refreshed.
+
+        A process that waited for the lock loads the token that was
+        saved rather than refreshing it again. Refreshes of other keys
+        do not wait for it.
+        """
+        return cache_file_lock(self._key_refresh_lock_path(key))
+
+    def async_refresh_lock(self, key: str) -> AsyncContextManager[None]:
+        """Return refresh_lock for use in the event loop."""
+        return async_cache_file_lock(self._key_refresh_lock_path(key))
+
+    def _key_refresh_lock_path(self, key: str) -> Optional[str]:
+        if self._refresh_lock_path is None:
+            return None
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        return f"{self._refresh_lock_path}.{digest}"
+
+    def save(self, key: str, authentication: Authentication) -> None:
+        self.save_many({key: authentication})
+
+    async def async_load_many(self, keys: Iterable[str]) -> Dict[str, Authentication]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.load_many, list(keys)
+        )
+
+    async def async_save_many(
+        self, authentications: Mapping[str, Authentication]
+    ) -> None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.save_many, dict(authentications)
+        )
+
+    async def async_load(self, key: str) -> Optional[Authentication]:
+        return (await self.async_load_many([key])).get(key)
+
+    async def async_save(
+        self, key: str, authentication: Authentication, flush: bool = False
+    ) -> None:
+        """Save an Authentication along with any other saves close to it.
+
+        With flush the pending saves are written right away rather
+        than after coalesce_delay.
+        """
+        self._pending[key] = authentication
+        if self._flush is None:
+            self._flush_now = asyncio.Event()
+            self._flush = asyncio.ensure_future(self._async_flush(self._flush_now))
+        if flush:
+            self._flush_now.set()
+        await asyncio.shield(self._flush)
+
+    async def _async_flush(self, flush_now: asyncio.Event) -> None:
+        try:
+            await asyncio.wait_for(flush_now.wait(), self._coalesce_delay)
+        except asyncio.TimeoutError:
+            pass
+        pending, self._pending = self._pending, {}
+        self._flush = self._flush_now = None
+        await self.async_save_many(pending)
+
+
+class MemoryTokenStore(TokenStore):
+    """Keep authentications in memory."""
+
+    def __init__(self, coalesce_delay: float = DEFAULT_COALESCE_DELAY) -> None:
+        super().__init__(coalesce_delay)
+        self._authentications: Dict[str, Authentication] = {}
+
+    def load_many(self, keys: Iterable[str]) -> Dict[str, Authentication]:
+        authentications = self._authentications
+        return {key: authentications[key] for key in keys if key in authentications}
+
+    def save_many(self, authentications: Mapping[str, Authentication]) -> None:
+        self._authentications.update(authentications)
+
+
+class FileTokenStore(TokenStore):
+    """Keep authentications in a single json file.
+
+    The file is replaced atomically on each save so a reader never
+    sees it half written, and saves hold a lock shared with other
+    processes so none of their keys are lost.
+    """
+
+    def __init__(
+        self, path: str, coalesce_delay: float = DEFAULT_COALESCE_DELAY
+    ) -> None:
+        super().__init__(coalesce_delay)
+        self._path = path
+        self._refresh_lock_path = path + REFRESH_LOCK_SUFFIX
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, dict]:
+        if not os.path.exists(self._path):
+            return {}
+        with open(self._path) as file:
+            return json.load(file)
+
+    def load_many(self, keys: Iterable[str]) -> Dict[str, Authentication]:
+        with self._lock:
+            data = self._read()
+        return {key: from_authentication_json(data[key]) for key in keys if key in data}
+
+    def save_many(self, authentications: Mapping[str, Authentication]) -> None:
+        with self._lock, cache_file_lock(self._path):
+            data = self._read()
+            for key, authentication in authentications.items():
+                data[key] = json.loads(to_authentication_json(authentication))
+            atomic_write(self._path, json.dumps(data))
+
+
+class SQLiteTokenStore(TokenStore):
+    """Keep authentications in a sqlite database."""
+
+    def __init__(
+        self, path: str, coalesce_delay: float = DEFAULT_COALESCE_DELAY
+    ) -> None:
+        super().__init__(coalesce_delay)
+        if path and path != ":memory:":
+            self._refresh_lock_path = path + REFRESH_LOCK_SUFFIX
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS authentication "
+                "(key TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def load_many(self, keys: Iterable[str]) -> Dict[str, Authentication]:
+        keys = list(keys)
+        authentications = {}
+        with self._lock:
+            for start in range(0, len(keys), SQLITE_MAX_KEYS_PER_QUERY):
+                chunk = keys[start : start + SQLITE_MAX_KEYS_PER_QUERY]
+                rows = self._connection.execute(
+                    "SELECT key, data FROM authentication WHERE key IN "  # nosec
+                    f"({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for key, data in rows:
+                    authentications[key] = from_authentication_json(json.loads(data))
+        return authentications
+
+    def save_many(self, authentications: Mapping[str, Authentication]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO authentication (key, data) VALUES (?, ?)",
+                [
+                    (key, to_authentication_json(authentication))
+                    for key, authentication in authentications.items()
+                ],
+            )
+
+
+async def async_setup_authentications(
+    token_store: TokenStore, authenticators: Iterable
+) -> None:
+    """Set up many AuthenticatorAsync with a single load from token_store."""
+    authenticators = list(authenticators)
+    authentications = await token_store.async_load_many(
+        authenticator.token_store_key for authenticator in authenticators
+    )
+    for authenticator in authenticators:
+        authenticator.setup_from_authentication(
+            authentications.get(authenticator.token_store_key),
+            authenticator.token_store_key,
+        )
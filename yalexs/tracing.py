@@ -0,0 +1,138 @@
+"""Optional OpenTelemetry tracing.
+
+Spans are only created when opentelemetry-api is installed or a
+tracer is passed to set_tracer, otherwise every helper is a noop.
+"""
+
+from contextlib import nullcontext
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from yalexs.middleware import ApiMiddleware, RequestContext, _remoteoperate_lock_id
+
+TRACER_NAME = "yalexs"
+
+# How long a lock command can be linked to the pubnub message it causes
+COMMAND_LINK_TTL = 120
+
+_NOOP_SPAN = nullcontext()
+_UNSET = object()
+
+_tracer: Any = _UNSET
+_pending_commands: Dict[str, Tuple[Any, float]] = {}
+
+
+def get_tracer():
+    """Return the tracer in use or None if tracing is unavailable."""
+    global _tracer  # pylint: disable=global-statement
+    if _tracer is _UNSET:
+        try:
+            # pylint: disable=import-outside-toplevel
+            from opentelemetry import trace
+        except ImportError:
+            _tracer = None
+        else:
+            _tracer = trace.get_tracer(TRACER_NAME)
+    return _tracer
+
+
+def set_tracer(tracer) -> None:
+    """Use tracer for all spans, or disable tracing with None."""
+    global _tracer  # pylint: disable=global-statement
+    _tracer = tracer
+    _pending_commands.clear()
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """Start a span as the current span for use in a with block."""
+    tracer = get_tracer()
+    if tracer is None:
+        return _NOOP_SPAN
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+
+def start_pubnub_span(device_id: str, channel: str):
+    """Start a span for a pubnub message.
+
+    The span is linked to the last lock command sent to the device
+    so a command can be followed to the activity it produced.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return _NOOP_SPAN
+    links = []
+    pending = _pending_commands.pop(device_id, None)
+    if pending is not None and time.monotonic() - pending[1] < COMMAND_LINK_TTL:
+        links = _links(pending[0])
+    return tracer.start_as_current_span(
+        "yalexs.pubnub.message",
+        attributes={"yalexs.device_id": device_id, "messaging.destination": channel},
+        links=links,
+    )
+
+
+def _links(span_context):
+    try:
+        from opentelemetry.trace import Link  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return []
+    return [Link(span_context)]
+
+
+def _set_error_status(span, error: BaseException) -> None:
+    span.record_exception(error)
+    try:
+        # pylint: disable=import-outside-toplevel
+        from opentelemetry.trace import Status, StatusCode
+    except ImportError:
+        return
+    span.set_status(Status(StatusCode.ERROR, str(error)))
+
+
+class TracingMiddleware(ApiMiddleware):
+    """Create a span for each attempt of an api call.
+
+    Add it with api.add_middleware(TracingMiddleware()).
+    """
+
+    def __init__(self, tracer=None) -> None:
+        self._tracer = tracer
+
+    def before_request(self, context: RequestContext) -> None:
+        tracer = self._tracer or get_tracer()
+        if tracer is None:
+            return
+        span = tracer.start_span(
+            f"yalexs.api {context.endpoint}",
+            attributes={
+                "http.method": context.method.upper(),
+                "http.url": context.url,
+                "yalexs.endpoint": context.endpoint,
+                "yalexs.attempt": context.attempt,
+            },
+        )
+        context.data["span"] = span
+        if context.endpoint and context.endpoint.startswith("remoteoperate_"):
+            _pending_commands[_remoteoperate_lock_id(context.url)] = (
+                span.get_span_context(),
+                time.monotonic(),
+            )
+
+    def _end_span(self, context: RequestContext) -> None:
+        span = context.data.pop("span", None)
+        if span is None:
+            return
+        if context.status is not None:
+            span.set_attribute("http.status_code", context.status)
+        if context.error is not None:
+            _set_error_status(span, context.error)
+        span.end()
+
+    def after_response(self, context: RequestContext) -> None:
+        self._end_span(context)
+
+    def on_retry(self, context: RequestContext) -> None:
+        self._end_span(context)
+
+    def on_error(self, context: RequestContext) -> None:
+        self._end_span(context)
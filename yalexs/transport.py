@@ -0,0 +1,77 @@
+"""Transports that send api requests over http."""
+
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from yalexs.api_common import API_BASE_URL
+
+
+def rewrite_url(url: str, base_url: Optional[str]) -> str:
+    """Point a url built for the production api at base_url."""
+    if base_url is None or not url.startswith(API_BASE_URL):
+        return url
+    return base_url.rstrip("/") + url[len(API_BASE_URL) :]
+
+
+class Transport(ABC):
+    """Send requests for an Api.
+
+    request must return an object that behaves like a
+    requests.Response.
+    """
+
+    def __init__(self, base_url: Optional[str] = None) -> None:
+        self._base_url = base_url
+
+    @property
+    def base_url(self) -> Optional[str]:
+        return self._base_url
+
+    @abstractmethod
+    def request(self, method, url, **kwargs):
+        """Send a request and return the response."""
+
+
+class RequestsTransport(Transport):
+    """Send requests with a requests Session."""
+
+    def __init__(self, http_session, base_url: Optional[str] = None) -> None:
+        super().__init__(base_url)
+        self._http_session = http_session
+
+    def request(self, method, url, **kwargs):
+        return self._http_session.request(
+            method, rewrite_url(url, self._base_url), **kwargs
+        )
+
+
+class AsyncTransport(ABC):
+    """Send requests for an ApiAsync.
+
+    async_request must return an object that behaves like an
+    aiohttp ClientResponse.
+    """
+
+    def __init__(self, base_url: Optional[str] = None) -> None:
+        self._base_url = base_url
+
+    @property
+    def base_url(self) -> Optional[str]:
+        return self._base_url
+
+    @abstractmethod
+    async def async_request(self, method, url, **kwargs):
+        """Send a request and return the response."""
+
+
+class AiohttpTransport(AsyncTransport):
+    """Send requests with an aiohttp ClientSession."""
+
+    def __init__(self, aiohttp_session, base_url: Optional[str] = None) -> None:
+        super().__init__(base_url)
+        self._aiohttp_session = aiohttp_session
+
+    async def async_request(self, method, url, **kwargs):
+        return await self._aiohttp_session.request(
+            method, rewrite_url(url, self._base_url), **kwargs
+        )
@@ -1,9 +1,11 @@
 import datetime
+from typing import Any, List, NamedTuple, Optional
 
 from yalexs.activity import (
     ACTION_BRIDGE_OFFLINE,
     ACTION_BRIDGE_ONLINE,
     ACTIVITY_ACTION_STATES,
+    Activity,
     BridgeOperationActivity,
     DoorbellImageCaptureActivity,
     DoorbellMotionActivity,
@@ -12,8 +14,32 @@ from yalexs.activity import (
 )
 
 
-def update_lock_detail_from_activity(lock_detail, activity):
-    """Update the LockDetail from an activity."""
+class FieldChange(NamedTuple):
+    """A single field of a device that changed because of an activity."""
+
+    device_id: str
+    field: str
+    old_value: Any
+    new_value: Any
+    activity: Activity
+
+
+def _set_field(device, field, value, activity, changes):
+    """Set a field on a device and record the change."""
+    old_value = getattr(device, field)
+    setattr(device, field, value)
+    if changes is not None and old_value != value:
+        changes.append(FieldChange(device.device_id, field, old_value, value, activity))
+
+
+def update_lock_detail_from_activity(
+    lock_detail, activity, changes: Optional[List[FieldChange]] = None
+):
+    """Update the LockDetail from an activity.
+
+    If changes is passed, a FieldChange is appended to it for
+    each field that changed.
+    """
     activity_end_time_utc = as_utc_from_local(activity.activity_end_time)
     if activity.device_id != lock_detail.device_id:
         raise ValueError
@@ -23,29 +49,67 @@ def update_lock_detail_from_activity(lock_detail, activity):
             and lock_detail.lock_status_datetime >= activity_end_time_utc
         ):
             return False
-        lock_detail.lock_status = ACTIVITY_ACTION_STATES[activity.action]
-        lock_detail.lock_status_datetime = activity_end_time_utc
+        _set_field(
+            lock_detail,
+            "lock_status",
+            ACTIVITY_ACTION_STATES[activity.action],
+            activity,
+            changes,
+        )
+        _set_field(
+            lock_detail,
+            "lock_status_datetime",
+            activity_end_time_utc,
+            activity,
+            changes,
+        )
     elif isinstance(activity, DoorOperationActivity):
         if (
             lock_detail.door_state_datetime
             and lock_detail.door_state_datetime >= activity_end_time_utc
         ):
             return False
-        lock_detail.door_state = ACTIVITY_ACTION_STATES[activity.action]
-        lock_detail.door_state_datetime = activity_end_time_utc
+        _set_field(
+            lock_detail,
+            "door_state",
+            ACTIVITY_ACTION_STATES[activity.action],
+            activity,
+            changes,
+        )
+        _set_field(
+            lock_detail, "door_state_datetime", activity_end_time_utc, activity, changes
+        )
     elif isinstance(activity, BridgeOperationActivity):
+        was_online = lock_detail.bridge_is_online
         if activity.action == ACTION_BRIDGE_ONLINE:
             lock_detail.set_online(True)
         elif activity.action == ACTION_BRIDGE_OFFLINE:
             lock_detail.set_online(False)
+        is_online = lock_detail.bridge_is_online
+        if changes is not None and was_online != is_online:
+            changes.append(
+                FieldChange(
+                    lock_detail.device_id,
+                    "bridge_is_online",
+                    was_online,
+                    is_online,
+                    activity,
+                )
+            )
     else:
         raise ValueError
 
     return True
 
 
-def update_doorbell_image_from_activity(doorbell_detail, activity):
-    """Update the DoorDetail from an activity with a new image."""
+def update_doorbell_image_from_activity(
+    doorbell_detail, activity, changes: Optional[List[FieldChange]] = None
+):
+    """Update the DoorDetail from an activity with a new image.
+
+    If changes is passed, a FieldChange is appended to it for
+    each field that changed.
+    """
     if activity.device_id != doorbell_detail.device_id:
         raise ValueError
     if isinstance(activity, (DoorbellImageCaptureActivity, DoorbellMotionActivity)):
@@ -57,9 +121,15 @@ def update_doorbell_image_from_activity(doorbell_detail, activity):
             or doorbell_detail.image_created_at_datetime
             < activity.image_created_at_datetime
         ):
-            doorbell_detail.image_url = activity.image_url
-            doorbell_detail.image_created_at_datetime = (
-                activity.image_created_at_datetime
+            _set_field(
+                doorbell_detail, "image_url", activity.image_url, activity, changes
+            )
+            _set_field(
+                doorbell_detail,
+                "image_created_at_datetime",
+                activity.image_created_at_datetime,
+                activity,
+                changes,
             )
         else:
             return False